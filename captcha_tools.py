@@ -0,0 +1,562 @@
+"""Offline tools for the gift code captcha solver.
+
+Usage:
+    python captcha_tools.py quantize --dataset captcha_images [--mode dynamic|static]
+    python captcha_tools.py calibrate --dataset captcha_images [--holdout 0.2]
+    python captcha_tools.py benchmark --dataset captcha_images [--batch-sizes 1,4,8] [--threads 1,2,4]
+    python captcha_tools.py import --dataset captcha_images [--delete]
+    python captcha_tools.py serve [--address unix:/tmp/wos_captcha.sock | tcp:127.0.0.1:8765]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+
+from cogs.captcha_dataset import LEGACY_ACCEPTED_PATTERN, OUTCOME_ACCEPTED, OUTCOME_REJECTED, CaptchaDatasetStore
+from cogs.captcha_service import CaptchaSolverService
+from cogs.gift_captchasolver import (
+    FLOAT_MODEL_FILE,
+    INT8_MODEL_FILE,
+    METADATA_FILE,
+    INT8_REPORT_FILE,
+    INT8_MIN_SAMPLES,
+    GiftCaptchaSolver,
+    file_sha256,
+)
+from wos_config import get_captcha_batch_size, get_captcha_service_address
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+
+def load_labeled_images(path, limit=None):
+    """Load (image_bytes, label) pairs from the packed captcha store in path, then any loose solved images."""
+    samples = CaptchaDatasetStore(path).load_labeled(limit)
+    if limit and len(samples) >= limit:
+        return samples
+    for name in sorted(os.listdir(path)):
+        match = LEGACY_ACCEPTED_PATTERN.match(name)
+        if not match:
+            continue
+        with open(os.path.join(path, name), "rb") as f:
+            samples.append((f.read(), match.group(1).upper()))
+        if limit and len(samples) >= limit:
+            break
+    return samples
+
+
+def evaluate_solver(solver, samples, batch_size=None):
+    """Run the solver over labeled samples and return accuracy figures in percent."""
+    batch_size = batch_size or max(1, solver.max_batch_size)
+    correct = 0
+    chars_correct = 0
+    chars_total = 0
+
+    for start in range(0, len(samples), batch_size):
+        batch = samples[start:start + batch_size]
+        results = solver._infer_batch_sync([image_bytes for image_bytes, _ in batch])
+        for (_, label), result in zip(batch, results):
+            predicted = result[0] if result else ""
+            correct += predicted == label
+            chars_correct += sum(1 for a, b in zip(predicted, label) if a == b)
+            chars_total += len(label)
+
+    return {
+        "accuracy": correct / len(samples) * 100 if samples else 0.0,
+        "char_accuracy": chars_correct / chars_total * 100 if chars_total else 0.0,
+    }
+
+
+def _quantize_static(float_path, int8_path, samples, solver):
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = solver.onnx_session.get_inputs()[0].name
+
+    class CaptchaCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self._inputs = iter(
+                input_data for input_data in (solver._preprocess_image(image_bytes) for image_bytes, _ in samples)
+                if input_data is not None
+            )
+
+        def get_next(self):
+            input_data = next(self._inputs, None)
+            return None if input_data is None else {input_name: input_data}
+
+    quantize_static(
+        float_path,
+        int8_path,
+        CaptchaCalibrationReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+
+def quantize_command(args):
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError:
+        print("onnxruntime with quantization support is required: pip install onnxruntime onnx")
+        return 1
+
+    float_path = os.path.join(MODELS_DIR, FLOAT_MODEL_FILE)
+    int8_path = os.path.join(MODELS_DIR, INT8_MODEL_FILE)
+    report_path = os.path.join(MODELS_DIR, INT8_REPORT_FILE)
+
+    if not os.path.exists(float_path):
+        print(f"Float model not found at {float_path}")
+        return 1
+
+    samples = load_labeled_images(args.dataset, args.limit)
+    print(f"Loaded {len(samples)} labeled captcha(s) from {args.dataset}")
+    if not samples:
+        return 1
+
+    # Static quantization calibrates on its own shuffled slice so accuracy is measured on unseen images
+    calibration_samples = []
+    evaluation_samples = samples
+    if args.mode == "static":
+        shuffled = list(samples)
+        random.Random(0).shuffle(shuffled)
+        calibration_count = min(args.calibration_size, len(shuffled) // 2)
+        calibration_samples, evaluation_samples = shuffled[:calibration_count], shuffled[calibration_count:]
+        print(f"Using {len(calibration_samples)} captcha(s) for calibration and {len(evaluation_samples)} for evaluation")
+    if len(evaluation_samples) < INT8_MIN_SAMPLES:
+        print(f"Warning: at least {INT8_MIN_SAMPLES} evaluation samples are needed before the solver will auto-select the INT8 model.")
+
+    float_solver = GiftCaptchaSolver(model_variant="float")
+    try:
+        if not float_solver.is_initialized:
+            print("Float model failed to load, see log/gift_solver.txt")
+            return 1
+
+        print(f"Quantizing {FLOAT_MODEL_FILE} ({args.mode})...")
+        start = time.perf_counter()
+        if args.mode == "static":
+            _quantize_static(float_path, int8_path, calibration_samples, float_solver)
+        else:
+            quantize_dynamic(float_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"Wrote {int8_path} in {time.perf_counter() - start:.1f}s")
+
+        int8_solver = GiftCaptchaSolver(model_variant="int8")
+        try:
+            if not int8_solver.is_initialized:
+                print("Quantized model failed to load, see log/gift_solver.txt")
+                return 1
+
+            float_result = evaluate_solver(float_solver, evaluation_samples)
+            int8_result = evaluate_solver(int8_solver, evaluation_samples)
+        finally:
+            int8_solver.close()
+    finally:
+        float_solver.close()
+
+    report = {
+        "float_model_sha256": file_sha256(float_path),
+        "int8_model": INT8_MODEL_FILE,
+        "mode": args.mode,
+        "samples": len(evaluation_samples),
+        "calibration_samples": len(calibration_samples),
+        # Labels are answers the server accepted, and most were the float model's own answers,
+        # so float accuracy is close to 100% by construction and int8 accuracy is agreement with it
+        "label_source": "server-accepted bot answers",
+        "float_accuracy": float_result["accuracy"],
+        "int8_accuracy": int8_result["accuracy"],
+        "float_char_accuracy": float_result["char_accuracy"],
+        "int8_char_accuracy": int8_result["char_accuracy"],
+        "float_size_bytes": os.path.getsize(float_path),
+        "int8_size_bytes": os.path.getsize(int8_path),
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Float accuracy: {report['float_accuracy']:.2f}% (chars {report['float_char_accuracy']:.2f}%)")
+    print(f"INT8 accuracy:  {report['int8_accuracy']:.2f}% (chars {report['int8_char_accuracy']:.2f}%)")
+    print("Note: labels are answers the server accepted from the bot, so the float figure is inflated (near 100% by "
+          "construction) and the INT8 figure mostly measures agreement with the float model; captchas the float model "
+          "got wrong are not in the labeled set.")
+    print(f"Model size: {report['float_size_bytes'] / 1024:.0f} KB -> {report['int8_size_bytes'] / 1024:.0f} KB")
+    print(f"Report written to {report_path}")
+    return 0
+
+
+def position_log_probs(solver, images, batch_size=None):
+    """
+    Run the model over images and return each image's per-position log probabilities at
+    temperature 1 as a (positions, classes) array, or None where preprocessing failed.
+    """
+    batch_size = batch_size or max(1, solver.max_batch_size)
+    saved_temperature = solver.calibration_temperature
+    solver.calibration_temperature = 1.0
+    input_name = solver.onnx_session.get_inputs()[0].name
+    results = []
+    try:
+        for start in range(0, len(images), batch_size):
+            inputs = [solver._preprocess_image(image_bytes) for image_bytes in images[start:start + batch_size]]
+            valid = [i for i, input_data in enumerate(inputs) if input_data is not None]
+            batch_results = [None] * len(inputs)
+            if valid:
+                outputs = solver.onnx_session.run(None, {input_name: np.concatenate([inputs[i] for i in valid], axis=0)})
+                for row, i in enumerate(valid):
+                    batch_results[i] = np.log(np.clip(
+                        np.stack([solver._as_probabilities(output[row]) for output in outputs]), 1e-12, None))
+            results.extend(batch_results)
+    finally:
+        solver.calibration_temperature = saved_temperature
+    return results
+
+
+def _joint_log_probability(log_probs, indices, temperature):
+    """Log joint probability of the answers at the given class indices after temperature scaling."""
+    scaled = log_probs / temperature
+    scaled = scaled - scaled.max(axis=2, keepdims=True)
+    scaled = scaled - np.log(np.exp(scaled).sum(axis=2, keepdims=True))
+    return np.take_along_axis(scaled, indices[:, :, None], axis=2)[:, :, 0].sum(axis=1)
+
+
+def outcome_nll(log_probs, indices, accepted, temperature):
+    """
+    Mean negative log likelihood of the server verdicts, treating each submitted answer's
+    joint probability (the solver's confidence) as the chance the server accepts it.
+    """
+    joint = np.exp(_joint_log_probability(log_probs, indices, temperature))
+    joint = np.clip(joint, 1e-12, 1 - 1e-12)
+    return float(-np.mean(np.where(accepted, np.log(joint), np.log(1 - joint))))
+
+
+def fit_temperature(log_probs, indices, accepted, low=0.05, high=20.0, iterations=60):
+    """Find the temperature minimizing outcome_nll with a golden-section search over log(T)."""
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = np.log(low), np.log(high)
+    c, d = b - ratio * (b - a), a + ratio * (b - a)
+    fc, fd = outcome_nll(log_probs, indices, accepted, np.exp(c)), outcome_nll(log_probs, indices, accepted, np.exp(d))
+    for _ in range(iterations):
+        if fc < fd:
+            b, d, fd = d, c, fc
+            c = b - ratio * (b - a)
+            fc = outcome_nll(log_probs, indices, accepted, np.exp(c))
+        else:
+            a, c, fc = c, d, fd
+            d = a + ratio * (b - a)
+            fd = outcome_nll(log_probs, indices, accepted, np.exp(d))
+    return float(np.exp((a + b) / 2))
+
+
+def calibration_bins(log_probs, indices, accepted, temperature, edges=(0.0, 0.3, 0.5, 0.7, 0.8, 0.9, 1.0)):
+    """Mean confidence against the server acceptance rate per confidence bin."""
+    joint = np.exp(_joint_log_probability(log_probs, indices, temperature))
+    bins = []
+    for low, high in zip(edges[:-1], edges[1:]):
+        mask = (joint >= low) & ((joint < high) if high < 1.0 else (joint <= high))
+        if mask.any():
+            bins.append({
+                "range": f"{low:.1f}-{high:.1f}",
+                "samples": int(mask.sum()),
+                "confidence": float(joint[mask].mean()),
+                "accepted": float(accepted[mask].mean()),
+            })
+    return bins
+
+
+def calibrate_command(args):
+    metadata_path = os.path.join(MODELS_DIR, METADATA_FILE)
+    store = CaptchaDatasetStore(args.dataset)
+    records = [
+        (record_id, image_bytes, label.upper(), outcome == OUTCOME_ACCEPTED)
+        for record_id, image_bytes, label, outcome in store.iter_records([OUTCOME_ACCEPTED, OUTCOME_REJECTED], args.limit)
+        if label
+    ]
+
+    solver = GiftCaptchaSolver(model_variant=args.variant)
+    if not solver.is_initialized:
+        print("Captcha model failed to load, see log/gift_solver.txt")
+        return 1
+
+    char_to_idx = {char: int(idx) for idx, char in solver.model_metadata['idx_to_char'].items()}
+    positions = solver.model_metadata.get('output_positions', 4)
+    records = [record for record in records if len(record[2]) == positions and all(c in char_to_idx for c in record[2])]
+    accepted_count = sum(1 for record in records if record[3])
+    print(f"Loaded {len(records)} server-checked captcha(s) from {args.dataset}: {accepted_count} accepted, {len(records) - accepted_count} rejected")
+    if accepted_count < args.min_each or len(records) - accepted_count < args.min_each:
+        print(f"At least {args.min_each} accepted and {args.min_each} rejected captchas are needed. "
+              "Accepted answers alone always favour a sharper model, so the fit needs the failures too.")
+        solver.close()
+        return 1
+
+    log_probs = position_log_probs(solver, [image_bytes for _, image_bytes, _, _ in records])
+    solver.close()
+    kept = [i for i, result in enumerate(log_probs) if result is not None]
+    ids = np.array([records[i][0] for i in kept])
+    log_probs = np.stack([log_probs[i] for i in kept])
+    indices = np.array([[char_to_idx[c] for c in records[i][2]] for i in kept])
+    accepted = np.array([records[i][3] for i in kept])
+
+    # Every holdout-th record (by record id) is kept out of the fit to report the result on
+    every = max(2, int(round(1 / args.holdout))) if args.holdout > 0 else 0
+    holdout = (ids % every == 0) if every else np.zeros(len(ids), dtype=bool)
+    fit = ~holdout
+    temperature = fit_temperature(log_probs[fit], indices[fit], accepted[fit])
+
+    report = {
+        "temperature": temperature,
+        "variant": solver.model_variant,
+        "fit_samples": int(fit.sum()),
+        "holdout_samples": int(holdout.sum()),
+        "accepted": int(accepted.sum()),
+        "rejected": int((~accepted).sum()),
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if holdout.any():
+        report["holdout_nll_before"] = outcome_nll(log_probs[holdout], indices[holdout], accepted[holdout], 1.0)
+        report["holdout_nll_after"] = outcome_nll(log_probs[holdout], indices[holdout], accepted[holdout], temperature)
+
+    print(f"Fitted temperature T={temperature:.3f} on {report['fit_samples']} captcha(s) ({solver.model_variant} model)")
+    if holdout.any():
+        print(f"Holdout NLL ({report['holdout_samples']} captchas): {report['holdout_nll_before']:.4f} at T=1 -> {report['holdout_nll_after']:.4f}")
+        for row in calibration_bins(log_probs[holdout], indices[holdout], accepted[holdout], temperature):
+            print(f"  confidence {row['range']}: {row['samples']} captcha(s), mean confidence {row['confidence']:.3f}, accepted {row['accepted']:.3f}")
+    print("Note: only answers the bot submitted are in the store, i.e. those that passed the confidence gate; "
+          "confidence below WOS_CAPTCHA_MIN_CONFIDENCE is extrapolated.")
+
+    if args.dry_run:
+        return 0
+    with open(metadata_path, "r") as f:
+        metadata = json.load(f)
+    metadata["calibration_temperature"] = temperature
+    metadata["calibration"] = report
+    with open(metadata_path, "w") as f:
+        json.dump(metadata, f, indent=2)
+    print(f"Wrote calibration_temperature to {metadata_path}")
+    return 0
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percent / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where the platform does not report it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _parse_int_list(value):
+    try:
+        return [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a comma-separated list of integers, got '{value}'")
+
+
+def benchmark_run(solver, samples, batch_size, repeat=1):
+    """
+    Time solver inference over labeled samples at one batch size.
+
+    Latency is measured per inference call, i.e. the time a caller in that batch waits
+    for its answer, including preprocessing and decoding. Python peak memory is measured
+    in a separate, untimed pass because allocation tracing slows inference down.
+    """
+    latencies_ms = []
+    correct = 0
+    chars_correct = 0
+    chars_total = 0
+    failed = 0
+
+    start = time.perf_counter()
+    for run in range(repeat):
+        for offset in range(0, len(samples), batch_size):
+            batch = samples[offset:offset + batch_size]
+            call_start = time.perf_counter()
+            results = solver._infer_batch_sync([image_bytes for image_bytes, _ in batch])
+            latencies_ms.append((time.perf_counter() - call_start) * 1000)
+            if run > 0:
+                continue
+            for (_, label), result in zip(batch, results):
+                if result is None:
+                    failed += 1
+                predicted = result[0] if result else ""
+                correct += predicted == label
+                chars_correct += sum(1 for a, b in zip(predicted, label) if a == b)
+                chars_total += len(label)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        for offset in range(0, len(samples), batch_size):
+            solver._infer_batch_sync([image_bytes for image_bytes, _ in samples[offset:offset + batch_size]])
+        _, python_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "batch_size": batch_size,
+        "images": len(samples) * repeat,
+        "accuracy": correct / len(samples) * 100 if samples else 0.0,
+        "char_accuracy": chars_correct / chars_total * 100 if chars_total else 0.0,
+        "preprocess_failures": failed,
+        "latency_p50_ms": _percentile(latencies_ms, 50),
+        "latency_p99_ms": _percentile(latencies_ms, 99),
+        "latency_mean_ms": sum(latencies_ms) / len(latencies_ms) if latencies_ms else 0.0,
+        "throughput_per_s": len(samples) * repeat / elapsed if elapsed > 0 else 0.0,
+        "python_peak_mb": python_peak / (1024 * 1024),
+    }
+
+
+def benchmark_command(args):
+    samples = load_labeled_images(args.dataset, args.limit)
+    print(f"Loaded {len(samples)} labeled captcha(s) from {args.dataset}")
+    if not samples:
+        return 1
+
+    results = []
+    solver_info = None
+    for threads in args.threads:
+        session_options = {"intra_op_threads": threads} if threads > 0 else {}
+        load_start = time.perf_counter()
+        solver = GiftCaptchaSolver(session_options=session_options, model_variant=args.variant)
+        load_ms = (time.perf_counter() - load_start) * 1000
+        if not solver.is_initialized:
+            print("Captcha model failed to load, see log/gift_solver.txt")
+            return 1
+
+        if solver_info is None:
+            solver_info = {
+                "variant": solver.model_variant,
+                "model_path": solver.session_info.get("model_path"),
+                "fast_preprocess": solver.fast_preprocess,
+            }
+        batch_limit = solver.max_batch_size if solver.max_batch_size < get_captcha_batch_size() else None
+
+        # Warm up the session so the first timed batch does not pay for allocation
+        solver._infer_batch_sync([image_bytes for image_bytes, _ in samples[:max(args.batch_sizes)]])
+
+        for batch_size in args.batch_sizes:
+            if batch_limit and batch_size > batch_limit:
+                print(f"Skipping batch size {batch_size}: model has a fixed batch size of {batch_limit}")
+                continue
+            run = benchmark_run(solver, samples, batch_size, args.repeat)
+            run["intra_op_threads"] = solver.session_info.get("intra_op_threads")
+            run["session_load_ms"] = load_ms
+            results.append(run)
+            print(
+                f"threads={run['intra_op_threads']} batch={batch_size}: "
+                f"accuracy {run['accuracy']:.2f}% (chars {run['char_accuracy']:.2f}%), "
+                f"p50 {run['latency_p50_ms']:.2f}ms, p99 {run['latency_p99_ms']:.2f}ms, "
+                f"{run['throughput_per_s']:.1f} img/s"
+            )
+        solver.close()
+
+    report = {
+        "dataset": os.path.abspath(args.dataset),
+        "samples": len(samples),
+        "repeat": args.repeat,
+        "cpu_count": os.cpu_count(),
+        "solver": solver_info,
+        "peak_rss_mb": _peak_rss_mb(),
+        "runs": results,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    if args.output == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Benchmark written to {args.output}")
+    return 0
+
+
+def import_command(args):
+    store = CaptchaDatasetStore(args.dataset)
+    counts = store.import_directory(args.dataset, delete=args.delete)
+    imported = sum(count for name, count in counts.items() if name != "skipped")
+    print(f"Imported {imported} image(s) into {os.path.join(args.dataset, 'shard_*.bin')}: "
+          + ", ".join(f"{name} {count}" for name, count in counts.items()))
+    summary = store.get_summary()
+    print(f"Store now holds {summary['records']} image(s) in {summary['shards']} shard(s), {summary['bytes'] / (1024 * 1024):.1f} MB")
+    return 0
+
+
+def serve_command(args):
+    address = args.address or get_captcha_service_address() or "tcp:127.0.0.1:8765"
+    solver = GiftCaptchaSolver()
+    if not solver.is_initialized:
+        print("Captcha model failed to load, see log/gift_solver.txt")
+        return 1
+
+    print(f"Captcha model ready: {solver.get_session_summary()}")
+    print(f"Serving captcha solves on {address} (set WOS_CAPTCHA_SERVICE={address} for the bot)")
+    service = CaptchaSolverService(solver, address)
+    try:
+        asyncio.run(service.serve_forever(stats_interval=args.stats_interval))
+    except KeyboardInterrupt:
+        print(f"Stopped. {service.get_summary()}")
+    finally:
+        solver.close()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Gift code captcha solver tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    quantize = subparsers.add_parser("quantize", help="Build and validate the INT8 captcha model")
+    quantize.add_argument("--dataset", default="captcha_images", help="Directory of solved captcha images")
+    quantize.add_argument("--mode", choices=["dynamic", "static"], default="dynamic", help="Quantization mode")
+    quantize.add_argument("--calibration-size", type=int, default=200, help="Images used to calibrate static quantization (at most half; the rest are used for evaluation)")
+    quantize.add_argument("--limit", type=int, default=None, help="Maximum number of labeled images to use")
+    quantize.set_defaults(func=quantize_command)
+
+    calibrate = subparsers.add_parser("calibrate", help="Fit the confidence temperature to server verdicts on saved captchas")
+    calibrate.add_argument("--dataset", default="captcha_images", help="Captcha dataset store with accepted and rejected captchas")
+    calibrate.add_argument("--variant", choices=["auto", "float", "int8"], default=None, help="Model variant (defaults to WOS_CAPTCHA_MODEL_VARIANT)")
+    calibrate.add_argument("--holdout", type=float, default=0.2, help="Share of captchas kept out of the fit to report on (0 disables)")
+    calibrate.add_argument("--min-each", type=int, default=20, help="Minimum accepted and rejected captchas required")
+    calibrate.add_argument("--limit", type=int, default=None, help="Maximum number of captchas to use")
+    calibrate.add_argument("--dry-run", action="store_true", help="Report the fit without writing the metadata")
+    calibrate.set_defaults(func=calibrate_command)
+
+    benchmark = subparsers.add_parser("benchmark", help="Measure captcha solver accuracy, latency and throughput")
+    benchmark.add_argument("--dataset", default="captcha_images", help="Directory of solved captcha images")
+    benchmark.add_argument("--limit", type=int, default=None, help="Maximum number of labeled images to use")
+    benchmark.add_argument("--variant", choices=["auto", "float", "int8"], default=None, help="Model variant (defaults to WOS_CAPTCHA_MODEL_VARIANT)")
+    benchmark.add_argument("--batch-sizes", type=_parse_int_list, default=[1, 4, 8, 16], help="Comma-separated batch sizes to time")
+    benchmark.add_argument("--threads", type=_parse_int_list, default=[1, 2, 4], help="Comma-separated intra-op thread counts (0 uses the configured profile)")
+    benchmark.add_argument("--repeat", type=int, default=3, help="Passes over the dataset per configuration")
+    benchmark.add_argument("--output", default="captcha_benchmark.json", help="JSON report path, or - for stdout")
+    benchmark.set_defaults(func=benchmark_command)
+
+    import_parser = subparsers.add_parser("import", help="Pack loose captcha images into the captcha dataset store")
+    import_parser.add_argument("--dataset", default="captcha_images", help="Directory of loose captcha images (also the store location)")
+    import_parser.add_argument("--delete", action="store_true", help="Delete each loose image once it is packed")
+    import_parser.set_defaults(func=import_command)
+
+    serve = subparsers.add_parser("serve", help="Serve captcha solves to local bot processes from one model instance")
+    serve.add_argument("--address", default=None, help="unix:/path/to.sock or tcp:host:port (defaults to WOS_CAPTCHA_SERVICE, then tcp:127.0.0.1:8765)")
+    serve.add_argument("--stats-interval", type=int, default=60, help="Seconds between queue depth and latency reports (0 disables)")
+    serve.set_defaults(func=serve_command)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    sys.exit(args.func(args))
@@ -5,6 +5,7 @@ import sqlite3
 import asyncio
 from datetime import datetime
 import os
+from .login_handler import PRIORITY_MANUAL
 
 class Alliance(commands.Cog):
     def __init__(self, bot, conn):
@@ -479,8 +480,7 @@ class Alliance(commands.Cog):
                             
                             if selected_value == "all":
                                 # Get initial queue position
-                                queue_info = control_cog.login_handler.get_queue_info()
-                                initial_queue_pos = queue_info['queue_size'] + 1
+                                initial_queue_pos = control_cog.login_handler.get_queue_position(PRIORITY_MANUAL)
                                 
                                 progress_embed = discord.Embed(
                                     title="⏳ Alliance Control Operation",
@@ -519,6 +519,7 @@ class Alliance(commands.Cog):
                                                 batch_info={'current': idx + 1, 'total': len(alliances), 'all_names': qa}
                                             ),
                                             'description': f'Manual control check for alliance {name}',
+                                            'priority': PRIORITY_MANUAL,
                                             'alliance_id': alliance_id,
                                             'interaction_message': msg
                                         })
@@ -546,8 +547,7 @@ class Alliance(commands.Cog):
                                 channel = self.bot.get_channel(channel_id) if channel_id else select_interaction.channel
                                 
                                 # Get queue info for position
-                                queue_info = control_cog.login_handler.get_queue_info()
-                                queue_position = queue_info['queue_size'] + 1
+                                queue_position = control_cog.login_handler.get_queue_position(PRIORITY_MANUAL, alliance_id)
                                 
                                 status_embed = discord.Embed(
                                     title="⏳ Alliance Control Operation",
@@ -568,6 +568,7 @@ class Alliance(commands.Cog):
                                     'type': 'alliance_control',
                                     'callback': lambda ch=channel, aid=alliance_id, im=msg, an=alliance_name: control_cog.check_agslist(ch, aid, interaction_message=im, alliance_name=an),
                                     'description': f'Manual control check for alliance {alliance_name}',
+                                    'priority': PRIORITY_MANUAL,
                                     'alliance_id': alliance_id,
                                     'interaction_message': msg
                                 })
@@ -9,7 +9,7 @@ from datetime import datetime
 import os
 import csv
 import io
-from .login_handler import LoginHandler
+from .login_handler import LoginHandler, PRIORITY_INTERACTIVE
 
 class PaginationView(discord.ui.View):
     def __init__(self, chunks: List[discord.Embed], author_id: int):
@@ -1127,6 +1127,7 @@ class AllianceMemberOperations(commands.Cog):
             'type': 'member_addition',
             'callback': lambda: self._process_add_user(interaction, alliance_id, alliance_name, ids),
             'description': f"Add members to {alliance_name}",
+            'priority': PRIORITY_INTERACTIVE,
             'alliance_id': alliance_id,
             'interaction': interaction
         })
@@ -1137,6 +1138,8 @@ class AllianceMemberOperations(commands.Cog):
         member_count = len(ids.split(',') if ',' in ids else ids.split('\n'))
         
         if queue_position > 1:  # Not the first in queue
+            estimated_wait = self.login_handler.estimate_wait_time(queue_position)
+            wait_text = f"⏱️ Estimated wait: ~{max(1, round(estimated_wait / 60))} min\n" if estimated_wait else ""
             queue_embed = discord.Embed(
                 title="⏳ Operation Queued",
                 description=(
@@ -1144,7 +1147,8 @@ class AllianceMemberOperations(commands.Cog):
                     f"**Your operation has been queued:**\n"
                     f"📍 Queue Position: `{queue_position}`\n"
                     f"🏰 Alliance: {alliance_name}\n"
-                    f"👥 Members to add: {member_count}\n\n"
+                    f"👥 Members to add: {member_count}\n"
+                    f"{wait_text}\n"
                     f"You will be notified when your operation starts."
                 ),
                 color=discord.Color.orange()
@@ -1286,10 +1290,6 @@ class AllianceMemberOperations(commands.Cog):
                 await message.edit(embed=embed)
                 last_edit_ts = now
         
-        # Reset rate limit tracking for this operation
-        self.login_handler.api1_requests = []
-        self.login_handler.api2_requests = []
-        
         # Check API availability before starting
         embed.description = "🔍 Checking API availability..."
         await maybe_edit(force=True)
@@ -1370,7 +1370,7 @@ class AllianceMemberOperations(commands.Cog):
                     await maybe_edit()
                     
                     # Fetch player data using login handler
-                    result = await self.login_handler.fetch_player_data(fid)
+                    result = await self.login_handler.fetch_player_data(fid, max_age=300)
                     
                     with open(log_file_path, 'a', encoding='utf-8') as log_file:
                         log_file.write(f"\nAPI Response for ID {fid}:\n")
@@ -1380,7 +1380,7 @@ class AllianceMemberOperations(commands.Cog):
                     
                     if result['status'] == 'rate_limited':
                         # Handle rate limiting with countdown
-                        wait_time = result.get('wait_time', 60)
+                        wait_time = max(5.0, result.get('wait_time', 60))
                         countdown_start = time.time()
                         remaining_time = wait_time
                         
@@ -1562,8 +1562,8 @@ class AllianceMemberOperations(commands.Cog):
                 log_file.write(f"Failed: {error_count}\n")
                 log_file.write(f"Already Exists: {already_exists_count}\n")
                 log_file.write(f"API Mode: {self.login_handler.get_mode_text()}\n")
-                log_file.write(f"API1 Requests: {len(self.login_handler.api1_requests)}\n")
-                log_file.write(f"API2 Requests: {len(self.login_handler.api2_requests)}\n")
+                for api_num, limiter in self.login_handler.api_limiters.items():
+                    log_file.write(f"API{api_num} Requests: {len(limiter)}\n")
                 log_file.write(f"{'='*50}\n")
 
         except Exception as e:
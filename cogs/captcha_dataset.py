@@ -0,0 +1,205 @@
+"""
+Append-only packed store for captcha images and their redemption outcomes.
+
+Images are appended to numbered shard files (shard_00000.bin, ...) and indexed in a
+sqlite table with their shard, offset, length and label. A new shard is started once
+the current one would exceed the configured size, so old shards can be archived or
+pruned as whole files.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from wos_config import get_captcha_shard_mb
+
+# Server accepted the answer, so the label is correct
+OUTCOME_ACCEPTED = "accepted"
+# Server rejected the answer (CAPTCHA_INVALID); the label is the wrong guess
+OUTCOME_REJECTED = "rejected"
+# OCR answer from the test button, never checked by the server
+OUTCOME_UNVERIFIED = "unverified"
+# OCR produced no usable answer
+OUTCOME_FAILED = "failed"
+
+INDEX_FILE = "index.sqlite"
+SHARD_PATTERN = re.compile(r"^shard_(\d{5})\.bin$")
+
+# Loose files written by earlier versions: "<CODE>.png", "<CODE>_<n>.png",
+# "FAIL_SERVER_<CODE>_<ts>.png" and "FAIL_<TAG>_<ts>.png"
+LEGACY_ACCEPTED_PATTERN = re.compile(r"^([A-Z2-9]{4})(?:_\d+)?\.(?:png|jpe?g)$", re.IGNORECASE)
+LEGACY_REJECTED_PATTERN = re.compile(r"^FAIL_SERVER_([A-Z0-9_]+?)_\d+(?:_\d+)?\.(?:png|jpe?g)$", re.IGNORECASE)
+LEGACY_FAILED_PATTERN = re.compile(r"^FAIL_.*\.(?:png|jpe?g)$", re.IGNORECASE)
+
+
+class CaptchaDatasetStore:
+    def __init__(self, root='captcha_images', max_shard_bytes=None):
+        """
+        Args:
+            root (str): Directory holding the shards and index.
+            max_shard_bytes (int, optional): Shard rotation size (defaults to WOS_CAPTCHA_SHARD_MB).
+        """
+        self.root = root
+        self.max_shard_bytes = max_shard_bytes or get_captcha_shard_mb() * 1024 * 1024
+        self._lock = threading.Lock()
+        self._conn = None
+        self._shard_number = None
+        self._shard_size = 0
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.root, INDEX_FILE), check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS captchas (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    shard INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    crc32 INTEGER NOT NULL,
+                    label TEXT,
+                    outcome TEXT NOT NULL,
+                    method TEXT,
+                    fid TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_captchas_outcome ON captchas (outcome)")
+            self._conn.commit()
+        return self._conn
+
+    def _shard_path(self, number):
+        return os.path.join(self.root, f"shard_{number:05d}.bin")
+
+    def _open_shard(self, incoming_size):
+        """Pick the shard the next record goes to, rotating when it would grow past the limit."""
+        if self._shard_number is None:
+            numbers = [int(m.group(1)) for m in map(SHARD_PATTERN.match, os.listdir(self.root)) if m]
+            self._shard_number = max(numbers) if numbers else 0
+            path = self._shard_path(self._shard_number)
+            self._shard_size = os.path.getsize(path) if os.path.exists(path) else 0
+
+        if self._shard_size > 0 and self._shard_size + incoming_size > self.max_shard_bytes:
+            self._shard_number += 1
+            self._shard_size = 0
+        return self._shard_number
+
+    def append(self, image_bytes, label, outcome, method=None, fid=None, created_at=None):
+        """
+        Append one captcha image to the store.
+
+        Returns:
+            int: The record id.
+        """
+        with self._lock:
+            conn = self._connect()
+            shard = self._open_shard(len(image_bytes))
+            with open(self._shard_path(shard), "ab") as f:
+                offset = f.tell()
+                f.write(image_bytes)
+            self._shard_size = offset + len(image_bytes)
+
+            cursor = conn.execute(
+                "INSERT INTO captchas (shard, offset, length, crc32, label, outcome, method, fid, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (shard, offset, len(image_bytes), zlib.crc32(image_bytes), label, outcome, method,
+                 str(fid) if fid is not None else None, created_at or time.time())
+            )
+            conn.commit()
+            return cursor.lastrowid
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.root, INDEX_FILE))
+
+    def iter_records(self, outcomes=None, limit=None):
+        """
+        Yield (record_id, image_bytes, label, outcome) in insertion order.
+
+        Records whose bytes fail the checksum (e.g. a torn write) are skipped.
+        """
+        if not self.exists():
+            return
+        query = "SELECT id, shard, offset, length, crc32, label, outcome FROM captchas"
+        params = []
+        if outcomes:
+            query += f" WHERE outcome IN ({','.join('?' * len(outcomes))})"
+            params.extend(outcomes)
+        query += " ORDER BY id"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+
+        handles = {}
+        try:
+            for record_id, shard, offset, length, crc, label, outcome in rows:
+                if shard not in handles:
+                    path = self._shard_path(shard)
+                    if not os.path.exists(path):
+                        continue
+                    handles[shard] = open(path, "rb")
+                f = handles[shard]
+                f.seek(offset)
+                image_bytes = f.read(length)
+                if len(image_bytes) != length or zlib.crc32(image_bytes) != crc:
+                    continue
+                yield record_id, image_bytes, label, outcome
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def load_labeled(self, limit=None):
+        """Get (image_bytes, label) pairs for answers the server accepted."""
+        return [(image_bytes, label) for _, image_bytes, label, _ in self.iter_records([OUTCOME_ACCEPTED], limit)]
+
+    def import_directory(self, path, delete=False):
+        """
+        Pack loose captcha images written by earlier versions into the store.
+
+        Returns:
+            dict: Imported counts per outcome, plus 'skipped'.
+        """
+        counts = {OUTCOME_ACCEPTED: 0, OUTCOME_REJECTED: 0, OUTCOME_FAILED: 0, "skipped": 0}
+        for name in sorted(os.listdir(path)):
+            file_path = os.path.join(path, name)
+            if not os.path.isfile(file_path):
+                continue
+
+            label = None
+            accepted_match = LEGACY_ACCEPTED_PATTERN.match(name)
+            rejected_match = LEGACY_REJECTED_PATTERN.match(name)
+            if accepted_match:
+                outcome, label = OUTCOME_ACCEPTED, accepted_match.group(1).upper()
+            elif rejected_match:
+                outcome, label = OUTCOME_REJECTED, rejected_match.group(1).upper()
+            elif LEGACY_FAILED_PATTERN.match(name):
+                outcome = OUTCOME_FAILED
+            else:
+                counts["skipped"] += 1
+                continue
+
+            with open(file_path, "rb") as f:
+                image_bytes = f.read()
+            self.append(image_bytes, label, outcome, method="import", created_at=os.path.getmtime(file_path))
+            counts[outcome] += 1
+            if delete:
+                os.remove(file_path)
+        return counts
+
+    def get_summary(self):
+        """Get record counts per outcome and the on-disk size of the store."""
+        if not self.exists():
+            return {"records": 0, "outcomes": {}, "shards": 0, "bytes": 0}
+        with self._lock:
+            rows = self._connect().execute("SELECT outcome, COUNT(*) FROM captchas GROUP BY outcome").fetchall()
+        shards = [name for name in os.listdir(self.root) if SHARD_PATTERN.match(name)]
+        return {
+            "records": sum(count for _, count in rows),
+            "outcomes": dict(rows),
+            "shards": len(shards),
+            "bytes": sum(os.path.getsize(os.path.join(self.root, name)) for name in shards),
+        }
@@ -0,0 +1,401 @@
+"""
+Local captcha solver service.
+
+One process (python captcha_tools.py serve) holds the ONNX model and serves solves over a
+Unix socket or a loopback TCP port. Bot processes configured with WOS_CAPTCHA_SERVICE use
+RemoteCaptchaSolver, which has the same interface as GiftCaptchaSolver, instead of loading
+their own copy of the model. Concurrent requests from all clients share the solver's
+micro-batching.
+
+Frames are a ">II" header (metadata length, payload length), a JSON metadata object and
+the raw payload (the captcha image for solve/remember requests).
+"""
+import asyncio
+import json
+import os
+import struct
+import time
+from collections import deque
+
+from wos_config import get_captcha_min_confidence, get_captcha_service_address
+
+from .gift_captchasolver import GiftCaptchaSolver, get_solver_logger
+
+FRAME_HEADER = struct.Struct(">II")
+MAX_METADATA_BYTES = 64 * 1024
+MAX_PAYLOAD_BYTES = 1024 * 1024
+MAX_IDLE_CONNECTIONS = 8
+RECONNECT_MAX_DELAY = 60.0
+
+
+def parse_service_address(address):
+    """
+    Parse 'unix:/path/to.sock', 'tcp:host:port' or 'host:port'.
+
+    Returns:
+        tuple: ('unix', path) or ('tcp', (host, port)).
+    """
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    if address.startswith("tcp:"):
+        address = address[len("tcp:"):]
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid captcha service address '{address}' (expected unix:/path or tcp:host:port)")
+    return "tcp", (host, int(port))
+
+
+async def open_service_connection(address):
+    kind, target = parse_service_address(address)
+    if kind == "unix":
+        return await asyncio.open_unix_connection(target)
+    return await asyncio.open_connection(*target)
+
+
+def write_frame(writer, metadata, payload=b""):
+    encoded = json.dumps(metadata).encode("utf-8")
+    writer.write(FRAME_HEADER.pack(len(encoded), len(payload)) + encoded + payload)
+
+
+async def read_frame(reader):
+    """Read one frame. Raises asyncio.IncompleteReadError when the peer closes the connection."""
+    metadata_length, payload_length = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if metadata_length > MAX_METADATA_BYTES or payload_length > MAX_PAYLOAD_BYTES:
+        raise ValueError(f"Frame too large ({metadata_length} + {payload_length} bytes)")
+    metadata = json.loads(await reader.readexactly(metadata_length))
+    payload = await reader.readexactly(payload_length) if payload_length else b""
+    return metadata, payload
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))]
+
+
+class CaptchaSolverService:
+    def __init__(self, solver, address):
+        """
+        Args:
+            solver (GiftCaptchaSolver): The initialized solver shared by all clients.
+            address (str): Listen address, see parse_service_address().
+        """
+        self.solver = solver
+        self.address = address
+        self.logger = get_solver_logger()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+        self.latencies_ms = deque(maxlen=1000)
+
+    async def serve_forever(self, stats_interval=60):
+        kind, target = parse_service_address(self.address)
+        if kind == "unix":
+            if os.path.exists(target):
+                os.remove(target)
+            server = await asyncio.start_unix_server(self._handle_client, path=target)
+        else:
+            server = await asyncio.start_server(self._handle_client, *target)
+
+        self.logger.info(f"[Service] Serving captcha solves on {self.address}")
+        reporter = asyncio.create_task(self._report_stats(stats_interval)) if stats_interval else None
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if reporter:
+                reporter.cancel()
+            if kind == "unix" and os.path.exists(target):
+                os.remove(target)
+
+    async def _report_stats(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            self.logger.info(f"[Service] {self.get_summary()}")
+            print(self.get_summary(), flush=True)
+
+    async def _handle_client(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    metadata, payload = await read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                response = await self._dispatch(metadata, payload)
+                write_frame(writer, response)
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            self.logger.warning(f"[Service] Dropping client connection: {e}")
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _dispatch(self, metadata, payload):
+        op = metadata.get("op")
+        try:
+            if op == "solve":
+                return await self._solve(metadata, payload)
+            if op == "remember":
+                self.solver.remember_answer(payload, metadata.get("text"), bool(metadata.get("accepted")))
+                return {"ok": True}
+            if op == "info":
+                return {"ready": self.solver.is_initialized, "summary": self.solver.get_session_summary(), "stats": self.get_stats()}
+            if op == "stats":
+                return {"stats": self.get_stats()}
+            return {"error": f"unknown op '{op}'"}
+        except Exception as e:
+            self.errors += 1
+            self.logger.exception(f"[Service] Request '{op}' failed: {e}")
+            return {"error": str(e)}
+
+    async def _solve(self, metadata, payload):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        start = time.perf_counter()
+        try:
+            ranked, success, method, confidence = await self.solver.solve_captcha_ranked(
+                payload, fid=metadata.get("fid"), attempt=metadata.get("attempt", 0)
+            )
+        finally:
+            self.in_flight -= 1
+            self.latencies_ms.append((time.perf_counter() - start) * 1000)
+        return {"ranked": ranked, "success": success, "method": method, "confidence": confidence, "stats": self.get_stats()}
+
+    def get_stats(self):
+        """Solver stats plus service queue depth and solve latency."""
+        stats = self.solver.get_stats()
+        stats.update({
+            "service_queue_depth": self.in_flight,
+            "service_max_queue_depth": self.max_in_flight,
+            "service_connections": self.connections,
+            "service_requests": self.requests,
+            "service_errors": self.errors,
+            "service_latency_p50_ms": _percentile(self.latencies_ms, 50),
+            "service_latency_p99_ms": _percentile(self.latencies_ms, 99),
+        })
+        return stats
+
+    def get_summary(self):
+        stats = self.get_stats()
+        return (
+            f"requests={stats['service_requests']}, queue={stats['service_queue_depth']} (max {stats['service_max_queue_depth']}), "
+            f"clients={stats['service_connections']}, p50={stats['service_latency_p50_ms']:.1f}ms, "
+            f"p99={stats['service_latency_p99_ms']:.1f}ms, avg batch={stats['avg_batch_size']:.2f}, errors={stats['service_errors']}"
+        )
+
+
+class RemoteCaptchaSolver:
+    # Confidence gating and run stats are tracked per client, exactly as in the local solver
+    solve_captcha = GiftCaptchaSolver.solve_captcha
+    should_submit = GiftCaptchaSolver.should_submit
+    record_outcome = GiftCaptchaSolver.record_outcome
+    get_confidence_report = GiftCaptchaSolver.get_confidence_report
+    reset_run_stats = GiftCaptchaSolver.reset_run_stats
+    get_run_stats_report = GiftCaptchaSolver.get_run_stats_report
+
+    def __init__(self, address, save_images=0, timeout=30.0, connect_retries=5):
+        """
+        Client for a CaptchaSolverService with the GiftCaptchaSolver interface.
+
+        Args:
+            address (str): Service address, see parse_service_address().
+            save_images (int): Image saving mode (0=None, 1=Failed, 2=Success, 3=All).
+            timeout (float): Seconds to wait for a connection or a response.
+            connect_retries (int): Handshake attempts before reporting the service unavailable; the client keeps
+                reconnecting in the background after that, so the service can start after the bot.
+        """
+        parse_service_address(address)
+        self.address = address
+        self.save_images_mode = save_images
+        self.timeout = timeout
+        self.connect_retries = connect_retries
+        self.logger = get_solver_logger()
+
+        self.is_initialized = False
+        self.load_state = "pending"
+        self._ready_task = None
+        self._settled = None
+        self._idle_connections = []
+        self._pending_tasks = set()
+
+        self.min_confidence = get_captcha_min_confidence()
+        self.confidence_outcomes = deque(maxlen=5000)
+        self.server_summary = ""
+        self.server_stats = {}
+        self.latencies_ms = deque(maxlen=1000)
+        self.request_errors = 0
+        self.reset_run_stats()
+
+    def start_background_load(self):
+        """Connect to the service in the background. Does nothing if already started."""
+        if self.load_state == "pending":
+            self.load_state = "loading"
+            self._settled = asyncio.Event()
+            self._ready_task = asyncio.get_running_loop().create_task(self._handshake())
+
+    async def wait_until_ready(self, timeout=None):
+        """
+        Wait for the service handshake, starting it if needed. Returns as soon as the first connect_retries
+        attempts have failed; the handshake keeps retrying in the background.
+
+        Returns:
+            bool: True if the service is reachable and its model is ready.
+        """
+        self.start_background_load()
+        try:
+            await asyncio.wait_for(self._settled.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.is_initialized
+
+    async def _handshake(self):
+        delay = 2.0
+        attempt = 0
+        while True:
+            attempt += 1
+            info, error = await self._request({"op": "info"})
+            if error is None and info.get("ready"):
+                break
+            if error is None:
+                error = f"model not ready ({info.get('summary', '')})"
+            if attempt <= self.connect_retries:
+                self.logger.warning(f"[Remote] Captcha service {self.address} unavailable (attempt {attempt}/{self.connect_retries}): {error}")
+            if attempt == self.connect_retries:
+                # Stop holding up callers, but keep trying so a service that starts late is still picked up
+                self.load_state = "reconnecting"
+                self._settled.set()
+                self.logger.warning(f"[Remote] Captcha service {self.address} still unavailable; reconnecting every {RECONNECT_MAX_DELAY:.0f}s at most")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        self.server_summary = info.get("summary", "")
+        self.server_stats = info.get("stats", {})
+        self.is_initialized = True
+        self.load_state = "ready"
+        self._settled.set()
+        self.logger.info(f"[Remote] Captcha service {self.address} ready after {attempt} attempt(s): {self.server_summary}")
+
+    async def _request(self, metadata, payload=b""):
+        """
+        Send one request, reusing an idle connection when available; a stale one is retried once on a fresh connection.
+
+        Returns:
+            tuple: (response, error) - the response metadata and None, or None and a description of the failure.
+        """
+        error = "no response"
+        for _ in range(2):
+            reused = bool(self._idle_connections)
+            try:
+                if reused:
+                    reader, writer = self._idle_connections.pop()
+                else:
+                    reader, writer = await asyncio.wait_for(open_service_connection(self.address), self.timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                return None, f"connect failed: {str(e) or type(e).__name__}"
+            try:
+                write_frame(writer, metadata, payload)
+                await writer.drain()
+                response, _ = await asyncio.wait_for(read_frame(reader), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                error = f"connection lost: {str(e) or type(e).__name__}"
+                if reused:
+                    # The service restarted; the other idle connections are stale too
+                    self._close_idle_connections()
+                    continue
+                return None, error
+            except (OSError, asyncio.TimeoutError, ValueError) as e:
+                writer.close()
+                return None, f"request failed: {str(e) or type(e).__name__}"
+            except BaseException:
+                writer.close()
+                raise
+
+            if len(self._idle_connections) < MAX_IDLE_CONNECTIONS:
+                self._idle_connections.append((reader, writer))
+            else:
+                writer.close()
+            if not isinstance(response, dict):
+                return None, "malformed response"
+            if "error" in response:
+                return None, str(response["error"])
+            return response, None
+        return None, error
+
+    async def solve_captcha_ranked(self, image_bytes, fid=None, attempt=0):
+        """Solve a captcha on the service. Same return value as GiftCaptchaSolver.solve_captcha_ranked."""
+        if not await self.wait_until_ready():
+            self.logger.error(f"[Remote] Captcha service not ready. Cannot solve captcha for ID {fid}.")
+            return [], False, "ONNX", 0.0
+
+        self.run_stats["total_attempts"] += 1
+        start = time.perf_counter()
+        response, error = await self._request({"op": "solve", "fid": str(fid) if fid is not None else None, "attempt": attempt}, image_bytes)
+        if error is None and not all(key in response for key in ("success", "ranked", "method", "confidence")):
+            error = "incomplete solve response"
+        if error is not None:
+            self.request_errors += 1
+            self.run_stats["failures"] += 1
+            self.logger.error(f"[Remote] ID {fid}, Attempt {attempt+1}: Captcha service request failed: {error}")
+            return [], False, "ONNX", 0.0
+        self.latencies_ms.append((time.perf_counter() - start) * 1000)
+
+        self.server_stats = response.get("stats", self.server_stats)
+        self.run_stats["successful_decodes" if response["success"] else "failures"] += 1
+        ranked = [tuple(candidate) for candidate in response["ranked"]]
+        return ranked, response["success"], response["method"], response["confidence"]
+
+    def remember_answer(self, image_bytes, text, accepted):
+        """Report a server verdict to the service's shared answer cache (fire and forget)."""
+        task = asyncio.get_running_loop().create_task(self._remember(image_bytes, text, accepted))
+        self._pending_tasks.add(task)
+        task.add_done_callback(self._pending_tasks.discard)
+
+    async def _remember(self, image_bytes, text, accepted):
+        _, error = await self._request({"op": "remember", "text": text, "accepted": accepted}, image_bytes)
+        if error is not None:
+            self.logger.warning(f"[Remote] Failed to report captcha verdict to service: {error}")
+
+    def get_stats(self):
+        """Service stats from the last response, plus this client's round-trip latency."""
+        stats = {"cache_hits": 0, "cache_hit_rate": 0.0, "cache_promoted": 0}
+        stats.update(self.server_stats)
+        stats.update({
+            "client_requests": len(self.latencies_ms),
+            "client_errors": self.request_errors,
+            "client_latency_p50_ms": _percentile(self.latencies_ms, 50),
+            "client_latency_p99_ms": _percentile(self.latencies_ms, 99),
+        })
+        return stats
+
+    def get_session_summary(self):
+        if not self.is_initialized:
+            return "not loaded" if self.load_state == "pending" else self.load_state
+        stats = self.get_stats()
+        return (
+            f"remote {self.address} ({self.server_summary}), queue {stats.get('service_queue_depth', 0)}, "
+            f"round trip p50 {stats['client_latency_p50_ms']:.1f}ms / p99 {stats['client_latency_p99_ms']:.1f}ms"
+        )
+
+    def close(self):
+        """Stop reconnecting and close the idle connections."""
+        if self._ready_task is not None and not self._ready_task.done():
+            self._ready_task.cancel()
+        self._close_idle_connections()
+
+    def _close_idle_connections(self):
+        for _, writer in self._idle_connections:
+            writer.close()
+        self._idle_connections = []
+
+
+def create_captcha_solver(save_images=0, lazy=False):
+    """Create the configured solver: a RemoteCaptchaSolver when WOS_CAPTCHA_SERVICE is set, else a local GiftCaptchaSolver."""
+    address = get_captcha_service_address()
+    if address:
+        return RemoteCaptchaSolver(address, save_images=save_images)
+    return GiftCaptchaSolver(save_images=save_images, lazy=lazy)
@@ -0,0 +1,166 @@
+"""
+Per-endpoint circuit breakers for the WOS upstream APIs.
+
+A breaker watches the outcomes of recent calls to one endpoint. When too many of them
+fail or are too slow it opens, and callers fail fast instead of waiting out timeouts.
+After a cool-off it lets a single trial call through (half-open); a success closes it
+again, a failure reopens it for twice as long (up to max_open_seconds).
+"""
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+_breakers: Dict[str, "CircuitBreaker"] = {}
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, log: Optional[Callable[[str], None]] = None, window_seconds: float = 60,
+                 min_calls: int = 5, failure_rate_threshold: float = 0.5, slow_call_seconds: float = 10,
+                 slow_call_rate_threshold: float = 0.5, open_seconds: float = 30, max_open_seconds: float = 300):
+        """
+        Args:
+            name: Endpoint name shown in logs and status.
+            log: Called with a message on every state change.
+            window_seconds: How far back call outcomes are considered.
+            min_calls: Calls needed in the window before the breaker can open.
+            failure_rate_threshold: Failed share of calls that opens the breaker.
+            slow_call_seconds: Calls slower than this count as slow.
+            slow_call_rate_threshold: Slow share of calls that opens the breaker.
+            open_seconds: First cool-off before a trial call is allowed.
+            max_open_seconds: Cap for the cool-off, which doubles on each failed trial.
+        """
+        self.name = name
+        self.log = log
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+
+        self.state = STATE_CLOSED
+        self.calls = deque()  # (timestamp, failed, slow)
+        self.open_seconds = open_seconds
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.trial_started_at = 0.0
+        self.stats = {'rejected': 0, 'opened': 0}
+        self.last_failure = None
+
+    def _expire(self, now: float):
+        while self.calls and now - self.calls[0][0] > self.window_seconds:
+            self.calls.popleft()
+
+    def _set_state(self, state: str, reason: str = ""):
+        if state == self.state:
+            return
+        previous, self.state = self.state, state
+        if state == STATE_OPEN:
+            self.opened_at = time.time()
+            self.stats['opened'] += 1
+        if self.log:
+            message = f"Circuit {self.name}: {previous} -> {state}"
+            self.log(f"{message} ({reason})" if reason else message)
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker allows a trial call (0 if calls are allowed)"""
+        if self.state != STATE_OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - time.time())
+
+    def _trial_pending(self) -> bool:
+        """A half-open trial whose outcome was never recorded (e.g. a cancelled caller) expires"""
+        return self.trial_in_flight and time.time() - self.trial_started_at < 3 * self.slow_call_seconds
+
+    def is_available(self) -> bool:
+        """Whether a call would currently be allowed, without claiming the half-open trial"""
+        if self.state == STATE_CLOSED:
+            return True
+        if self.state == STATE_OPEN:
+            return self.retry_after() <= 0
+        return not self._trial_pending()
+
+    def allow_request(self) -> bool:
+        """Claim permission for one call; record its outcome with record_success/record_failure"""
+        if self.state == STATE_OPEN and self.retry_after() <= 0:
+            self._set_state(STATE_HALF_OPEN, "cool-off elapsed, trying one call")
+        if self.state == STATE_CLOSED:
+            return True
+        if self.state == STATE_HALF_OPEN and not self._trial_pending():
+            self.trial_in_flight = True
+            self.trial_started_at = time.time()
+            return True
+        self.stats['rejected'] += 1
+        return False
+
+    def record_success(self, latency: float):
+        slow = latency > self.slow_call_seconds
+        if self.state == STATE_HALF_OPEN:
+            self.trial_in_flight = False
+            if slow:
+                self._reopen(f"trial call took {latency:.1f}s")
+                return
+            self.calls.clear()
+            self.open_seconds = self.base_open_seconds
+            self._set_state(STATE_CLOSED, f"trial call succeeded in {latency:.1f}s")
+            return
+        self._record(False, slow)
+
+    def record_failure(self, latency: float, error: str = ""):
+        self.last_failure = error or None
+        if self.state == STATE_HALF_OPEN:
+            self.trial_in_flight = False
+            self._reopen(f"trial call failed: {error}" if error else "trial call failed")
+            return
+        self._record(True, latency > self.slow_call_seconds)
+
+    def _reopen(self, reason: str):
+        self.open_seconds = min(self.open_seconds * 2, self.max_open_seconds)
+        self._set_state(STATE_OPEN, f"{reason}; retry in {self.open_seconds:.0f}s")
+
+    def _record(self, failed: bool, slow: bool):
+        now = time.time()
+        self.calls.append((now, failed, slow))
+        self._expire(now)
+        if self.state != STATE_CLOSED or len(self.calls) < self.min_calls:
+            return
+        failure_rate = sum(1 for _, f, _ in self.calls if f) / len(self.calls)
+        slow_rate = sum(1 for _, _, s in self.calls if s) / len(self.calls)
+        if failure_rate >= self.failure_rate_threshold:
+            self._set_state(STATE_OPEN, f"{failure_rate * 100:.0f}% of {len(self.calls)} calls failed; retry in {self.open_seconds:.0f}s")
+        elif slow_rate >= self.slow_call_rate_threshold:
+            self._set_state(STATE_OPEN, f"{slow_rate * 100:.0f}% of {len(self.calls)} calls slower than {self.slow_call_seconds:.0f}s; retry in {self.open_seconds:.0f}s")
+
+    def get_status(self) -> Dict:
+        self._expire(time.time())
+        calls = len(self.calls)
+        return {
+            'name': self.name,
+            'state': self.state,
+            'retry_after': self.retry_after(),
+            'calls': calls,
+            'failure_rate': sum(1 for _, f, _ in self.calls if f) / calls if calls else 0.0,
+            'rejected': self.stats['rejected'],
+            'opened': self.stats['opened'],
+            'last_failure': self.last_failure,
+        }
+
+
+def get_circuit_breaker(name: str, log: Optional[Callable[[str], None]] = None, **options) -> CircuitBreaker:
+    """Get the process-wide breaker for an endpoint, creating it on first use"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(name, log=log, **options)
+        _breakers[name] = breaker
+    elif log and breaker.log is None:
+        breaker.log = log
+    return breaker
+
+
+def get_all_circuit_breakers() -> List[CircuitBreaker]:
+    return list(_breakers.values())
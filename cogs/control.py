@@ -5,10 +5,12 @@ import asyncio
 from datetime import datetime
 from colorama import Fore, Style
 import os
+import time
 import traceback
 import logging
 from logging.handlers import RotatingFileHandler
-from .login_handler import LoginHandler
+from .login_handler import LoginHandler, PRIORITY_SCHEDULED
+from .request_governor import CONSUMER_ROSTER_CHECK
 
 level_mapping = {
     31: "30-1", 32: "30-2", 33: "30-3", 34: "30-4",
@@ -111,11 +113,16 @@ class Control(commands.Cog):
         self.proxies = self.load_proxies()
         self.alliance_tasks = {}
         self.is_running = {}
+        self.last_check_metrics = {}  # alliance ID -> DB write metrics of its last member check
         self.monitor_started = False
 
         # Initialize login handler for centralized queue management
         self.login_handler = LoginHandler()
 
+    async def cog_unload(self):
+        # Close the shared login HTTP sessions; they are recreated on next use
+        await self.login_handler.close()
+
     def load_proxies(self):
         proxies = []
         if os.path.exists('proxy.txt'):
@@ -145,34 +152,73 @@ class Control(commands.Cog):
         # Default to 0 (disabled) if not set
         return result[0] if result and result[0] is not None else 0
 
-    def increment_invalid_counter(self, fid: str, alliance_id: str, nickname: str) -> int:
-        """Increment the 40004 error counter for a player. Returns new fail_count."""
+    def get_invalid_counts(self, fids) -> dict:
+        """Get the 40004 error counters of several players at once (players without failures are left out)."""
+        fids = [str(fid) for fid in fids]
+        if not fids:
+            return {}
+        placeholders = ", ".join("?" for _ in fids)
         self.cursor_settings.execute(
-            "SELECT fail_count FROM invalid_id_tracker WHERE fid = ?", (fid,)
+            f"SELECT fid, fail_count FROM invalid_id_tracker WHERE fid IN ({placeholders})", fids
         )
-        result = self.cursor_settings.fetchone()
-
-        if result:
-            new_count = result[0] + 1
-            self.cursor_settings.execute("""
-                UPDATE invalid_id_tracker
-                SET fail_count = ?, last_failure = CURRENT_TIMESTAMP, nickname = ?, alliance_id = ?
-                WHERE fid = ?
-            """, (new_count, nickname, alliance_id, fid))
-        else:
-            new_count = 1
-            self.cursor_settings.execute("""
-                INSERT INTO invalid_id_tracker (fid, alliance_id, nickname, fail_count)
-                VALUES (?, ?, ?, 1)
-            """, (fid, alliance_id, nickname))
-
-        self.conn_settings.commit()
-        return new_count
+        return {str(fid): fail_count for fid, fail_count in self.cursor_settings.fetchall()}
+
+    def new_change_batch(self) -> dict:
+        """Member check writes collected in memory and applied together by apply_change_batch."""
+        return {
+            'user_updates': {},      # users column -> [(value, fid), ...]
+            'user_deletes': [],      # [(fid,), ...]
+            'furnace_changes': [],   # [(fid, old_furnace_lv, new_furnace_lv, change_date), ...]
+            'nickname_changes': [],  # [(fid, old_nickname, new_nickname, change_date), ...]
+            'invalid_counts': [],    # [(fid, alliance_id, nickname, fail_count), ...] for 40004 failures
+            'invalid_resets': [],    # [(fid,), ...] players whose 40004 counter is cleared
+        }
+
+    async def apply_change_batch(self, batch: dict, metrics: dict):
+        """Write a batch with one executemany per statement and one transaction per database.
+
+        Adds the commits, rows and seconds spent holding the DB lock to metrics.
+        """
+        writes = [
+            (self.conn_users, "users", [
+                (f"UPDATE users SET {column} = ? WHERE fid = ?", rows)
+                for column, rows in batch['user_updates'].items()
+            ] + [
+                ("DELETE FROM users WHERE fid = ?", batch['user_deletes']),
+            ]),
+            (self.conn_changes, "changes", [
+                ("INSERT INTO furnace_changes (fid, old_furnace_lv, new_furnace_lv, change_date) VALUES (?, ?, ?, ?)",
+                 batch['furnace_changes']),
+                ("INSERT INTO nickname_changes (fid, old_nickname, new_nickname, change_date) VALUES (?, ?, ?, ?)",
+                 batch['nickname_changes']),
+            ]),
+            (self.conn_settings, "settings", [
+                ("""
+                    INSERT INTO invalid_id_tracker (fid, alliance_id, nickname, fail_count)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(fid) DO UPDATE SET
+                        fail_count = excluded.fail_count, last_failure = CURRENT_TIMESTAMP,
+                        nickname = excluded.nickname, alliance_id = excluded.alliance_id
+                """, batch['invalid_counts']),
+                ("DELETE FROM invalid_id_tracker WHERE fid = ?", batch['invalid_resets']),
+            ]),
+        ]
 
-    def reset_invalid_counter(self, fid: str):
-        """Reset/remove the 40004 error counter for a player (called on successful check)."""
-        self.cursor_settings.execute("DELETE FROM invalid_id_tracker WHERE fid = ?", (fid,))
-        self.conn_settings.commit()
+        async with self.db_lock:
+            started = time.perf_counter()
+            for conn, db_name, statements in writes:
+                statements = [(sql, rows) for sql, rows in statements if rows]
+                if not statements:
+                    continue
+                try:
+                    with conn:  # Commits once on success, rolls the whole batch back on error
+                        for sql, rows in statements:
+                            conn.executemany(sql, rows)
+                    metrics['commits'] += 1
+                    metrics['rows'] += sum(len(rows) for _, rows in statements)
+                except sqlite3.Error as e:
+                    self.logger.error(f"Failed to write member check changes to {db_name} database: {e}")
+            metrics['lock_seconds'] += time.perf_counter() - started
 
     def get_invalid_count(self, fid: str) -> int:
         """Get current fail count for a player."""
@@ -202,10 +248,13 @@ class Control(commands.Cog):
         error_lower = error_msg.lower()
         return any(indicator in error_lower for indicator in network_indicators)
 
-    async def fetch_user_data(self, fid, proxy=None):
-        """Fetch user data using the centralized login handler"""
-        result = await self.login_handler.fetch_player_data(fid, use_proxy=proxy)
-        
+    async def fetch_user_data(self, fid, proxy=None, max_age=None):
+        """Fetch user data using the centralized login handler (max_age accepts a cached profile that recent)"""
+        result = await self.login_handler.fetch_player_data(fid, use_proxy=proxy, max_age=max_age)
+        return self.to_user_data(fid, result)
+
+    def to_user_data(self, fid, result):
+        """Convert a login handler result to the format check_agslist expects (429 when rate limited)"""
         if result['status'] == 'success':
             # Return in the old format for compatibility
             return {'data': result['data']}
@@ -326,6 +375,12 @@ class Control(commands.Cog):
         furnace_changes, nickname_changes, kid_changes, check_fail_list = [], [], [], []
         members_to_remove = []  # Track members that should be removed for bulk check
         connection_errors = []  # Track network/connection issues separately (not invalid members)
+        transfer_removals = []  # Members removed for a state transfer, for the admin notification
+        write_metrics = {'commits': 0, 'rows': 0, 'lock_seconds': 0.0}
+
+        # Read once per check instead of on every state transfer
+        auto_remove = self.get_auto_remove_setting(alliance_id)
+        notify_on_transfer = self.get_transfer_notification_setting(alliance_id)
 
         def safe_list(input_list): # Avoid issues with list indexing
             if not isinstance(input_list, list):
@@ -335,12 +390,19 @@ class Control(commands.Cog):
         i = 0
         while i < total_users:
             batch_users = users[i:i+20]
-            for fid, old_nickname, old_furnace_lv, old_stove_lv_content, old_kid in batch_users:
-                data = await self.fetch_user_data(fid)
+            # Collect the chunk's writes and apply them in one transaction per database
+            changes = self.new_change_batch()
+            invalid_counts = self.get_invalid_counts(user[0] for user in batch_users)
+            # Fetch the chunk concurrently; the login handler spreads it over every API's remaining budget
+            results = await self.login_handler.fetch_player_batch([user[0] for user in batch_users], max_age=60)
+            for (fid, old_nickname, old_furnace_lv, old_stove_lv_content, old_kid), result in zip(batch_users, results):
+                data = self.to_user_data(fid, result)
                 
-                if data == 429:
-                    # Get wait time from login handler
-                    wait_time = self.login_handler._get_wait_time()
+                rate_limit_retries = 0
+                while data == 429 and rate_limit_retries < 3:
+                    rate_limit_retries += 1
+                    # Get wait time from login handler (other checks and lookups share the budget)
+                    wait_time = max(5.0, self.login_handler.get_wait_time(CONSUMER_ROSTER_CHECK))
                     
                     embed.description = f"⚠️ API Rate Limit! Waiting {wait_time:.1f} seconds...\n📊 Progress: {checked_users}/{total_users} members"
                     embed.color = discord.Color.orange()
@@ -353,16 +415,22 @@ class Control(commands.Cog):
                     embed.color = discord.Color.blue()
                     if message:
                         await message.edit(embed=embed)
-                    data = await self.fetch_user_data(fid)
+                    data = await self.fetch_user_data(fid, max_age=60)
                 
-                if isinstance(data, dict):
+                if data == 429:
+                    # Still rate limited after the retries - skip this member for now rather than stall the check
+                    connection_errors.append(f"⚠️ `{fid}` ({old_nickname}) - Rate limited (will retry next check)")
+                    self.logger.warning(f"Rate limited checking ID {fid} after {rate_limit_retries} retries, skipping")
+                    checked_users += 1
+                elif isinstance(data, dict):
                     if 'error' in data:
                         # Handle error responses (including 40004)
                         error_msg = data.get('error', 'Unknown error')
                         
                         # Check if this is a permanently invalid ID (not found)
                         if error_msg == 'not_found':
-                            fail_count = self.increment_invalid_counter(fid, alliance_id, old_nickname)
+                            fail_count = invalid_counts.get(str(fid), 0) + 1
+                            changes['invalid_counts'].append((fid, alliance_id, old_nickname, fail_count))
 
                             if fail_count >= 3:  # Silently track failures 1 and 2, remove after 3
                                 members_to_remove.append((fid, old_nickname, "Player does not exist (3x confirmed)"))
@@ -387,56 +455,34 @@ class Control(commands.Cog):
                         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
                         # Reset 40004 error counter on successful check
-                        self.reset_invalid_counter(fid)
-
-                        async with self.db_lock:
-                            if new_stove_lv_content != old_stove_lv_content:
-                                self.cursor_users.execute("UPDATE users SET stove_lv_content = ? WHERE fid = ?", (new_stove_lv_content, fid))
-                                self.conn_users.commit()
-
-                            if old_kid != new_kid:
-                                kid_changes.append(f"👤 {old_nickname} has transferred to a new state\n🔄 Old State: {old_kid}\n🆕 New State: {new_kid}")
-                                
-                                # Check if auto-removal is enabled for this alliance
-                                auto_remove = self.get_auto_remove_setting(alliance_id)
-                                notify_on_transfer = self.get_transfer_notification_setting(alliance_id)
-                                
-                                if auto_remove:
-                                    # Remove user from alliance when auto-removal is enabled
-                                    self.cursor_users.execute("DELETE FROM users WHERE fid = ?", (fid,))
-                                    self.conn_users.commit()
-                                    
-                                    # Only notify if notifications are enabled for auto-removal
-                                    if notify_on_transfer:
-                                        self.cursor_settings.execute("SELECT id FROM admin WHERE is_initial = 1")
-                                        admin_data = self.cursor_settings.fetchone()
-                                        
-                                        if admin_data:
-                                            user = await self.bot.fetch_user(admin_data[0])
-                                            if user:
-                                                await user.send(f"❌ {old_nickname} `{fid}` was removed from the users table due to state transfer.")
-                                else:
-                                    # Just update kid without removing (default behavior)
-                                    self.cursor_users.execute("UPDATE users SET kid = ? WHERE fid = ?", (new_kid, fid))
-                                    self.conn_users.commit()
-
-                            if new_furnace_lv != old_furnace_lv:
-                                new_furnace_display = level_mapping.get(new_furnace_lv, new_furnace_lv)
-                                old_furnace_display = level_mapping.get(old_furnace_lv, old_furnace_lv)
-                                self.cursor_changes.execute("INSERT INTO furnace_changes (fid, old_furnace_lv, new_furnace_lv, change_date) VALUES (?, ?, ?, ?)",
-                                                             (fid, old_furnace_lv, new_furnace_lv, current_time))
-                                self.conn_changes.commit()
-                                self.cursor_users.execute("UPDATE users SET furnace_lv = ? WHERE fid = ?", (new_furnace_lv, fid))
-                                self.conn_users.commit()
-                                furnace_changes.append(f"👤 **{old_nickname}**\n🔥 `{old_furnace_display}` ➡️ `{new_furnace_display}`")
-
-                            if new_nickname.lower() != old_nickname.lower().strip():
-                                self.cursor_changes.execute("INSERT INTO nickname_changes (fid, old_nickname, new_nickname, change_date) VALUES (?, ?, ?, ?)",
-                                                             (fid, old_nickname, new_nickname, current_time))
-                                self.conn_changes.commit()
-                                self.cursor_users.execute("UPDATE users SET nickname = ? WHERE fid = ?", (new_nickname, fid))
-                                self.conn_users.commit()
-                                nickname_changes.append(f"📝 `{old_nickname}` ➡️ `{new_nickname}`")
+                        if str(fid) in invalid_counts:
+                            changes['invalid_resets'].append((fid,))
+
+                        if new_stove_lv_content != old_stove_lv_content:
+                            changes['user_updates'].setdefault('stove_lv_content', []).append((new_stove_lv_content, fid))
+
+                        if old_kid != new_kid:
+                            kid_changes.append(f"👤 {old_nickname} has transferred to a new state\n🔄 Old State: {old_kid}\n🆕 New State: {new_kid}")
+
+                            if auto_remove:
+                                # Remove user from alliance when auto-removal is enabled
+                                changes['user_deletes'].append((fid,))
+                                transfer_removals.append((fid, old_nickname))
+                            else:
+                                # Just update kid without removing (default behavior)
+                                changes['user_updates'].setdefault('kid', []).append((new_kid, fid))
+
+                        if new_furnace_lv != old_furnace_lv:
+                            new_furnace_display = level_mapping.get(new_furnace_lv, new_furnace_lv)
+                            old_furnace_display = level_mapping.get(old_furnace_lv, old_furnace_lv)
+                            changes['furnace_changes'].append((fid, old_furnace_lv, new_furnace_lv, current_time))
+                            changes['user_updates'].setdefault('furnace_lv', []).append((new_furnace_lv, fid))
+                            furnace_changes.append(f"👤 **{old_nickname}**\n🔥 `{old_furnace_display}` ➡️ `{new_furnace_display}`")
+
+                        if new_nickname.lower() != old_nickname.lower().strip():
+                            changes['nickname_changes'].append((fid, old_nickname, new_nickname, current_time))
+                            changes['user_updates'].setdefault('nickname', []).append((new_nickname, fid))
+                            nickname_changes.append(f"📝 `{old_nickname}` ➡️ `{new_nickname}`")
 
                         checked_users += 1
                 embed.set_field_at(
@@ -448,7 +494,22 @@ class Control(commands.Cog):
                 if message:
                     await message.edit(embed=embed)
 
+            await self.apply_change_batch(changes, write_metrics)
+
             i += 20
+            # Let waiting interactive or manual operations run between chunks
+            await self.login_handler.yield_to_queue()
+
+        if transfer_removals and notify_on_transfer:
+            # Only notify if notifications are enabled for auto-removal
+            self.cursor_settings.execute("SELECT id FROM admin WHERE is_initial = 1")
+            admin_data = self.cursor_settings.fetchone()
+
+            if admin_data:
+                user = await self.bot.fetch_user(admin_data[0])
+                if user:
+                    for fid, nickname in transfer_removals:
+                        await user.send(f"❌ {nickname} `{fid}` was removed from the users table due to state transfer.")
 
         # Bulk removal safeguard - check if we're removing too many members
         removal_count = len(members_to_remove)
@@ -611,6 +672,11 @@ class Control(commands.Cog):
             await message.edit(embed=embed)
         self.logger.info(f"{alliance_name} Alliance Control completed at {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
         self.logger.info(f"{alliance_name} Alliance Total Duration: {duration}")
+        self.logger.info(
+            f"{alliance_name} Alliance Control DB writes: {write_metrics['rows']} row(s) in {write_metrics['commits']} commit(s), "
+            f"{write_metrics['lock_seconds'] * 1000:.1f} ms holding the DB lock"
+        )
+        self.last_check_metrics[alliance_id] = dict(write_metrics, members=total_users, finished_at=end_time.isoformat())
         
         # Update ephemeral message at completion if provided
         if interaction_message:
@@ -733,6 +799,7 @@ class Control(commands.Cog):
                         'type': 'alliance_control',
                         'callback': lambda ch=channel, aid=alliance_id: self.check_agslist(ch, aid, interaction_message=None),
                         'description': f'Scheduled control check for alliance {alliance_id}',
+                        'priority': PRIORITY_SCHEDULED,
                         'alliance_id': alliance_id
                     })
                     
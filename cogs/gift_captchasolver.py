@@ -5,56 +5,167 @@
 import os
 import io
 import time
+import hashlib
+import asyncio
 import logging
 import logging.handlers
 import json
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from wos_config import (
+    get_captcha_batch_delay_ms,
+    get_captcha_batch_size,
+    get_captcha_cache_size,
+    get_captcha_inference_workers,
+    get_captcha_min_confidence,
+    get_captcha_int8_tolerance,
+    get_captcha_model_variant,
+    get_captcha_top_k,
+    get_onnx_profile,
+    get_onnx_session_overrides,
+)
+
+# ONNX Runtime, numpy and Pillow are imported by _import_runtime() when the model loads
+ort = None
+np = None
+Image = None
+ONNX_AVAILABLE = None
+
+_CPU_COUNT = os.cpu_count() or 1
+
+# Named ONNX Runtime CPU profiles (WOS_ONNX_PROFILE). None leaves the ONNX Runtime default.
+ONNX_SESSION_PROFILES = {
+    "balanced": {"intra_op_threads": max(1, min(4, _CPU_COUNT // 2)), "inter_op_threads": 1, "graph_optimization": "all", "mem_arena": True},
+    "low-core": {"intra_op_threads": 1, "inter_op_threads": 1, "graph_optimization": "all", "mem_arena": False},
+    "throughput": {"intra_op_threads": _CPU_COUNT, "inter_op_threads": 1, "graph_optimization": "all", "mem_arena": True},
+    "ort-default": {"intra_op_threads": None, "inter_op_threads": None, "graph_optimization": None, "mem_arena": None},
+}
+
+FLOAT_MODEL_FILE = 'captcha_model.onnx'
+INT8_MODEL_FILE = 'captcha_model_int8.onnx'
+INT8_REPORT_FILE = 'captcha_model_int8_report.json'
+INT8_MIN_SAMPLES = 50
+METADATA_FILE = 'captcha_model_metadata.json'
+
+
+def _import_runtime():
+    """Import the inference libraries on first use so bot startup does not pay for them."""
+    global ort, np, Image, ONNX_AVAILABLE
+    if ONNX_AVAILABLE is None:
+        try:
+            import onnxruntime
+            import numpy
+            from PIL import Image as PILImage
+            ort, np, Image = onnxruntime, numpy, PILImage
+            ONNX_AVAILABLE = True
+        except ImportError:
+            ONNX_AVAILABLE = False
+    return ONNX_AVAILABLE
+
+
+def get_solver_logger():
+    """Get the gift_solver logger, writing to log/gift_solver.txt."""
+    logger = logging.getLogger("gift_solver")
+    if not logger.hasHandlers():
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        log_dir = 'log'
+        os.makedirs(log_dir, exist_ok=True)
+        log_file = os.path.join(log_dir, 'gift_solver.txt')
+        handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=3 * 1024 * 1024, backupCount=3, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+
+def file_sha256(path):
+    """Hash a model file so validation reports can be tied to the exact float model they measured."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-try:
-    import onnxruntime as ort
-    import numpy as np
-    from PIL import Image
-    ONNX_AVAILABLE = True
-except ImportError:
-    ort = None
-    np = None
-    Image = None
-    ONNX_AVAILABLE = False
 
 class GiftCaptchaSolver:
-    def __init__(self, save_images=0):
+    def __init__(self, save_images=0, session_options=None, model_variant=None, lazy=False):
         """
         Initialize the ONNX captcha solver.
 
         Args:
             save_images (int): Image saving mode (0=None, 1=Failed, 2=Success, 3=All).
                                Note: Saving logic is primarily handled in gift_operations.py now.
+            session_options (dict, optional): ONNX session settings overriding the profile and environment.
+            model_variant (str, optional): 'auto', 'float' or 'int8' (defaults to WOS_CAPTCHA_MODEL_VARIANT).
+            lazy (bool): Defer loading the model until start_background_load() or the first solve.
         """
         self.save_images_mode = save_images
         self.onnx_session = None
         self.model_metadata = None
         self.is_initialized = False
+        self.session_overrides = session_options or {}
+        self.session_info = {}
+        self.requested_variant = (model_variant or get_captcha_model_variant()).lower()
+        self.model_variant = None
 
-        # Logger setup
-        self.logger = logging.getLogger("gift_solver")
-        if not self.logger.hasHandlers():
-            self.logger.setLevel(logging.INFO)
-            self.logger.propagate = False
-            log_dir = 'log'
-            os.makedirs(log_dir, exist_ok=True)
-            log_file = os.path.join(log_dir, 'gift_solver.txt')
-            handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=3 * 1024 * 1024, backupCount=3, encoding='utf-8')
-            handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
-            self.logger.addHandler(handler)
+        self.logger = get_solver_logger()
 
         self.captcha_dir = 'captcha_images'
         os.makedirs(self.captcha_dir, exist_ok=True)
 
-        self._initialize_onnx_model()
+        # Micro-batching: concurrent solves are collected for up to batch_delay seconds
+        # and run as a single inference of at most max_batch_size images.
+        self.max_batch_size = get_captcha_batch_size()
+        self.batch_delay = get_captcha_batch_delay_ms() / 1000.0
+        self._batch_queue = None
+        self._batch_task = None
+
+        # Inference runs on a dedicated executor so solves never block the event loop
+        self.inference_workers = get_captcha_inference_workers()
+        self._executor = None
+        self._inference_slots = None
+        self.fast_preprocess = False
+
+        # Ranked alternatives: up to top_k guesses per captcha, dropping unlikely ones
+        self.top_k = get_captcha_top_k()
+        self.min_alternate_probability = 0.02
+
+        # Confidence gate: answers below min_confidence are refetched instead of submitted.
+        # Submission outcomes are kept to report accuracy and yield per threshold.
+        self.min_confidence = get_captcha_min_confidence()
+        self.calibration_temperature = 1.0
+        self.confidence_outcomes = deque(maxlen=5000)
+
+        # Answer cache: identical captcha images (keyed by a hash of the raw bytes) reuse their
+        # ranked answers and any server verdicts instead of running inference again
+        self.cache_size = get_captcha_cache_size()
+        self._answer_cache = OrderedDict()
+
+        # Model loading: 'pending' until started, then 'loading', then 'ready' or 'failed'
+        self.load_state = "pending"
+        self._load_lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._ready_events = {}  # event loop -> asyncio.Event its wait_until_ready callers await
+        self._first_inference_pending = True
+
+        if not lazy and self._claim_load():
+            self._load_model()
 
         self.stats = {
             "total_attempts": 0,
             "successful_decodes": 0,
-            "failures": 0
+            "failures": 0,
+            "batches": 0,
+            "batched_images": 0,
+            "max_batch_seen": 0,
+            "inference_time_ms": 0.0,
+            "loop_blocking_ms_total": 0.0,
+            "loop_blocking_ms_max": 0.0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "cache_promoted": 0
         }
         self.reset_run_stats()
 
@@ -85,6 +196,66 @@ class GiftCaptchaSolver:
         ]
         return "\n".join(report)
 
+    def _claim_load(self):
+        """Move from 'pending' to 'loading'; only the caller that gets True runs _load_model()."""
+        with self._load_lock:
+            if self.load_state != "pending":
+                return False
+            self.load_state = "loading"
+            return True
+
+    def _load_model(self):
+        """Import the runtime, load and warm up the model, then signal waiters."""
+        start = time.perf_counter()
+        try:
+            _import_runtime()
+            self._initialize_onnx_model()
+        except Exception as e:
+            self.logger.exception(f"Captcha model load failed: {e}")
+            self.is_initialized = False
+        finally:
+            ready_ms = (time.perf_counter() - start) * 1000
+            self.session_info["ready_ms"] = ready_ms
+            self.load_state = "ready" if self.is_initialized else "failed"
+            self._signal_loaded()
+            self.logger.info(f"Captcha model {self.load_state} after {ready_ms:.1f}ms (import, load and warm-up).")
+
+    def _signal_loaded(self):
+        """Mark loading finished (ready or failed) and wake async waiters on their own event loops."""
+        with self._load_lock:
+            self._loaded.set()
+            waiters = list(self._ready_events.items())
+            self._ready_events.clear()
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # Loop already closed
+                pass
+
+    def start_background_load(self):
+        """Load the model on a background thread. Does nothing if loading already started."""
+        if self._claim_load():
+            threading.Thread(target=self._load_model, name="captcha_model_loader", daemon=True).start()
+
+    async def wait_until_ready(self, timeout=None):
+        """
+        Wait for the model to finish loading, starting a background load if needed.
+
+        Returns:
+            bool: True if the model is ready to solve captchas.
+        """
+        if not self._loaded.is_set():
+            self.start_background_load()
+            loop = asyncio.get_running_loop()
+            with self._load_lock:
+                event = None if self._loaded.is_set() else self._ready_events.setdefault(loop, asyncio.Event())
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        return self.is_initialized
+
     def _initialize_onnx_model(self):
         """Initialize the ONNX model and load metadata."""
         if not ONNX_AVAILABLE:
@@ -96,8 +267,8 @@ class GiftCaptchaSolver:
             # Look for model files in the models directory
             bot_dir = os.path.dirname(os.path.dirname(__file__))
             models_dir = os.path.join(bot_dir, 'models')
-            model_path = os.path.join(models_dir, 'captcha_model.onnx')
-            metadata_path = os.path.join(models_dir, 'captcha_model_metadata.json')
+            model_path = self._select_model_path(models_dir)
+            metadata_path = os.path.join(models_dir, METADATA_FILE)
             
             self.logger.info(f"Looking for ONNX model at: {model_path}")
             self.logger.info(f"Looking for metadata at: {metadata_path}")
@@ -113,7 +284,10 @@ class GiftCaptchaSolver:
                 return
 
             self.logger.info("Loading ONNX model...")
-            self.onnx_session = ort.InferenceSession(model_path)
+            session_config = self._build_session_config()
+            load_start = time.perf_counter()
+            self.onnx_session = self._create_session(model_path, session_config)
+            load_ms = (time.perf_counter() - load_start) * 1000
             
             self.logger.info("Loading model metadata...")
             with open(metadata_path, 'r') as f:
@@ -125,10 +299,23 @@ class GiftCaptchaSolver:
             dummy_img = np.random.rand(1, 1, height, width).astype(np.float32)
             
             input_name = self.onnx_session.get_inputs()[0].name
+            warmup_start = time.perf_counter()
             outputs = self.onnx_session.run(None, {input_name: dummy_img})
+            warmup_ms = (time.perf_counter() - warmup_start) * 1000
+
+            self.session_info = dict(session_config, variant=self.model_variant, load_ms=load_ms, warmup_ms=warmup_ms)
+            self.logger.info(f"ONNX session ready: {self.get_session_summary()}")
             
+            self._prepare_preprocessing()
+            self.calibration_temperature = float(self.model_metadata.get('calibration_temperature', 1.0)) or 1.0
+
             if len(outputs) == 4:  # Should have 4 outputs for 4 character positions
-                self.logger.info(f"ONNX model test successful. Model ready for captcha solving.")
+                # A fixed batch dimension means the model cannot take stacked inputs
+                batch_dim = self.onnx_session.get_inputs()[0].shape[0]
+                if isinstance(batch_dim, int) and batch_dim > 0 and self.max_batch_size > batch_dim:
+                    self.logger.info(f"ONNX model has a fixed batch size of {batch_dim}; limiting micro-batches to {batch_dim}.")
+                    self.max_batch_size = batch_dim
+                self.logger.info(f"ONNX model test successful. Model ready for captcha solving (max batch {self.max_batch_size}, batch delay {self.batch_delay * 1000:.0f}ms).")
                 self.is_initialized = True
             else:
                 self.logger.error(f"ONNX model test failed. Expected 4 outputs, got {len(outputs)}")
@@ -140,6 +327,150 @@ class GiftCaptchaSolver:
             self.model_metadata = None
             self.is_initialized = False
     
+    def _select_model_path(self, models_dir):
+        """
+        Choose between the float and INT8 captcha models.
+
+        In 'auto' mode the INT8 model is used only when its validation report (written by
+        `captcha_tools.py quantize`) was measured against the current float model on enough
+        samples and its accuracy is within WOS_CAPTCHA_INT8_TOLERANCE points of the float model.
+        """
+        float_path = os.path.join(models_dir, FLOAT_MODEL_FILE)
+        int8_path = os.path.join(models_dir, INT8_MODEL_FILE)
+        report_path = os.path.join(models_dir, INT8_REPORT_FILE)
+        self.model_variant = 'float'
+
+        if self.requested_variant == 'float' or not os.path.exists(int8_path):
+            if self.requested_variant == 'int8':
+                self.logger.warning(f"INT8 model requested but not found at {int8_path}. Using float model.")
+            return float_path
+
+        if self.requested_variant == 'int8':
+            self.model_variant = 'int8'
+            return int8_path
+
+        if self.requested_variant != 'auto':
+            self.logger.warning(f"Unknown captcha model variant '{self.requested_variant}', using auto selection.")
+
+        try:
+            with open(report_path, 'r') as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            self.logger.info("INT8 model found without a validation report. Using float model.")
+            return float_path
+
+        tolerance = get_captcha_int8_tolerance()
+        accuracy_drop = report.get('float_accuracy', 0.0) - report.get('int8_accuracy', 0.0)
+        if not os.path.exists(float_path) or report.get('float_model_sha256') != file_sha256(float_path):
+            self.logger.info("INT8 validation report does not match the current float model. Using float model.")
+        elif report.get('samples', 0) < INT8_MIN_SAMPLES:
+            self.logger.info(f"INT8 validation report has too few samples ({report.get('samples', 0)} < {INT8_MIN_SAMPLES}). Using float model.")
+        elif accuracy_drop > tolerance:
+            self.logger.info(f"INT8 model accuracy is {accuracy_drop:.2f} points below float (tolerance {tolerance:.2f}). Using float model.")
+        else:
+            self.logger.info(f"Using INT8 model (accuracy {report.get('int8_accuracy', 0.0):.2f}% vs float {report.get('float_accuracy', 0.0):.2f}% on {report.get('samples')} samples).")
+            self.model_variant = 'int8'
+            return int8_path
+
+        return float_path
+
+    def _build_session_config(self):
+        """Resolve session settings from the named profile, environment overrides and constructor options."""
+        profile = get_onnx_profile()
+        if profile not in ONNX_SESSION_PROFILES:
+            self.logger.warning(f"Unknown ONNX profile '{profile}', using 'balanced'. Available: {', '.join(ONNX_SESSION_PROFILES)}")
+            profile = "balanced"
+
+        config = dict(ONNX_SESSION_PROFILES[profile])
+        config.update(get_onnx_session_overrides())
+        config.update(self.session_overrides)
+        config["profile"] = profile
+        return config
+
+    def _create_session(self, model_path, config):
+        """Create an InferenceSession with the resolved SessionOptions."""
+        graph_levels = {
+            "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }
+
+        options = ort.SessionOptions()
+        if config.get("intra_op_threads") is not None:
+            options.intra_op_num_threads = int(config["intra_op_threads"])
+        if config.get("inter_op_threads") is not None:
+            options.inter_op_num_threads = int(config["inter_op_threads"])
+        if config.get("mem_arena") is not None:
+            options.enable_cpu_mem_arena = bool(config["mem_arena"])
+
+        graph_optimization = config.get("graph_optimization")
+        if graph_optimization is not None and graph_optimization not in graph_levels:
+            self.logger.warning(f"Unknown graph optimization level '{graph_optimization}', using 'all'.")
+            graph_optimization = config["graph_optimization"] = "all"
+
+        load_path = model_path
+        config["optimized_model"] = None
+        optimized_dir = config.get("optimized_model_dir")
+        if optimized_dir and graph_optimization not in (None, "disable"):
+            # Cache the optimized graph keyed by the model's content and the options that shape it,
+            # so a replaced model (whatever its mtime), another profile or runtime never reuses it
+            model_name = os.path.splitext(os.path.basename(model_path))[0]
+            options_key = json.dumps({
+                "graph_optimization": graph_optimization,
+                "intra_op_threads": config.get("intra_op_threads"),
+                "inter_op_threads": config.get("inter_op_threads"),
+                "mem_arena": config.get("mem_arena"),
+                "onnxruntime": ort.__version__,
+            }, sort_keys=True)
+            model_hash = file_sha256(model_path)[:16]
+            options_hash = hashlib.sha256(options_key.encode('utf-8')).hexdigest()[:8]
+            optimized_path = os.path.join(optimized_dir, f"{model_name}.{graph_optimization}.{model_hash}.{options_hash}.opt.onnx")
+            if os.path.exists(optimized_path):
+                load_path = optimized_path
+                config["optimized_model"] = "cached"
+                graph_optimization = "disable"
+            else:
+                os.makedirs(optimized_dir, exist_ok=True)
+                # Drop graphs cached for earlier versions of this model (other profiles may share the directory)
+                for name in os.listdir(optimized_dir):
+                    if name.startswith(f"{model_name}.") and name.endswith(".opt.onnx") and f".{model_hash}." not in name:
+                        os.remove(os.path.join(optimized_dir, name))
+                options.optimized_model_filepath = optimized_path
+                config["optimized_model"] = "written"
+
+        if graph_optimization is not None:
+            options.graph_optimization_level = graph_levels[graph_optimization]
+
+        config["model_path"] = load_path
+        return ort.InferenceSession(load_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+    def get_session_summary(self):
+        """Get a one-line description of the ONNX session configuration and startup timings."""
+        info = self.session_info
+        if "model_path" not in info:
+            return "not loaded" if self.load_state == "pending" else self.load_state
+
+        def fmt(value):
+            return "ort-default" if value is None else value
+
+        mem_arena = fmt(info.get("mem_arena"))
+        if isinstance(mem_arena, bool):
+            mem_arena = "on" if mem_arena else "off"
+        summary = (
+            f"variant={info.get('variant')}, profile={info.get('profile')}, intra_op={fmt(info.get('intra_op_threads'))}, "
+            f"inter_op={fmt(info.get('inter_op_threads'))}, graph_opt={fmt(info.get('graph_optimization'))}, "
+            f"mem_arena={mem_arena}, model={os.path.basename(info.get('model_path', ''))}"
+        )
+        if info.get("optimized_model"):
+            summary += f" (optimized model {info['optimized_model']})"
+        summary += f", load {info.get('load_ms', 0):.1f}ms, warm-up {info.get('warmup_ms', 0):.1f}ms"
+        if info.get("ready_ms") is not None:
+            summary += f", ready after {info['ready_ms']:.1f}ms"
+        if info.get("first_inference_ms") is not None:
+            summary += f", first solve {info['first_inference_ms']:.1f}ms"
+        return summary
+
     def _preprocess_image(self, image_bytes):
         """Preprocess image for ONNX model input."""
         try:
@@ -174,6 +505,302 @@ class GiftCaptchaSolver:
             self.logger.error(f"Error preprocessing image: {e}")
             return None
 
+    def _prepare_preprocessing(self):
+        """Precompute normalization constants for the fast path and verify it matches _preprocess_image."""
+        height, width = self.model_metadata['input_shape'][1:3]
+        mean = self.model_metadata['normalization']['mean'][0]
+        std = self.model_metadata['normalization']['std'][0]
+
+        # (x / 255 - mean) / std folded into a single multiply-subtract
+        self._input_size = (width, height)
+        self._norm_scale = np.float32(1.0 / (255.0 * std))
+        self._norm_offset = np.float32(mean / std)
+        self._buffers = threading.local()
+        self.fast_preprocess = self._check_preprocess_parity()
+
+    def _check_preprocess_parity(self, tolerance=1e-5):
+        """Compare the fast preprocessing path against _preprocess_image on synthetic captchas."""
+        width, height = self._input_size
+        rng = np.random.default_rng(0)
+        samples = [
+            (rng.integers(0, 256, (height, width, 3), dtype=np.uint8), 'RGB'),
+            (rng.integers(0, 256, (height * 2, width * 2, 3), dtype=np.uint8), 'RGB'),
+            (rng.integers(0, 256, (height + 7, width - 13), dtype=np.uint8), 'L'),
+        ]
+
+        try:
+            images = []
+            for pixels, mode in samples:
+                buffer = io.BytesIO()
+                Image.fromarray(pixels, mode).save(buffer, format='PNG')
+                images.append(buffer.getvalue())
+
+            fast, valid = self._preprocess_batch(images)
+            reference = np.concatenate([self._preprocess_image(image_bytes) for image_bytes in images], axis=0)
+            max_diff = float(np.max(np.abs(fast - reference))) if len(valid) == len(images) else float('inf')
+        except Exception as e:
+            self.logger.exception(f"Fast preprocessing parity check failed with an error: {e}")
+            return False
+
+        if max_diff > tolerance:
+            self.logger.error(f"Fast preprocessing differs from reference (max diff {max_diff:.2e}). Using reference path.")
+            return False
+
+        self.logger.info(f"Fast preprocessing enabled (parity max diff {max_diff:.2e}).")
+        return True
+
+    def _get_batch_buffer(self, size):
+        """Get this thread's reusable (size, 1, height, width) float32 input buffer."""
+        buffer = getattr(self._buffers, 'batch', None)
+        if buffer is None or buffer.shape[0] < size:
+            width, height = self._input_size
+            buffer = np.empty((max(size, self.max_batch_size), 1, height, width), dtype=np.float32)
+            self._buffers.batch = buffer
+        return buffer
+
+    def _preprocess_batch(self, images):
+        """
+        Decode a batch of images straight to grayscale and normalize them into a reused buffer.
+
+        Returns:
+            tuple: (inputs, valid) where inputs is a (len(valid), 1, height, width) view of
+                   this thread's buffer and valid lists the indices of images that decoded.
+        """
+        width, height = self._input_size
+        buffer = self._get_batch_buffer(len(images))
+        valid = []
+
+        for i, image_bytes in enumerate(images):
+            try:
+                image = Image.open(io.BytesIO(image_bytes))
+                image.draft('L', image.size)  # Lets JPEG decode directly to grayscale
+                if image.mode != 'L':
+                    image = image.convert('L')
+                if image.size != (width, height):
+                    image = image.resize((width, height), Image.LANCZOS)
+
+                out = buffer[len(valid), 0]
+                np.multiply(np.asarray(image), self._norm_scale, out=out, dtype=np.float32)
+                np.subtract(out, self._norm_offset, out=out)
+                valid.append(i)
+            except Exception as e:
+                self.logger.error(f"Error preprocessing image: {e}")
+
+        return buffer[:len(valid)], valid
+
+    def _infer_batch_sync(self, images):
+        """
+        Preprocess, run and decode a batch of captcha images. Runs on the inference executor.
+
+        Returns:
+            list: One (predicted_text, confidences, candidates) tuple per image, or None where preprocessing failed.
+        """
+        results = [None] * len(images)
+        if self.fast_preprocess:
+            stacked, valid = self._preprocess_batch(images)
+        else:
+            inputs = [self._preprocess_image(image_bytes) for image_bytes in images]
+            valid = [i for i, input_data in enumerate(inputs) if input_data is not None]
+            stacked = np.concatenate([inputs[i] for i in valid], axis=0) if valid else None
+        if not valid:
+            return results
+
+        input_name = self.onnx_session.get_inputs()[0].name
+        outputs = self.onnx_session.run(None, {input_name: stacked})
+
+        for row, i in enumerate(valid):
+            results[i] = self._decode_outputs([output[row] for output in outputs])
+        return results
+
+    def _decode_outputs(self, position_outputs):
+        """
+        Decode per-position model outputs.
+
+        Returns:
+            tuple: (text, confidences, candidates) where text is the argmax string, confidences the
+                   per-position probabilities of its characters and candidates the top_k strings
+                   ranked by joint probability as [(text, probability), ...].
+        """
+        idx_to_char = self.model_metadata['idx_to_char']
+        position_probs = [self._as_probabilities(char_probs) for char_probs in position_outputs]
+        predicted_text = ""
+        confidences = []
+
+        for char_probs in position_probs:  # One entry per character position
+            predicted_idx = int(np.argmax(char_probs))  # Get highest probability
+            confidences.append(float(char_probs[predicted_idx]))  # Get confidence score
+            predicted_text += idx_to_char[str(predicted_idx)]
+
+        return predicted_text, confidences, self._rank_candidates(position_probs, max(1, self.top_k))
+
+    def _as_probabilities(self, char_scores):
+        """
+        Return a position's scores as a calibrated probability distribution.
+
+        Logits are softmaxed; the metadata's calibration_temperature (fitted to server verdicts
+        by `captcha_tools.py calibrate`, 1.0 until then) rescales the distribution
+        (p ** (1 / T), renormalized) so joint probabilities match observed accuracy.
+        """
+        char_scores = np.asarray(char_scores, dtype=np.float64)
+        if char_scores.min() >= 0 and abs(char_scores.sum() - 1.0) < 1e-3:
+            log_probs = np.log(np.clip(char_scores, 1e-12, None))
+        else:
+            log_probs = char_scores - char_scores.max()
+        log_probs = log_probs / self.calibration_temperature
+        exp = np.exp(log_probs - log_probs.max())
+        return exp / exp.sum()
+
+    def _rank_candidates(self, position_probs, top_k):
+        """
+        Find the top_k strings by joint probability.
+
+        Positions are independent, so keeping the best top_k prefixes after each position
+        (a beam of width top_k) yields the exact top_k strings.
+        """
+        idx_to_char = self.model_metadata['idx_to_char']
+        beams = [("", 1.0)]
+
+        for char_probs in position_probs:
+            top_indices = np.argsort(char_probs)[::-1][:top_k]
+            expanded = [
+                (text + idx_to_char[str(int(idx))], probability * float(char_probs[idx]))
+                for text, probability in beams
+                for idx in top_indices
+            ]
+            beams = sorted(expanded, key=lambda candidate: candidate[1], reverse=True)[:top_k]
+
+        return beams
+
+    def _ensure_executor(self):
+        """Create the inference executor and its concurrency limit on first use."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.inference_workers, thread_name_prefix="captcha_solver")
+        if self._inference_slots is None:
+            self._inference_slots = asyncio.Semaphore(self.inference_workers)
+
+    async def _run_inference(self, image_bytes):
+        """
+        Queue a captcha image for micro-batched inference on the executor.
+
+        Returns:
+            tuple: (predicted_text, confidences, candidates), or None if the image could not be preprocessed.
+        """
+        self._ensure_executor()
+        loop = asyncio.get_running_loop()
+
+        if self.max_batch_size <= 1:
+            async with self._inference_slots:
+                results, elapsed_ms = await loop.run_in_executor(self._executor, self._timed_batch, [image_bytes])
+            self._record_inference(elapsed_ms, 1)
+            return results[0]
+
+        if self._batch_queue is None or self._batch_task is None or self._batch_task.done():
+            self._batch_queue = asyncio.Queue()
+            self._batch_task = loop.create_task(self._batch_worker())
+
+        future = loop.create_future()
+        await self._batch_queue.put((image_bytes, future))
+        return await future
+
+    async def _batch_worker(self):
+        """Collect queued images into batches and hand them to the executor."""
+        loop = asyncio.get_running_loop()
+        queue = self._batch_queue
+        slots = self._inference_slots
+        batch = []
+        try:
+            while True:
+                batch = [await queue.get()]
+                deadline = loop.time() + self.batch_delay
+
+                while len(batch) < self.max_batch_size:
+                    if not queue.empty():
+                        batch.append(queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                # Bounded concurrency: wait for a free slot, then keep collecting the next batch
+                await slots.acquire()
+                loop.create_task(self._execute_batch(batch, slots))
+                batch = []
+        except asyncio.CancelledError:
+            # Images collected but not yet dispatched when the solver was closed
+            self._fail_pending(batch)
+            raise
+
+    def _fail_pending(self, entries):
+        """Fail the waiters of queued images that will never be run."""
+        for _, future in entries:
+            if not future.done():
+                future.set_exception(RuntimeError("Captcha solver was closed"))
+
+    async def _execute_batch(self, batch, slots):
+        """Run one batch on the executor and hand each waiter its result."""
+        try:
+            loop = asyncio.get_running_loop()
+            results, elapsed_ms = await loop.run_in_executor(self._executor, self._timed_batch, [image_bytes for image_bytes, _ in batch])
+
+            self._record_inference(elapsed_ms, len(batch))
+            self.stats["batches"] += 1
+            self.stats["batched_images"] += len(batch)
+            self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            self.logger.exception(f"[Solver] Batched inference failed for {len(batch)} image(s): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            slots.release()
+
+    def _timed_batch(self, images):
+        """Executor entry point; returns (results, elapsed_ms) so stats are updated on the event loop."""
+        start = time.perf_counter()
+        results = self._infer_batch_sync(images)
+        return results, (time.perf_counter() - start) * 1000
+
+    def _record_inference(self, elapsed_ms, image_count):
+        """Track time spent in inference. Called on the event loop thread."""
+        self.stats["inference_time_ms"] += elapsed_ms
+        if self._first_inference_pending:
+            self._first_inference_pending = False
+            self.session_info["first_inference_ms"] = elapsed_ms
+            self.logger.info(f"First captcha inference took {elapsed_ms:.1f}ms ({image_count} image(s)).")
+
+    def _record_loop_blocking(self, seconds):
+        """Track how long solve_captcha held the event loop thread."""
+        blocked_ms = seconds * 1000
+        self.stats["loop_blocking_ms_total"] += blocked_ms
+        self.stats["loop_blocking_ms_max"] = max(self.stats["loop_blocking_ms_max"], blocked_ms)
+
+    def close(self):
+        """
+        Stop the batch worker, fail solves still waiting in the queue and shut down the
+        inference executor. Batches already running finish and release their own slot.
+        """
+        if self._batch_task and not self._batch_task.done():
+            self._batch_task.cancel()
+        if self._batch_queue is not None:
+            pending = []
+            while not self._batch_queue.empty():
+                pending.append(self._batch_queue.get_nowait())
+            self._fail_pending(pending)
+        self._batch_task = None
+        self._batch_queue = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._inference_slots = None
+
     async def solve_captcha(self, image_bytes, fid=None, attempt=0):
         """
         Attempts to solve captcha using ONNX model.
@@ -187,52 +814,75 @@ class GiftCaptchaSolver:
             tuple: (solved_code, success, method, confidence, image_path)
                    - solved_code (str or None): The solved captcha text or None on failure.
                    - success (bool): True if solved successfully, False otherwise.
-                   - method (str): Always "ONNX".
-                   - confidence (float): Average confidence score of all positions.
+                   - method (str): "ONNX", or "ONNX-CACHE" when answered from the answer cache.
+                   - confidence (float): Calibrated probability that the whole answer is correct.
                    - image_path (None): No longer provides a path from solver.
         """
+        candidates, success, method, confidence = await self.solve_captcha_ranked(image_bytes, fid=fid, attempt=attempt)
+        if not success:
+            return None, False, method, 0.0, None
+        return candidates[0][0], True, method, confidence, None
+
+    async def solve_captcha_ranked(self, image_bytes, fid=None, attempt=0):
+        """
+        Solve a captcha and return ranked alternative answers.
+
+        Args:
+            image_bytes (bytes): The raw byte data of the captcha image.
+            fid (optional): Player ID for logging.
+            attempt (int): Attempt number for logging.
+
+        Returns:
+            tuple: (candidates, success, method, confidence)
+                   - candidates (list): [(text, joint_probability), ...] best first; up to top_k
+                     entries, alternatives below min_alternate_probability are dropped. Empty on failure.
+                   - success (bool): True if solved successfully, False otherwise.
+                   - method (str): "ONNX", or "ONNX-CACHE" when answered from the answer cache.
+                   - confidence (float): Calibrated joint probability of the best answer.
+        """
+        if not self._loaded.is_set():
+            self.logger.info(f"Waiting for the captcha model to finish loading (ID {fid})...")
+            await self.wait_until_ready()
         if not self.is_initialized or not self.onnx_session or not self.model_metadata:
             self.logger.error(f"ONNX model not initialized. Cannot solve captcha for ID {fid}.")
-            return None, False, "ONNX", 0.0, None
+            return [], False, "ONNX", 0.0
 
         self.stats["total_attempts"] += 1
         self.run_stats["total_attempts"] += 1
         start_time = time.time()
+        loop_start = time.perf_counter()
+        awaited = 0.0
+
+        cache_key = self._cache_key(image_bytes)
+        cached = self._cache_lookup(cache_key, fid, attempt)
+        if cached is not None:
+            self._record_loop_blocking(time.perf_counter() - loop_start)
+            return cached
 
         try:
             EXPECTED_CAPTCHA_LENGTH = 4
             VALID_CHARACTERS = set(self.model_metadata['chars'])
 
-            # Preprocess image
-            input_data = self._preprocess_image(image_bytes)
-            if input_data is None:
+            # Preprocess, infer and decode off the event loop (batched with any concurrent solves)
+            await_start = time.perf_counter()
+            try:
+                result = await self._run_inference(image_bytes)
+            finally:
+                awaited = time.perf_counter() - await_start
+
+            if result is None:
                 self.stats["failures"] += 1
                 self.run_stats["failures"] += 1
                 self.logger.error(f"[Solver] ID {fid}, Attempt {attempt+1}: Failed to preprocess image")
-                return None, False, "ONNX", 0.0, None
-
-            # Run inference
-            input_name = self.onnx_session.get_inputs()[0].name
-            outputs = self.onnx_session.run(None, {input_name: input_data})
+                return [], False, "ONNX", 0.0
 
-            # Decode predictions
-            idx_to_char = self.model_metadata['idx_to_char']
-            predicted_text = ""
-            confidences = []
-
-            for pos in range(4):  # 4 character positions
-                char_probs = outputs[pos][0]  # Get probabilities for this position
-                predicted_idx = np.argmax(char_probs)  # Get highest probability
-                confidence = float(char_probs[predicted_idx])  # Get confidence score
-                predicted_char = idx_to_char[str(predicted_idx)]
-                predicted_text += predicted_char
-                confidences.append(confidence)
+            predicted_text, confidences, candidates = result
 
             # Calculate average confidence
             avg_confidence = sum(confidences) / len(confidences)
 
             solve_duration = time.time() - start_time
-            self.logger.info(f"[Solver] ID {fid}, Attempt {attempt+1}: ONNX raw result='{predicted_text}' (confidence: {avg_confidence:.3f}, {solve_duration:.3f}s)")
+            self.logger.info(f"[Solver] ID {fid}, Attempt {attempt+1}: ONNX raw result='{predicted_text}' (char confidence: {avg_confidence:.3f}, joint: {candidates[0][1]:.3f}, {solve_duration:.3f}s)")
 
             if (predicted_text and
                 isinstance(predicted_text, str) and
@@ -241,20 +891,122 @@ class GiftCaptchaSolver:
 
                 self.stats["successful_decodes"] += 1
                 self.run_stats["successful_decodes"] += 1
-                self.logger.info(f"[Solver] ID {fid}, Attempt {attempt+1}: Success. Solved: {predicted_text}")
-                return predicted_text, True, "ONNX", avg_confidence, None
+                ranked = [(predicted_text, candidates[0][1])] + [
+                    (text, probability) for text, probability in candidates[1:]
+                    if text != predicted_text and probability >= self.min_alternate_probability
+                ]
+                self.logger.info(f"[Solver] ID {fid}, Attempt {attempt+1}: Success. Solved: {predicted_text}"
+                                 + (f" (alternatives: {', '.join(f'{text}={probability:.3f}' for text, probability in ranked[1:])})" if len(ranked) > 1 else ""))
+                self._cache_store(cache_key, ranked)
+                return ranked, True, "ONNX", ranked[0][1]
             else:
                 self.stats["failures"] += 1
                 self.run_stats["failures"] += 1
                 self.logger.warning(f"[Solver] ID {fid}, Attempt {attempt+1}: Failed validation (Length: {len(predicted_text) if predicted_text else 'N/A'}, Chars OK: {all(c in VALID_CHARACTERS for c in predicted_text) if predicted_text else 'N/A'})")
-                return None, False, "ONNX", 0.0, None
+                return [], False, "ONNX", 0.0
 
         except Exception as e:
             self.stats["failures"] += 1
             self.run_stats["failures"] += 1
             self.logger.exception(f"[Solver] ID {fid}, Attempt {attempt+1}: Exception during ONNX inference: {e}")
-            return None, False, "ONNX", 0.0, None
+            return [], False, "ONNX", 0.0
+
+        finally:
+            self._record_loop_blocking(time.perf_counter() - loop_start - awaited)
+
+    def _cache_key(self, image_bytes):
+        if not self.cache_size or not image_bytes:
+            return None
+        return hashlib.blake2b(image_bytes, digest_size=16).digest()
+
+    def _cache_lookup(self, key, fid, attempt):
+        """
+        Answer a captcha from the cache. A server-accepted answer is returned alone with
+        confidence 1.0; otherwise the cached ranking minus answers the server rejected.
+
+        Returns:
+            tuple or None: The solve_captcha_ranked result, or None on a miss.
+        """
+        if key is None:
+            return None
+        entry = self._answer_cache.get(key)
+        if entry is None:
+            self.stats["cache_misses"] += 1
+            return None
+
+        self._answer_cache.move_to_end(key)
+        self.stats["cache_hits"] += 1
+        if entry["accepted"]:
+            self.stats["cache_promoted"] += 1
+            self.stats["successful_decodes"] += 1
+            self.run_stats["successful_decodes"] += 1
+            self.logger.info(f"[Solver] ID {fid}, Attempt {attempt+1}: Cache hit, known-good answer {entry['accepted']}")
+            return [(entry["accepted"], 1.0)], True, "ONNX-CACHE", 1.0
+
+        ranked = [(text, probability) for text, probability in entry["ranked"] if text not in entry["rejected"]]
+        if not ranked:
+            self.stats["failures"] += 1
+            self.run_stats["failures"] += 1
+            self.logger.info(f"[Solver] ID {fid}, Attempt {attempt+1}: Cache hit, all known answers were rejected")
+            return [], False, "ONNX-CACHE", 0.0
+
+        self.stats["successful_decodes"] += 1
+        self.run_stats["successful_decodes"] += 1
+        self.logger.info(f"[Solver] ID {fid}, Attempt {attempt+1}: Cache hit, reusing {ranked[0][0]} ({len(ranked)} guess(es))")
+        return ranked, True, "ONNX-CACHE", ranked[0][1]
+
+    def _cache_store(self, key, ranked):
+        if key is None:
+            return
+        self._answer_cache[key] = {"ranked": ranked, "accepted": None, "rejected": set()}
+        self._answer_cache.move_to_end(key)
+        while len(self._answer_cache) > self.cache_size:
+            self._answer_cache.popitem(last=False)
+
+    def remember_answer(self, image_bytes, text, accepted):
+        """Record the server verdict for an answer so later fetches of the same image can use it."""
+        entry = self._answer_cache.get(self._cache_key(image_bytes))
+        if entry is None:
+            return
+        if accepted:
+            entry["accepted"] = text
+        else:
+            entry["rejected"].add(text)
+
+    def should_submit(self, confidence):
+        """Check whether an answer is confident enough to spend a redemption attempt on."""
+        return confidence >= self.min_confidence
+
+    def record_outcome(self, confidence, accepted):
+        """Record whether the server accepted a submitted answer with the given confidence."""
+        self.confidence_outcomes.append((confidence, bool(accepted)))
+
+    def get_confidence_report(self, thresholds=(0.0, 0.3, 0.5, 0.7, 0.8, 0.9)):
+        """
+        Summarize recorded submissions per confidence threshold.
+
+        Returns:
+            list: One dict per threshold with 'threshold', 'yield' (share of answers at or above it),
+                  'accuracy' (share of those the server accepted) and 'samples'.
+        """
+        outcomes = list(self.confidence_outcomes)
+        report = []
+        for threshold in thresholds:
+            kept = [accepted for confidence, accepted in outcomes if confidence >= threshold]
+            report.append({
+                "threshold": threshold,
+                "yield": len(kept) / len(outcomes) if outcomes else 0.0,
+                "accuracy": sum(kept) / len(kept) if kept else 0.0,
+                "samples": len(kept)
+            })
+        return report
 
     def get_stats(self):
         """Get current OCR statistics."""
-        return self.stats
\ No newline at end of file
+        stats = dict(self.stats)
+        stats["avg_batch_size"] = (self.stats["batched_images"] / self.stats["batches"]) if self.stats["batches"] else 0.0
+        stats["avg_loop_blocking_ms"] = (self.stats["loop_blocking_ms_total"] / self.stats["total_attempts"]) if self.stats["total_attempts"] else 0.0
+        cache_lookups = self.stats["cache_hits"] + self.stats["cache_misses"]
+        stats["cache_hit_rate"] = (self.stats["cache_hits"] / cache_lookups) if cache_lookups else 0.0
+        stats["cache_entries"] = len(self._answer_cache)
+        return stats
\ No newline at end of file
@@ -18,9 +18,28 @@ import logging.handlers
 from .alliance_member_operations import AllianceSelectView
 from .alliance import PaginatedChannelView
 from .gift_operationsapi import GiftCodeAPI
-from .gift_captchasolver import GiftCaptchaSolver
-from collections import deque
-from wos_config import get_admin_channel_id, get_ssl_context, get_wos_secret
+from .captcha_service import create_captcha_solver
+from .login_handler import SingleFlight
+from .circuit_breaker import get_circuit_breaker
+from .request_governor import (
+    CONSUMER_GIFT_REDEMPTION,
+    CONSUMER_GIFT_VALIDATION,
+    POOL_GIFT_API,
+    get_request_pool,
+    parse_retry_after,
+    request_consumer,
+)
+from .runtime_state import load_state, save_state
+from .captcha_dataset import CaptchaDatasetStore, OUTCOME_ACCEPTED, OUTCOME_FAILED, OUTCOME_REJECTED, OUTCOME_UNVERIFIED
+from collections import Counter, deque
+from wos_config import (
+    get_admin_channel_id,
+    get_gift_api_requests_per_minute,
+    get_ssl_context,
+    get_validation_pool_size,
+    get_validation_quorum,
+    get_wos_secret,
+)
 
 class GiftOperations(commands.Cog):
     def __init__(self, bot):
@@ -159,9 +178,15 @@ class GiftOperations(commands.Cog):
         self.wos_encrypt_key = get_wos_secret()
         self.wos_ssl_context = get_ssl_context()
         self.admin_channel_id = get_admin_channel_id()
+        # Shared budget for the gift API: redemptions and validations of every alliance draw from it
+        requests_per_minute = get_gift_api_requests_per_minute()
+        self.gift_request_pool = get_request_pool(
+            POOL_GIFT_API, limit=requests_per_minute, window=60, min_interval=60 / requests_per_minute
+        )
 
         # Initialization of Locks and Cooldowns
         self.captcha_solver = None
+        self.captcha_store = CaptchaDatasetStore()
         self._validation_lock = asyncio.Lock()
         self.last_validation_attempt_time = 0
         self.validation_cooldown = 5
@@ -174,6 +199,12 @@ class GiftOperations(commands.Cog):
         self.validation_queue_task = None
         self.test_captcha_cooldowns = {} # User ID: last test timestamp for test button
         self.test_captcha_delay = 60
+        self.captcha_cooldown_seconds = 60
+        self.captcha_cooldown_until = 0.0 # Set when the API reports captchas are requested too often
+        self.captcha_reusable = None # None until the server shows whether a rejected captcha can be answered again
+        self.captcha_reuse_probes = 0
+        self.captcha_reuse_max_probes = 10
+        self._restore_captcha_cooldowns()
 
         # Batch redemption tracking for consolidated progress messages
         self.redemption_batches = {}  # batch_id -> {message, alliances: {id: status}, giftcode}
@@ -184,10 +215,16 @@ class GiftOperations(commands.Cog):
         "captcha_submissions": 0,  # Times a solved code was sent to API
         "server_validation_success": 0, # Captcha accepted by server (not CAPTCHA_ERROR)
         "server_validation_failure": 0, # Captcha rejected by server (CAPTCHA_ERROR)
+        "alternate_submissions": 0,  # Ranked alternate guesses submitted for an already-fetched captcha
+        "alternate_successes": 0,    # Alternate guesses accepted by server
+        "low_confidence_refetches": 0, # Captchas refetched because the answer was below the confidence threshold
         "total_fids_processed": 0,   # Count of completed claim_giftcode calls
         "total_processing_time": 0.0 # Sum of durations for completed calls
         }
 
+        # Concurrent gift-API logins for the same player share one request
+        self.player_logins = SingleFlight()
+
         # Captcha Solver Initialization Attempt
         try:
             self.settings_cursor.execute("""
@@ -206,13 +243,9 @@ class GiftOperations(commands.Cog):
             if ocr_settings:
                 enabled, save_images = ocr_settings
                 if enabled == 1:
-                    self.logger.info("GiftOps __init__: OCR is enabled. Initializing ONNX solver...")
-                    self.captcha_solver = GiftCaptchaSolver(save_images=save_images)
-                    if not self.captcha_solver.is_initialized:
-                        self.logger.error("GiftOps __init__: ONNX solver FAILED to initialize.")
-                        self.captcha_solver = None
-                    else:
-                        self.logger.info("GiftOps __init__: ONNX solver initialized successfully.")
+                    # The model loads on a background thread once the bot is ready (see on_ready)
+                    self.logger.info("GiftOps __init__: OCR is enabled. ONNX solver will load in the background after on_ready.")
+                    self.captcha_solver = create_captcha_solver(save_images=save_images, lazy=True)
                 else:
                     self.logger.info("GiftOps __init__: OCR is disabled in settings.")
             else:
@@ -221,13 +254,8 @@ class GiftOperations(commands.Cog):
                     INSERT INTO ocr_settings (enabled, save_images) VALUES (1, 0)
                 """)
                 self.settings_conn.commit()
-                self.logger.info("GiftOps __init__: Attempting initialization with default settings...")
-                self.captcha_solver = GiftCaptchaSolver(save_images=0)
-                if not self.captcha_solver.is_initialized:
-                    self.logger.error("GiftOps __init__: ONNX solver FAILED to initialize with defaults.")
-                    self.captcha_solver = None
-                else: # Ensure success is logged here for the CI
-                    self.logger.info("GiftOps __init__: ONNX solver initialized successfully.")
+                self.logger.info("GiftOps __init__: ONNX solver will load in the background with default settings after on_ready.")
+                self.captcha_solver = create_captcha_solver(save_images=0, lazy=True)
 
         except ImportError as lib_err:
             self.logger.exception(f"GiftOps __init__: ERROR - Missing required library for OCR (likely onnxruntime): {lib_err}. Captcha solving disabled.")
@@ -709,6 +737,18 @@ class GiftOperations(commands.Cog):
         except Exception as e:
             self.logger.warning(f"Failed to update batch progress message: {e}")
 
+    async def _report_solver_ready(self, solver):
+        """Log the outcome of a background captcha model load; drop the solver if it failed."""
+        if await solver.wait_until_ready():
+            self.logger.info(f"GiftOps: ONNX solver ready in background: {solver.get_session_summary()}")
+        elif solver.load_state == "reconnecting":
+            # The remote service is not up yet; the solver keeps reconnecting and is used once it answers
+            self.logger.warning("GiftOps: Captcha service unavailable, still reconnecting in background. Captcha solving paused.")
+        else:
+            self.logger.error("GiftOps: ONNX solver FAILED to initialize in background. Captcha solving disabled.")
+            if self.captcha_solver is solver:
+                self.captcha_solver = None
+
     @commands.Cog.listener()
     async def on_ready(self):
         """
@@ -782,21 +822,22 @@ class GiftOperations(commands.Cog):
                     enabled, save_images_setting = ocr_settings
                     self.logger.info(f"on_ready loaded settings: Enabled={enabled}, SaveImages={save_images_setting}")
                     if enabled == 1:
-                        self.logger.info("OCR is enabled, attempting ONNX initialization...")
+                        self.logger.info("OCR is enabled, creating ONNX solver...")
                         try:
-                            self.captcha_solver = GiftCaptchaSolver(save_images=save_images_setting)
-                            if not self.captcha_solver.is_initialized:
-                                self.logger.error("ONNX solver FAILED to initialize in on_ready.")
-                                self.captcha_solver = None
+                            self.captcha_solver = create_captcha_solver(save_images=save_images_setting, lazy=True)
                         except Exception as e:
-                            self.logger.exception("Failed to initialize Captcha Solver in on_ready.")
+                            self.logger.exception("Failed to create Captcha Solver in on_ready.")
                             self.captcha_solver = None
                     else:
                         self.logger.info("OCR is disabled in settings (checked in on_ready).")
                 else:
                     self.logger.warning("Could not load OCR settings from database in on_ready.")
             else:
-                self.logger.info("Captcha solver was already initialized.")
+                self.logger.info("Captcha solver was already created.")
+
+            if self.captcha_solver and self.captcha_solver.load_state == "pending":
+                self.captcha_solver.start_background_load()
+                asyncio.create_task(self._report_solver_ready(self.captcha_solver))
 
             # Gift Code Channel Validation
             self.logger.info("Validating gift code channels...")
@@ -917,7 +958,8 @@ class GiftOperations(commands.Cog):
             
             session = await self._create_wos_session()
             try:
-                status_code, player_info_json, response_text = await self.get_stove_info_wos(session, fid)
+                with request_consumer(CONSUMER_GIFT_VALIDATION):
+                    status_code, player_info_json, response_text = await self.get_stove_info_wos(session, fid)
             finally:
                 await session.close()
 
@@ -988,56 +1030,102 @@ class GiftOperations(commands.Cog):
             self.logger.exception(f"Error getting test ID: {e}")
             return "244886619"
     
-    async def get_validation_fid(self):
-        """Get the best available ID for gift code validation.
-        
-        Hierarchy:
-        1. Configured test ID (if valid)
-        2. Random alliance member ID (if no test ID)
-        3. Relo default ID (244886619) as fallback
-        
+    async def get_validation_fid_pool(self, size=None):
+        """Get a pool of distinct IDs to validate gift codes with concurrently.
+
+        The configured test ID (if valid) comes first, followed by random alliance
+        members. Falls back to the default ID (244886619) if the pool is empty.
+
+        Args:
+            size: Maximum pool size (defaults to WOS_VALIDATION_POOL_SIZE)
+
         Returns:
-            tuple: (fid, source) where source is 'test_fid', 'alliance_member', or 'default'
+            list: [(fid, source), ...] where source is 'test_fid', 'alliance_member' or 'default'
         """
+        size = size or get_validation_pool_size()
+        pool = []
+
         try:
-            # First try: Use configured test ID if it's valid
-            test_fid = self.get_test_fid()
-            
-            # Check if test ID is actually configured (not default)
             self.settings_cursor.execute("SELECT test_fid FROM test_fid_settings ORDER BY id DESC LIMIT 1")
             result = self.settings_cursor.fetchone()
-            
+
             if result and result[0] != "244886619":
-                # Test ID is configured, verify it's valid
-                is_valid, _ = await self.verify_test_fid(test_fid)
+                is_valid, _ = await self.verify_test_fid(result[0])
                 if is_valid:
-                    self.logger.info(f"Using configured test ID for validation: {test_fid}")
-                    return test_fid, 'test_fid'
-            
-            # Second try: Use a random alliance member
-            with sqlite3.connect('db/users.sqlite') as users_conn:
-                users_cursor = users_conn.cursor()
-                users_cursor.execute("""
-                    SELECT fid, nickname FROM users 
-                    WHERE alliance IS NOT NULL AND alliance != '' 
-                    ORDER BY RANDOM() 
-                    LIMIT 1
-                """)
-                member = users_cursor.fetchone()
-                
-                if member:
-                    fid, nickname = member
-                    self.logger.info(f"Using alliance member ID for validation: {fid} ({nickname})")
-                    return fid, 'alliance_member'
-            
-            # Third try: Fall back to default ID
-            self.logger.info("No alliance members found, using default ID for validation: 244886619")
-            return "244886619", 'default'
-            
+                    pool.append((result[0], 'test_fid'))
+
+            if len(pool) < size:
+                with sqlite3.connect('db/users.sqlite') as users_conn:
+                    users_cursor = users_conn.cursor()
+                    users_cursor.execute("""
+                        SELECT fid FROM users 
+                        WHERE alliance IS NOT NULL AND alliance != '' 
+                        ORDER BY RANDOM() 
+                        LIMIT ?
+                    """, (size,))
+                    known = {str(fid) for fid, _ in pool}
+                    for (fid,) in users_cursor.fetchall():
+                        if len(pool) >= size:
+                            break
+                        if str(fid) not in known:
+                            pool.append((fid, 'alliance_member'))
+                            known.add(str(fid))
         except Exception as e:
-            self.logger.exception(f"Error in get_validation_fid: {e}")
-            return "244886619", 'default'
-    
+            self.logger.exception(f"Error in get_validation_fid_pool: {e}")
+
+        if not pool:
+            pool.append(("244886619", 'default'))
+
+        self.logger.info(f"Validation ID pool ({len(pool)}): {', '.join(f'{fid} ({src})' for fid, src in pool)}")
+        return pool
+
+    async def validate_with_quorum(self, giftcode, validators):
+        """Check a gift code with several IDs concurrently and decide by quorum.
+
+        A single valid response proves the code is valid. The code is only considered
+        invalid when at least WOS_VALIDATION_QUORUM IDs (capped at the pool size)
+        report an invalid status, so one unlucky account cannot invalidate a good code.
+
+        Args:
+            giftcode: The gift code to check
+            validators: [(fid, source), ...] as returned by get_validation_fid_pool
+
+        Returns:
+            tuple: (verdict, status, results) where verdict is True (valid), False (invalid)
+                   or None (inconclusive), status is the deciding status and results maps fid -> status
+        """
+        valid_statuses = {"SUCCESS", "RECEIVED", "SAME TYPE EXCHANGE", "TOO_SMALL_SPEND_MORE", "TOO_POOR_SPEND_MORE"}
+        invalid_statuses = {"TIME_ERROR", "CDK_NOT_FOUND", "USAGE_LIMIT"}
+
+        with request_consumer(CONSUMER_GIFT_VALIDATION):
+            statuses = await asyncio.gather(
+                *(self.claim_giftcode_rewards_wos(fid, giftcode, bypass_cache=True) for fid, _ in validators),
+                return_exceptions=True
+            )
+
+        results = {}
+        for (fid, _), status in zip(validators, statuses):
+            if isinstance(status, Exception):
+                self.logger.error(f"Validation with ID {fid} for code '{giftcode}' raised: {status}")
+                status = "ERROR"
+            results[fid] = status
+
+        valid_votes = [status for status in results.values() if status in valid_statuses]
+        invalid_votes = [status for status in results.values() if status in invalid_statuses]
+        other_votes = [status for status in results.values() if status not in valid_statuses | invalid_statuses]
+        quorum = min(get_validation_quorum(), len(validators))
+
+        self.logger.info(
+            f"Quorum validation for '{giftcode}': {len(valid_votes)} valid, {len(invalid_votes)} invalid, "
+            f"{len(other_votes)} inconclusive (quorum {quorum}/{len(validators)})"
+        )
+
+        if valid_votes:
+            return True, valid_votes[0], results
+        if len(invalid_votes) >= quorum:
+            return False, Counter(invalid_votes).most_common(1)[0][0], results
+        return None, other_votes[0] if other_votes else invalid_votes[0], results
+
     async def validate_gift_code_immediately(self, giftcode, source="unknown"):
         """Immediately validate a gift code when it's added from any source.
         
@@ -1052,10 +1140,10 @@ class GiftOperations(commands.Cog):
             # Clean the gift code
             giftcode = self.clean_gift_code(giftcode)
             
-            # Get the best ID for validation
-            validation_fid, fid_source = await self.get_validation_fid()
+            # Get the pool of IDs for validation
+            validators = await self.get_validation_fid_pool()
             
-            self.logger.info(f"Validating gift code '{giftcode}' from {source} using {fid_source} ID: {validation_fid}")
+            self.logger.info(f"Validating gift code '{giftcode}' from {source} using {len(validators)} ID(s)")
             
             # Check if already validated
             self.cursor.execute("SELECT validation_status FROM gift_codes WHERE giftcode = ?", (giftcode,))
@@ -1070,11 +1158,11 @@ class GiftOperations(commands.Cog):
                     self.logger.info(f"Gift code '{giftcode}' already validated")
                     return True, "Code already validated"
             
-            # Perform validation using the selected ID
-            status = await self.claim_giftcode_rewards_wos(validation_fid, giftcode)
+            # Perform validation using the ID pool
+            verdict, status, _ = await self.validate_with_quorum(giftcode, validators)
             
             # Handle validation results
-            if status in ["SUCCESS", "RECEIVED", "SAME TYPE EXCHANGE", "TOO_SMALL_SPEND_MORE", "TOO_POOR_SPEND_MORE"]:
+            if verdict is True:
                 # Valid code - mark as validated
                 self.cursor.execute("""
                     INSERT OR REPLACE INTO gift_codes (giftcode, date, validation_status) 
@@ -1088,12 +1176,12 @@ class GiftOperations(commands.Cog):
                     self.logger.info(f"Gift code '{giftcode}' is valid but has requirements: {status}")
                 else:
                     validation_msg = f"Code validated successfully ({status})"
-                    self.logger.info(f"Gift code '{giftcode}' validated successfully using {fid_source} ID")
+                    self.logger.info(f"Gift code '{giftcode}' validated successfully")
                 
                 return True, validation_msg
                 
-            elif status in ["TIME_ERROR", "CDK_NOT_FOUND", "USAGE_LIMIT"]:
-                # Invalid code - mark as invalid
+            elif verdict is False:
+                # Invalid code confirmed by quorum - mark as invalid
                 self.mark_code_invalid(giftcode)
                 
                 reason_map = {
@@ -1459,24 +1547,61 @@ class GiftOperations(commands.Cog):
         connector = aiohttp.TCPConnector(ssl=self.wos_ssl_context)
         return aiohttp.ClientSession(connector=connector, timeout=timeout)
 
+    def _get_endpoint_breaker(self, url):
+        """Circuit breaker shared by all calls to one gift API endpoint (named after its path, e.g. gift_captcha)."""
+        endpoint = url.rstrip('/').rsplit('/', 1)[-1]
+        return get_circuit_breaker(f"gift_{endpoint}", log=self.logger.warning)
+
+    def _gift_api_retry_after(self):
+        """Seconds until every open gift API circuit allows a trial call again."""
+        urls = (self.wos_player_info_url, self.wos_captcha_url, self.wos_giftcode_url)
+        return max(self._get_endpoint_breaker(url).retry_after() for url in urls)
+
     async def _post_with_retries(self, session, url, headers, data, max_attempts=3):
+        """POST with retries on server errors.
+
+        Returns (status, text), or (None, error) when every attempt failed. While the
+        endpoint's circuit breaker is open no request is sent and the error starts with CIRCUIT_OPEN.
+        Each attempt first waits for a slot in the shared gift API budget.
+        """
+        breaker = self._get_endpoint_breaker(url)
         last_error = None
         for attempt in range(max_attempts):
+            if not breaker.allow_request():
+                return None, f"CIRCUIT_OPEN: {breaker.name} unavailable, retry in {breaker.retry_after():.0f}s"
+            await self.gift_request_pool.acquire()
+            started = time.monotonic()
             try:
                 async with session.post(url, headers=headers, data=data) as response:
                     text = await response.text()
+                    if response.status >= 500:
+                        breaker.record_failure(time.monotonic() - started, f"HTTP {response.status}")
+                    else:
+                        breaker.record_success(time.monotonic() - started)
+                    if response.status == 429:
+                        # Pause every gift API consumer together rather than letting each retry on its own
+                        self.gift_request_pool.report_throttled(parse_retry_after(response.headers, 5.0))
                     if response.status in [429, 500, 502, 503, 504] and attempt < max_attempts - 1:
                         await asyncio.sleep(1 + attempt)
                         continue
                     return response.status, text
-            except aiohttp.ClientError as e:
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 last_error = e
+                breaker.record_failure(time.monotonic() - started, str(e) or type(e).__name__)
                 if attempt < max_attempts - 1:
                     await asyncio.sleep(1 + attempt)
                     continue
-        return None, str(last_error) if last_error else "Unknown error"
+        return None, (str(last_error) or type(last_error).__name__) if last_error else "Unknown error"
 
     async def get_stove_info_wos(self, session, player_id):
+        """Log the player in to the gift API; concurrent logins for one player on the same session share a single request.
+
+        The login cookie is stored in the session that sent the request, so callers with their own
+        session must each log in themselves.
+        """
+        return await self.player_logins.run((str(player_id), id(session)), lambda: self._request_stove_info_wos(session, player_id))
+
+    async def _request_stove_info_wos(self, session, player_id):
         headers = {
             "accept": "application/json, text/plain, */*",
             "content-type": "application/x-www-form-urlencoded",
@@ -1503,10 +1628,106 @@ class GiftOperations(commands.Cog):
 
         return status_code, response_json, response_text
 
+    async def _submit_gift_code(self, player_id, giftcode, captcha_code, session):
+        """Submit a gift code with a solved captcha and log the exchange.
+
+        Returns:
+            tuple: (msg, err_code, response_json)
+        """
+        headers = {
+            "accept": "application/json, text/plain, */*",
+            "content-type": "application/x-www-form-urlencoded",
+            "origin": self.wos_giftcode_redemption_url,
+        }
+        data_to_encode = {
+            "fid": f"{player_id}",
+            "cdk": giftcode,
+            "captcha_code": captcha_code,
+            "time": f"{int(datetime.now().timestamp()*1000)}"
+        }
+        data = self.encode_data(data_to_encode)
+        self.processing_stats["captcha_submissions"] += 1
+        
+        # Submit to gift code API
+        status_code, response_text = await self._post_with_retries(
+            session,
+            self.wos_giftcode_url,
+            headers=headers,
+            data=data,
+        )
+
+        # Log the redemption attempt
+        log_entry_redeem = f"\n{datetime.now()} API REQ - Gift Code Redeem\nID:{player_id}, Code:{giftcode}, Captcha:{captcha_code}\n"
+        try:
+            response_json_redeem = json.loads(response_text) if response_text else {}
+            log_entry_redeem += f"Resp Code: {status_code}\nResponse JSON:\n{json.dumps(response_json_redeem, indent=2)}\n"
+        except json.JSONDecodeError:
+            response_json_redeem = {}
+            log_entry_redeem += f"Resp Code: {status_code}\nResponse Text (Not JSON): {response_text[:500]}...\n"
+        log_entry_redeem += "-" * 50 + "\n"
+        self.giftlog.info(log_entry_redeem.strip())
+        
+        # Parse response
+        msg = str(response_json_redeem.get("msg", "Unknown Error")).strip('.')
+        err_code = response_json_redeem.get("err_code")
+        return msg, err_code, response_json_redeem
+
+    def _redeem_status_from_response(self, player_id, giftcode, msg, err_code, response_json_redeem):
+        """Map a gift code API response to a redemption status."""
+        if msg == "SUCCESS":
+            status = "SUCCESS"
+        elif msg == "RECEIVED" and err_code == 40008:
+            status = "RECEIVED"
+        elif msg == "SAME TYPE EXCHANGE" and err_code == 40011:
+            status = "SAME TYPE EXCHANGE"
+        elif msg == "TIME ERROR" and err_code == 40007:
+            status = "TIME_ERROR"
+        elif msg == "CDK NOT FOUND" and err_code == 40014:
+            status = "CDK_NOT_FOUND"
+        elif msg == "USED" and err_code == 40005:
+            status = "USAGE_LIMIT"
+        elif msg == "TIMEOUT RETRY" and err_code == 40004:
+            status = "TIMEOUT_RETRY"
+        elif msg == "NOT LOGIN":
+            status = "LOGIN_EXPIRED_MID_PROCESS"
+        elif "sign error" in msg.lower():
+            status = "SIGN_ERROR"
+            self.logger.error(f"[SIGN ERROR] Sign error detected for ID {player_id}, code {giftcode}")
+            self.logger.error(f"[SIGN ERROR] Response: {response_json_redeem}")
+        elif msg == "STOVE_LV ERROR" and err_code == 40006:
+            status = "TOO_SMALL_SPEND_MORE"
+            self.logger.error(f"[FURNACE LVL ERROR] Furnace level is too low for ID {player_id}, code {giftcode}")
+            self.logger.error(f"[FURNACE LVL ERROR] Response: {response_json_redeem}")
+        elif (msg == "RECHARGE_MONEY ERROR" and err_code == 40017) or (msg == "RECHARGE_MONEY_VIP ERROR" and err_code == 40018):
+            status = "TOO_POOR_SPEND_MORE"
+            self.logger.error(f"[VIP LEVEL ERROR] VIP level is too low for ID {player_id}, code {giftcode}")
+            self.logger.error(f"[VIP LEVEL ERROR] Response: {response_json_redeem}")
+        else:
+            status = "UNKNOWN_API_RESPONSE"
+            self.logger.info(f"Unknown API response for {player_id}: msg='{msg}', err_code={err_code}")
+        return status
+
     async def attempt_gift_code_with_api(self, player_id, giftcode, session):
-        """Attempt to redeem a gift code."""
+        """Attempt to redeem a gift code.
+
+        Each fetched captcha is answered with the solver's ranked guesses: when the server
+        rejects a guess with CAPTCHA CHECK ERROR the next most likely answer is submitted
+        for the same captcha, but only once the server has shown that a rejected captcha
+        stays usable (see _may_reuse_captcha). Otherwise a new captcha is fetched.
+        """
         max_ocr_attempts = 4
         
+        # Check if this is a rate limit error - these need special handling
+        rate_limit_errors = {
+            ("CAPTCHA GET TOO FREQUENT", 40100),
+            ("CAPTCHA CHECK TOO FREQUENT", 40101)
+        }
+        # Other captcha errors get retry logic
+        other_captcha_errors = {
+            ("CAPTCHA CHECK ERROR", 40103),
+            ("CAPTCHA EXPIRED", 40102)
+        }
+        
         for attempt in range(max_ocr_attempts):
             self.logger.info(f"GiftOps: Attempt {attempt + 1}/{max_ocr_attempts} to fetch/solve captcha for ID {player_id}")
             
@@ -1517,6 +1738,9 @@ class GiftOperations(commands.Cog):
                 if error == "CAPTCHA_TOO_FREQUENT":
                     self.logger.info(f"GiftOps: API returned CAPTCHA_TOO_FREQUENT for ID {player_id}")
                     return "CAPTCHA_TOO_FREQUENT", None, None, None
+                elif error == "CIRCUIT_OPEN":
+                    self.logger.info(f"GiftOps: Captcha endpoint circuit open, skipping ID {player_id} for now")
+                    return "CIRCUIT_OPEN", None, None, None
                 else:
                     self.logger.error(f"GiftOps: Captcha fetch error for ID {player_id}: {error}")
                     return "CAPTCHA_FETCH_ERROR", None, None, None
@@ -1538,7 +1762,7 @@ class GiftOperations(commands.Cog):
             
             # Solve captcha
             self.processing_stats["ocr_solver_calls"] += 1
-            captcha_code, success, method, confidence, _ = await self.captcha_solver.solve_captcha(
+            candidates, success, method, confidence = await self.captcha_solver.solve_captcha_ranked(
                 image_bytes, fid=player_id, attempt=attempt)
             
             if not success:
@@ -1548,111 +1772,97 @@ class GiftOperations(commands.Cog):
                 continue
             
             self.processing_stats["ocr_valid_format"] += 1
-            self.logger.info(f"GiftOps: OCR solved for {player_id}: {captcha_code} (method:{method}, conf:{confidence:.2f}, attempt:{attempt+1})")
-            
-            # Submit gift code with solved captcha
-            headers = {
-                "accept": "application/json, text/plain, */*",
-                "content-type": "application/x-www-form-urlencoded",
-                "origin": self.wos_giftcode_redemption_url,
-            }
-            data_to_encode = {
-                "fid": f"{player_id}",
-                "cdk": giftcode,
-                "captcha_code": captcha_code,
-                "time": f"{int(datetime.now().timestamp()*1000)}"
-            }
-            data = self.encode_data(data_to_encode)
-            self.processing_stats["captcha_submissions"] += 1
+            self.logger.info(f"GiftOps: OCR solved for {player_id}: {candidates[0][0]} (method:{method}, conf:{confidence:.2f}, attempt:{attempt+1}, guesses:{len(candidates)})")
             
-            # Submit to gift code API
-            status_code, response_text = await self._post_with_retries(
-                session,
-                self.wos_giftcode_url,
-                headers=headers,
-                data=data,
-            )
-
-            # Log the redemption attempt
-            log_entry_redeem = f"\n{datetime.now()} API REQ - Gift Code Redeem\nID:{player_id}, Code:{giftcode}, Captcha:{captcha_code}\n"
-            try:
-                response_json_redeem = json.loads(response_text) if response_text else {}
-                log_entry_redeem += f"Resp Code: {status_code}\nResponse JSON:\n{json.dumps(response_json_redeem, indent=2)}\n"
-            except json.JSONDecodeError:
-                response_json_redeem = {}
-                log_entry_redeem += f"Resp Code: {status_code}\nResponse Text (Not JSON): {response_text[:500]}...\n"
-            log_entry_redeem += "-" * 50 + "\n"
-            self.giftlog.info(log_entry_redeem.strip())
-            
-            # Parse response
-            msg = str(response_json_redeem.get("msg", "Unknown Error")).strip('.')
-            err_code = response_json_redeem.get("err_code")
-            
-            # Check if this is a rate limit error - these need special handling
-            rate_limit_errors = {
-                ("CAPTCHA GET TOO FREQUENT", 40100),
-                ("CAPTCHA CHECK TOO FREQUENT", 40101)
-            }
-            
-            if (msg, err_code) in rate_limit_errors:
-                self.logger.info(f"GiftOps: Rate limit hit for ID {player_id} (msg: {msg}, code: {err_code})")
-                return "CAPTCHA_TOO_FREQUENT", image_bytes, captcha_code, method
-            
-            # Handle other captcha errors with retry logic
-            other_captcha_errors = {
-                ("CAPTCHA CHECK ERROR", 40103),
-                ("CAPTCHA EXPIRED", 40102)
-            }
+            # Refetch instead of spending a submission on an unlikely answer (the last attempt always submits)
+            if not self.captcha_solver.should_submit(confidence) and attempt < max_ocr_attempts - 1:
+                self.processing_stats["low_confidence_refetches"] += 1
+                self.logger.info(f"GiftOps: Confidence {confidence:.2f} below threshold {self.captcha_solver.min_confidence:.2f} for ID {player_id}. Refetching captcha...")
+                continue
             
-            if (msg, err_code) in other_captcha_errors:
-                self.processing_stats["server_validation_failure"] += 1
-                if attempt == max_ocr_attempts - 1:
-                    return "CAPTCHA_INVALID", image_bytes, captcha_code, method
-                else:
+            for guess_index, (captcha_code, probability) in enumerate(candidates):
+                if guess_index > 0 and not self.captcha_solver.should_submit(probability):
+                    self.logger.info(f"GiftOps: Skipping alternate guesses below confidence threshold for ID {player_id}")
+                    if attempt == max_ocr_attempts - 1:
+                        return "CAPTCHA_INVALID", image_bytes, candidates[guess_index - 1][0], method
+                    break
+                if guess_index > 0:
+                    self.processing_stats["alternate_submissions"] += 1
+                    self.logger.info(f"GiftOps: Submitting alternate guess {guess_index + 1}/{len(candidates)} for ID {player_id}: {captcha_code} (p={probability:.3f})")
+                
+                # Submit gift code with solved captcha
+                msg, err_code, response_json_redeem = await self._submit_gift_code(player_id, giftcode, captcha_code, session)
+                
+                if (msg, err_code) in rate_limit_errors:
+                    self.logger.info(f"GiftOps: Rate limit hit for ID {player_id} (msg: {msg}, code: {err_code})")
+                    self._start_captcha_cooldown()
+                    return "CAPTCHA_TOO_FREQUENT", image_bytes, captcha_code, method
+                
+                if (msg, err_code) in other_captcha_errors:
+                    self.processing_stats["server_validation_failure"] += 1
+                    if err_code == 40103:
+                        self.captcha_solver.remember_answer(image_bytes, captcha_code, False)
+                        if method == "ONNX":
+                            self.captcha_solver.record_outcome(probability, False)
+                    if guess_index > 0:
+                        self._record_captcha_reuse(False, err_code)
+                    # Try the next ranked answer on the same captcha only if rejected captchas are known to stay usable
+                    if err_code == 40103 and guess_index < len(candidates) - 1 and self._may_reuse_captcha(guess_index + 1):
+                        self.logger.info(f"GiftOps: CAPTCHA_INVALID for ID {player_id} with guess {guess_index + 1} (msg: {msg}). Trying next guess...")
+                        await asyncio.sleep(random.uniform(1.5, 2.5))
+                        continue
+                    if attempt == max_ocr_attempts - 1:
+                        return "CAPTCHA_INVALID", image_bytes, captcha_code, method
                     self.logger.info(f"GiftOps: CAPTCHA_INVALID for ID {player_id} on attempt {attempt + 1} (msg: {msg}). Retrying...")
                     await asyncio.sleep(random.uniform(1.5, 2.5))
-                    continue
-            else:
+                    break
+                
                 self.processing_stats["server_validation_success"] += 1
-            
-            # Determine final status
-            if msg == "SUCCESS":
-                status = "SUCCESS"
-            elif msg == "RECEIVED" and err_code == 40008:
-                status = "RECEIVED"
-            elif msg == "SAME TYPE EXCHANGE" and err_code == 40011:
-                status = "SAME TYPE EXCHANGE"
-            elif msg == "TIME ERROR" and err_code == 40007:
-                status = "TIME_ERROR"
-            elif msg == "CDK NOT FOUND" and err_code == 40014:
-                status = "CDK_NOT_FOUND"
-            elif msg == "USED" and err_code == 40005:
-                status = "USAGE_LIMIT"
-            elif msg == "TIMEOUT RETRY" and err_code == 40004:
-                status = "TIMEOUT_RETRY"
-            elif msg == "NOT LOGIN":
-                status = "LOGIN_EXPIRED_MID_PROCESS"
-            elif "sign error" in msg.lower():
-                status = "SIGN_ERROR"
-                self.logger.error(f"[SIGN ERROR] Sign error detected for ID {player_id}, code {giftcode}")
-                self.logger.error(f"[SIGN ERROR] Response: {response_json_redeem}")
-            elif msg == "STOVE_LV ERROR" and err_code == 40006:
-                status = "TOO_SMALL_SPEND_MORE"
-                self.logger.error(f"[FURNACE LVL ERROR] Furnace level is too low for ID {player_id}, code {giftcode}")
-                self.logger.error(f"[FURNACE LVL ERROR] Response: {response_json_redeem}")
-            elif (msg == "RECHARGE_MONEY ERROR" and err_code == 40017) or (msg == "RECHARGE_MONEY_VIP ERROR" and err_code == 40018):
-                status = "TOO_POOR_SPEND_MORE"
-                self.logger.error(f"[VIP LEVEL ERROR] VIP level is too low for ID {player_id}, code {giftcode}")
-                self.logger.error(f"[VIP LEVEL ERROR] Response: {response_json_redeem}")
-            else:
-                status = "UNKNOWN_API_RESPONSE"
-                self.logger.info(f"Unknown API response for {player_id}: msg='{msg}', err_code={err_code}")
-            
-            return status, image_bytes, captcha_code, method
+                self.captcha_solver.remember_answer(image_bytes, captcha_code, True)
+                if method == "ONNX":
+                    self.captcha_solver.record_outcome(probability, True)
+                if guess_index > 0:
+                    self.processing_stats["alternate_successes"] += 1
+                    self._record_captcha_reuse(True)
+                
+                status = self._redeem_status_from_response(player_id, giftcode, msg, err_code, response_json_redeem)
+                return status, image_bytes, captcha_code, method
         
         return "MAX_CAPTCHA_ATTEMPTS_REACHED", None, None, None
 
-    async def claim_giftcode_rewards_wos(self, player_id, giftcode):
+    def _may_reuse_captcha(self, next_guess_index):
+        """Check whether to submit another guess for a captcha the server just rejected.
+
+        Reuse is only assumed once an alternate guess has passed the captcha check. Until the
+        server has shown either way, the first alternate of a captcha is sent as a probe, up to
+        captcha_reuse_max_probes times; afterwards rejected captchas are always replaced.
+        """
+        if self.captcha_reusable is not None:
+            return self.captcha_reusable
+        return next_guess_index == 1 and self.captcha_reuse_probes < self.captcha_reuse_max_probes
+
+    def _record_captcha_reuse(self, passed, err_code=None):
+        """Learn from the server's answer to an alternate guess whether rejected captchas stay usable."""
+        if self.captcha_reusable is not None:
+            return
+        if passed:
+            self.captcha_reusable = True
+            self.logger.info("GiftOps: Alternate captcha guess passed the check; rejected captchas stay usable, alternates enabled")
+        elif err_code == 40102:
+            self.captcha_reusable = False
+            self.logger.info("GiftOps: Captcha expired after a rejected guess; alternates disabled, rejected captchas are refetched")
+        else:
+            self.captcha_reuse_probes += 1
+            if self.captcha_reuse_probes >= self.captcha_reuse_max_probes:
+                self.captcha_reusable = False
+                self.logger.info(f"GiftOps: No alternate captcha guess passed in {self.captcha_reuse_probes} probes; alternates disabled")
+
+    async def claim_giftcode_rewards_wos(self, player_id, giftcode, bypass_cache=False):
+        """Redeem a gift code for one player and return the resulting status.
+
+        With bypass_cache the code is always checked against the server and nothing is read
+        from or written to user_giftcodes, so validation votes reflect the code's current state.
+        """
 
         giftcode = self.clean_gift_code(giftcode)
         process_start_time = time.time()
@@ -1664,7 +1874,7 @@ class GiftOperations(commands.Cog):
         try:
             # Cache Check
             test_fid = self.get_test_fid()
-            if player_id != test_fid:
+            if not bypass_cache and player_id != test_fid:
                 self.cursor.execute("SELECT status FROM user_giftcodes WHERE fid = ? AND giftcode = ?", (player_id, giftcode))
                 existing_record = self.cursor.fetchone()
                 if existing_record:
@@ -1677,7 +1887,7 @@ class GiftOperations(commands.Cog):
             ocr_settings_row = self.settings_cursor.fetchone()
             ocr_enabled = ocr_settings_row[0] if ocr_settings_row else 0
 
-            if not (ocr_enabled == 1 and self.captcha_solver):
+            if not (ocr_enabled == 1 and self.captcha_solver and await self.captcha_solver.wait_until_ready()):
                 status = "OCR_DISABLED" if ocr_enabled == 0 else "SOLVER_ERROR"
                 log_msg = f"{datetime.now()} Skipping captcha: OCR disabled (Enabled={ocr_enabled}) or Solver not ready ({self.captcha_solver is None}) for ID {player_id}.\n"
                 self.logger.info(log_msg.strip())
@@ -1699,6 +1909,10 @@ class GiftOperations(commands.Cog):
                 log_entry_player += "-" * 50 + "\n"
                 self.giftlog.info(log_entry_player.strip())
 
+                if status_code is None and response_text.startswith("CIRCUIT_OPEN"):
+                    self.giftlog.info(f"{datetime.now()} Login skipped for ID {player_id}: {response_text}")
+                    return "CIRCUIT_OPEN"
+
                 if status_code is None:
                     status = "LOGIN_FAILED"
                     log_message = f"{datetime.now()} Login request failed for ID {player_id}\n"
@@ -1724,7 +1938,7 @@ class GiftOperations(commands.Cog):
                 await session.close()
 
             # Handle database updates for successful redemptions
-            if player_id != self.get_test_fid() and status in ["SUCCESS", "RECEIVED", "SAME TYPE EXCHANGE"]:
+            if not bypass_cache and player_id != self.get_test_fid() and status in ["SUCCESS", "RECEIVED", "SAME TYPE EXCHANGE"]:
                 try:
                     user_giftcode_data = [(player_id, giftcode, status)]
                     self.batch_insert_user_giftcodes(user_giftcode_data)
@@ -1776,43 +1990,25 @@ class GiftOperations(commands.Cog):
         # Image save handling
         if image_bytes and self.captcha_solver and self.captcha_solver.save_images_mode > 0:
             save_mode = self.captcha_solver.save_images_mode
-            should_save = False
-            filename_base = None
+            outcome = None
             log_prefix = ""
 
             is_success = status in ["SUCCESS", "RECEIVED", "SAME TYPE EXCHANGE"]
             is_fail_server = status == "CAPTCHA_INVALID"
 
             if is_success and save_mode in [2, 3]:
-                should_save = True
+                outcome = OUTCOME_ACCEPTED
                 log_prefix = f"Captcha OK (Solver: {method})"
-                solved_code_str = captcha_code if captcha_code else "UNKNOWN_SOLVE"
-                filename_base = f"{solved_code_str}.png"
             elif is_fail_server and save_mode in [1, 3]:
-                should_save = True
+                outcome = OUTCOME_REJECTED
                 log_prefix = f"Captcha Fail Server (Solver: {method} -> {status})"
-                solved_code_str = captcha_code if captcha_code else "UNKNOWN_SENT"
-                timestamp = int(time.time())
-                filename_base = f"FAIL_SERVER_{solved_code_str}_{timestamp}.png"
 
-            if should_save and filename_base:
+            if outcome:
                 try:
-                    save_path = os.path.join(self.captcha_solver.captcha_dir, filename_base)
-                    counter = 1
-                    base, ext = os.path.splitext(filename_base)
-                    while os.path.exists(save_path) and counter <= 100:
-                        save_path = os.path.join(self.captcha_solver.captcha_dir, f"{base}_{counter}{ext}")
-                        counter += 1
-
-                    if counter > 100:
-                        self.logger.warning(f"Could not find unique filename for {filename_base} after 100 tries. Discarding image.")
-                    else:
-                        with open(save_path, "wb") as f:
-                            f.write(image_bytes)
-                        self.logger.info(f"GiftOps: {log_prefix} - Saved captcha image as {os.path.basename(save_path)}")
-
+                    record_id = self.captcha_store.append(image_bytes, captcha_code, outcome, method=method, fid=player_id)
+                    self.logger.info(f"GiftOps: {log_prefix} - Stored captcha '{captcha_code}' as record {record_id}")
                 except Exception as save_err:
-                    self.logger.exception(f"GiftOps: Error saving captcha image ({filename_base}): {save_err}")
+                    self.logger.exception(f"GiftOps: Error storing captcha image ({captcha_code}): {save_err}")
 
         self.logger.info(f"GiftOps: Final status for ID {player_id} / Code '{giftcode}': {status}")
         return status
@@ -2098,6 +2294,98 @@ class GiftOperations(commands.Cog):
         except Exception as e:
             self.logger.exception(f"Error during invalid codes cleanup: {e}")
 
+    async def _periodic_validation_invalidate(self, giftcode, status):
+        """Mark a code invalid after periodic validation and notify admins."""
+        self.logger.info(f"GiftOps: Code '{giftcode}' is now invalid (status: {status}). Updating database.")
+        
+        self.cursor.execute("UPDATE gift_codes SET validation_status = 'invalid' WHERE giftcode = ?", (giftcode,))
+        # Clear redemption status for the test ID only; members keep their redemption history
+        test_fid = self.get_test_fid()
+        self.cursor.execute("DELETE FROM user_giftcodes WHERE giftcode = ? AND fid = ?", (giftcode, test_fid))
+        self.conn.commit()
+        
+        # Remove from API if present
+        if hasattr(self, 'api') and self.api:
+            asyncio.create_task(self.api.remove_giftcode(giftcode, from_validation=True))
+        
+        # Notify admins about invalidated code
+        embed = discord.Embed(
+            title="❌ Gift Code Invalidated",
+            description=(
+                f"Code `{giftcode}` has been invalidated during periodic validation.\n"
+                f"Status: {status}"
+            ),
+            color=discord.Color.red(),
+            timestamp=datetime.now(),
+        )
+        await self._notify_admins(embed)
+
+    async def _periodic_validation_confirm(self, giftcode):
+        """Promote a pending code to validated and trigger delayed auto-redemption."""
+        self.logger.info(f"GiftOps: Code '{giftcode}' confirmed valid. Updating status to 'validated'.")
+        self.cursor.execute("UPDATE gift_codes SET validation_status = 'validated' WHERE giftcode = ? AND validation_status = 'pending'", (giftcode,))
+        self.conn.commit()
+
+        if hasattr(self, 'api') and self.api:
+            asyncio.create_task(self.api.add_giftcode(giftcode))
+
+        try:
+            auto_alliances = await self._execute_with_retry(self.get_auto_alliances)
+        except sqlite3.OperationalError as e:
+            error_msg = f"Auto-alliance query failed after retries for code '{giftcode}': {e}"
+            self.logger.error(error_msg)
+            print(f"ERROR: {error_msg}")
+            auto_alliances = []
+        except Exception as e:
+            error_msg = f"Unexpected error in auto-alliance query for code '{giftcode}': {e}"
+            self.logger.error(error_msg)
+            print(f"ERROR: {error_msg}")
+            auto_alliances = []
+
+        if auto_alliances:
+            self.logger.info(f"GiftOps: Triggering delayed auto-redemption for code '{giftcode}' to {len(auto_alliances)} alliances")
+
+            for alliance_id in auto_alliances:
+                try:
+                    await self.add_to_validation_queue(
+                        giftcode=giftcode,
+                        source='periodic-auto',
+                        operation_type='redemption',
+                        alliance_id=alliance_id,
+                        interaction=None
+                    )
+                except Exception as e:
+                    self.logger.exception(f"Error queueing delayed auto-redemption for code {giftcode} to alliance {alliance_id}: {e}")
+
+            embed = discord.Embed(
+                title="✅ Auto-Redemption Started",
+                description=(
+                    f"Code `{giftcode}` has been validated and auto-redemption is now "
+                    f"starting for {len(auto_alliances)} alliance(s)."
+                ),
+                color=discord.Color.green(),
+                timestamp=datetime.now(),
+            )
+            await self._notify_admins(embed)
+
+    async def _periodic_validate_code(self, giftcode, current_status, validators):
+        """Validate one code during the periodic loop and apply the result.
+
+        Returns:
+            tuple: (verdict, status) as decided by validate_with_quorum
+        """
+        verdict, status, _ = await self.validate_with_quorum(giftcode, validators)
+        
+        if verdict is False:
+            await self._periodic_validation_invalidate(giftcode, status)
+        elif verdict is True:
+            if current_status == 'pending':
+                await self._periodic_validation_confirm(giftcode)
+        else:
+            self.logger.info(f"GiftOps: Code '{giftcode}' returned status '{status}' during periodic validation.")
+        
+        return verdict, status
+
     @tasks.loop(seconds=7200)
     async def periodic_validation_loop(self):
         """Periodically validate existing codes that are marked as 'valid' or 'pending'."""
@@ -2128,118 +2416,57 @@ class GiftOperations(commands.Cog):
                 
                 self.logger.info(f"GiftOps: Found {len(codes_to_check)} codes to validate periodically.")
                 
-                # Get test ID for validation
-                test_fid, fid_source = await self.get_validation_fid()
-                self.logger.info(f"GiftOps: Using {fid_source} ID {test_fid} for periodic validation.")
+                # Split the validation ID pool into groups so several codes can be checked at once
+                validators = await self.get_validation_fid_pool()
+                quorum = min(get_validation_quorum(), len(validators))
+                group_count = max(1, len(validators) // quorum)
+                validator_groups = [validators[i::group_count] for i in range(group_count)]
+                self.logger.info(f"GiftOps: Using {len(validators)} validation ID(s) in {group_count} group(s) for periodic validation.")
                 
                 codes_checked = 0
                 codes_invalidated = 0
                 codes_still_valid = 0
+                # Cap the codes per run to prevent long-running loops
+                if len(codes_to_check) > 20:
+                    self.logger.info("GiftOps: Reached periodic validation limit of 20 codes per run.")
+                    codes_to_check = codes_to_check[:20]
                 
-                for giftcode, current_status in codes_to_check:
-                    # Skip if we've checked too many codes (to prevent long-running loops)
-                    if codes_checked >= 20:
-                        self.logger.info("GiftOps: Reached periodic validation limit of 20 codes per run.")
-                        break
-                    
-                    try:
+                for chunk_start in range(0, len(codes_to_check), group_count):
+                    chunk = codes_to_check[chunk_start:chunk_start + group_count]
+                    for giftcode, current_status in chunk:
                         self.logger.info(f"GiftOps: Periodically validating code '{giftcode}' (current status: {current_status})")
-                        
-                        # Check the code with test ID
-                        status = await self.claim_giftcode_rewards_wos(test_fid, giftcode)
+                    
+                    outcomes = await asyncio.gather(
+                        *(self._periodic_validate_code(giftcode, current_status, group)
+                          for (giftcode, current_status), group in zip(chunk, validator_groups)),
+                        return_exceptions=True
+                    )
+                    
+                    chunk_statuses = []
+                    for (giftcode, _), outcome in zip(chunk, outcomes):
+                        if isinstance(outcome, Exception):
+                            self.logger.error(f"Error validating code '{giftcode}' during periodic check: {outcome}")
+                            chunk_statuses.append("ERROR")
+                            continue
+                        verdict, status = outcome
                         codes_checked += 1
-                        
-                        if status in ["TIME_ERROR", "CDK_NOT_FOUND", "USAGE_LIMIT"]: # Code is now invalid
-                            self.logger.info(f"GiftOps: Code '{giftcode}' is now invalid (status: {status}). Updating database.")
-                            
-                            self.cursor.execute("UPDATE gift_codes SET validation_status = 'invalid' WHERE giftcode = ?", (giftcode,))
-                            # Clear redemption status for the test fid
-                            self.cursor.execute("DELETE FROM user_giftcodes WHERE giftcode = ? AND fid = ?", (giftcode, test_fid))
-                            self.conn.commit()
-                            
+                        chunk_statuses.append(status)
+                        if verdict is False:
                             codes_invalidated += 1
-                            
-                            # Remove from API if present
-                            if hasattr(self, 'api') and self.api:
-                                asyncio.create_task(self.api.remove_giftcode(giftcode, from_validation=True))
-                            
-                            # Notify admins about invalidated code
-                            embed = discord.Embed(
-                                title="❌ Gift Code Invalidated",
-                                description=(
-                                    f"Code `{giftcode}` has been invalidated during periodic validation.\n"
-                                    f"Status: {status}"
-                                ),
-                                color=discord.Color.red(),
-                                timestamp=datetime.now(),
-                            )
-                            await self._notify_admins(embed)
-                        
-                        elif status in ["SUCCESS", "RECEIVED", "SAME TYPE EXCHANGE", "TOO_SMALL_SPEND_MORE", "TOO_POOR_SPEND_MORE"]:
+                        elif verdict is True:
                             codes_still_valid += 1
-
-                            if current_status == 'pending':
-                                self.logger.info(f"GiftOps: Code '{giftcode}' confirmed valid. Updating status to 'validated'.")
-                                self.cursor.execute("UPDATE gift_codes SET validation_status = 'validated' WHERE giftcode = ? AND validation_status = 'pending'", (giftcode,))
-                                self.conn.commit()
-
-                                if hasattr(self, 'api') and self.api:
-                                    asyncio.create_task(self.api.add_giftcode(giftcode))
-
-                                try:
-                                    auto_alliances = await self._execute_with_retry(self.get_auto_alliances)
-                                except sqlite3.OperationalError as e:
-                                    error_msg = f"Auto-alliance query failed after retries for code '{giftcode}': {e}"
-                                    self.logger.error(error_msg)
-                                    print(f"ERROR: {error_msg}")
-                                    auto_alliances = []
-                                except Exception as e:
-                                    error_msg = f"Unexpected error in auto-alliance query for code '{giftcode}': {e}"
-                                    self.logger.error(error_msg)
-                                    print(f"ERROR: {error_msg}")
-                                    auto_alliances = []
-
-                                if auto_alliances:
-                                    self.logger.info(f"GiftOps: Triggering delayed auto-redemption for code '{giftcode}' to {len(auto_alliances)} alliances")
-
-                                    for alliance_id in auto_alliances:
-                                        try:
-                                            await self.add_to_validation_queue(
-                                                giftcode=giftcode,
-                                                source='periodic-auto',
-                                                operation_type='redemption',
-                                                alliance_id=alliance_id,
-                                                interaction=None
-                                            )
-                                        except Exception as e:
-                                            self.logger.exception(f"Error queueing delayed auto-redemption for code {giftcode} to alliance {alliance_id}: {e}")
-
-                                    embed = discord.Embed(
-                                        title="✅ Auto-Redemption Started",
-                                        description=(
-                                            f"Code `{giftcode}` has been validated and auto-redemption is now "
-                                            f"starting for {len(auto_alliances)} alliance(s)."
-                                        ),
-                                        color=discord.Color.green(),
-                                        timestamp=datetime.now(),
-                                    )
-                                    await self._notify_admins(embed)
-                        
-                        else:
-                            self.logger.info(f"GiftOps: Code '{giftcode}' returned status '{status}' during periodic validation.")
-                            
-                            # Extra delay for CAPTCHA_TOO_FREQUENT errors
-                            if status == "CAPTCHA_TOO_FREQUENT":
-                                self.logger.info(f"GiftOps: Encountered CAPTCHA_TOO_FREQUENT, waiting 60-90 seconds before next validation")
-                                await asyncio.sleep(random.uniform(60.0, 90.0))
-                                continue
-                        
-                        # Wait between validations to avoid rate limiting
-                        await asyncio.sleep(random.uniform(30.0, 60.0))
-                        
-                    except Exception as e:
-                        self.logger.exception(f"Error validating code '{giftcode}' during periodic check: {e}")
+                    
+                    if chunk_start + group_count >= len(codes_to_check):
+                        break
+                    
+                    # Wait between validation rounds to avoid rate limiting
+                    if "CAPTCHA_TOO_FREQUENT" in chunk_statuses:
+                        self.logger.info(f"GiftOps: Encountered CAPTCHA_TOO_FREQUENT, waiting 60-90 seconds before next validation")
+                        await asyncio.sleep(random.uniform(60.0, 90.0))
+                    elif "ERROR" in chunk_statuses:
                         await asyncio.sleep(5) # Longer wait on error
+                    else:
+                        await asyncio.sleep(random.uniform(30.0, 60.0))
                 
                 self.logger.info(f"GiftOps: Periodic validation complete. Checked: {codes_checked}, Invalidated: {codes_invalidated}, Still valid: {codes_still_valid}")
             
@@ -2257,8 +2484,37 @@ class GiftOperations(commands.Cog):
         await self.bot.wait_until_ready()
         self.logger.info("GiftOps: Bot is ready, periodic_validation_loop will start.")
 
+    def _restore_captcha_cooldowns(self):
+        """Reload captcha cooldowns saved before a restart, dropping expired ones."""
+        state = load_state("gift_captcha") or {}
+        now = time.time()
+        if state.get("captcha_cooldown_until", 0) > now:
+            self.captcha_cooldown_until = state["captcha_cooldown_until"]
+            self.logger.info(f"GiftOps: Restored captcha cooldown, {self.captcha_cooldown_until - now:.0f}s remaining")
+        self.test_captcha_cooldowns = {
+            int(user_id): last_test for user_id, last_test in state.get("test_captcha_cooldowns", {}).items()
+            if now - last_test < self.test_captcha_delay
+        }
+
+    def _save_captcha_cooldowns(self):
+        now = time.time()
+        save_state("gift_captcha", {
+            "captcha_cooldown_until": self.captcha_cooldown_until,
+            "test_captcha_cooldowns": {
+                str(user_id): last_test for user_id, last_test in self.test_captcha_cooldowns.items()
+                if now - last_test < self.test_captcha_delay
+            },
+        })
+
+    def _start_captcha_cooldown(self):
+        """Stop fetching captchas for a while after the API says they are requested too often."""
+        self.captcha_cooldown_until = max(self.captcha_cooldown_until, time.time() + self.captcha_cooldown_seconds)
+        self._save_captcha_cooldowns()
+
     async def fetch_captcha(self, player_id, session=None):
         """Fetch a captcha image for a player ID."""
+        if time.time() < self.captcha_cooldown_until:
+            return None, "CAPTCHA_TOO_FREQUENT"
         if session is None:
             session = await self._create_wos_session()
             created_session = True
@@ -2286,12 +2542,16 @@ class GiftOperations(commands.Cog):
                 data=data,
             )
 
+            if status_code is None and response_text.startswith("CIRCUIT_OPEN"):
+                return None, "CIRCUIT_OPEN"
+
             if status_code == 200:
                 try:
                     captcha_data = json.loads(response_text) if response_text else {}
                 except json.JSONDecodeError:
                     captcha_data = {}
                 if captcha_data.get("code") == 1 and captcha_data.get("msg") == "CAPTCHA GET TOO FREQUENT.":
+                    self._start_captcha_cooldown()
                     return None, "CAPTCHA_TOO_FREQUENT"
 
                 if "data" in captcha_data and "img" in captcha_data["data"]:
@@ -2337,6 +2597,12 @@ class GiftOperations(commands.Cog):
                     if self.captcha_solver.is_initialized:
                         onnx_available = True
                         solver_status_msg = "Initialized & Ready"
+                    elif self.captcha_solver.load_state in ("pending", "loading"):
+                        onnx_available = True
+                        solver_status_msg = "Loading in Background"
+                    elif self.captcha_solver.load_state == "reconnecting":
+                        onnx_available = True
+                        solver_status_msg = "Reconnecting to Captcha Service"
                     elif hasattr(self.captcha_solver, 'is_initialized'):
                         onnx_available = True
                         solver_status_msg = "Initialization Failed (Check Logs)"
@@ -2390,6 +2656,17 @@ class GiftOperations(commands.Cog):
                 ocr_format_rate = (ocr_valid / ocr_calls * 100) if ocr_calls > 0 else 0
                 stats_lines.append(f"• Solver Calls: `{ocr_calls}`")
                 stats_lines.append(f"• Valid Format Returns: `{ocr_valid}` ({ocr_format_rate:.1f}%)")
+                if self.captcha_solver:
+                    solver_stats = self.captcha_solver.get_stats()
+                    stats_lines.append(
+                        f"• Answer Cache Hits: `{solver_stats['cache_hits']}` ({solver_stats['cache_hit_rate'] * 100:.1f}%, "
+                        f"known-good `{solver_stats['cache_promoted']}`)"
+                    )
+                    if "service_queue_depth" in solver_stats:
+                        stats_lines.append(
+                            f"• Solver Service: queue `{solver_stats['service_queue_depth']}`, "
+                            f"round trip p50 `{solver_stats['client_latency_p50_ms']:.1f}ms` / p99 `{solver_stats['client_latency_p99_ms']:.1f}ms`"
+                        )
 
                 stats_lines.append("\n**Redemption Process (Server Side):**")
                 submissions = self.processing_stats['captcha_submissions']
@@ -2401,6 +2678,9 @@ class GiftOperations(commands.Cog):
                 stats_lines.append(f"• Server Validation Success: `{server_success}`")
                 stats_lines.append(f"• Server Validation Failure: `{server_fail}`")
                 stats_lines.append(f"• Server Pass Rate: `{server_pass_rate:.1f}%`")
+                stats_lines.append(f"• Alternate Guesses: `{self.processing_stats['alternate_submissions']}` (accepted `{self.processing_stats['alternate_successes']}`)")
+                stats_lines.append(f"• Low-Confidence Refetches: `{self.processing_stats['low_confidence_refetches']}`")
+                stats_lines.append(f"• Shared Player Logins: `{self.player_logins.stats['coalesced']}`")
 
                 total_fids = self.processing_stats['total_fids_processed']
                 total_time = self.processing_stats['total_processing_time']
@@ -2413,6 +2693,39 @@ class GiftOperations(commands.Cog):
                     inline=False
                 )
 
+                if self.captcha_solver and self.captcha_solver.is_initialized:
+                    embed.add_field(
+                        name="⚙️ Solver Runtime",
+                        value=f"`{self.captcha_solver.get_session_summary()}`",
+                        inline=False
+                    )
+
+                    confidence_report = self.captcha_solver.get_confidence_report()
+                    if confidence_report and confidence_report[0]["samples"] > 0:
+                        threshold_lines = [f"Current threshold: `{self.captcha_solver.min_confidence:.2f}`"]
+                        for row in confidence_report:
+                            threshold_lines.append(
+                                f"• ≥ `{row['threshold']:.1f}`: accuracy `{row['accuracy'] * 100:.1f}%`, "
+                                f"yield `{row['yield'] * 100:.1f}%` ({row['samples']})"
+                            )
+                        embed.add_field(
+                            name="🎯 Confidence Thresholds (Submitted Answers)",
+                            value="\n".join(threshold_lines),
+                            inline=False
+                        )
+
+                dataset_summary = self.captcha_store.get_summary()
+                if dataset_summary["records"]:
+                    outcome_text = ", ".join(f"{name} `{count}`" for name, count in sorted(dataset_summary["outcomes"].items()))
+                    embed.add_field(
+                        name="🗄️ Saved Captcha Dataset",
+                        value=(
+                            f"`{dataset_summary['records']}` images in `{dataset_summary['shards']}` shard(s), "
+                            f"`{dataset_summary['bytes'] / (1024 * 1024):.1f} MB`\n{outcome_text}"
+                        ),
+                        inline=False
+                    )
+
                 embed.add_field(
                     name="⚠️ Important Note",
                     value="Saving images (especially 'All') can consume significant disk space over time.",
@@ -2477,19 +2790,21 @@ class GiftOperations(commands.Cog):
                 reinitialize_solver = True
                 message_suffix = f"Solver has been {'enabled' if target_enabled == 1 else 'disabled'}."
             
-            if save_images is not None and self.captcha_solver and self.captcha_solver.is_initialized:
+            if save_images is not None and self.captcha_solver:
                 self.captcha_solver.save_images_mode = target_save_images
                 self.logger.info(f"GiftOps: Updated live captcha_solver.save_images_mode to {target_save_images}")
                 if not reinitialize_solver:
                     message_suffix = "Image saving preference updated."
 
             if reinitialize_solver:
+                if self.captcha_solver:
+                    self.captcha_solver.close()
                 self.captcha_solver = None
                 if target_enabled == 1:
                     self.logger.info("GiftOps: OCR is being enabled/reinitialized...")
                     try:
-                        self.captcha_solver = GiftCaptchaSolver(save_images=target_save_images)
-                        if self.captcha_solver.is_initialized:
+                        self.captcha_solver = create_captcha_solver(save_images=target_save_images, lazy=True)
+                        if await self.captcha_solver.wait_until_ready():
                             self.logger.info("GiftOps: ONNX solver reinitialized successfully.")
                             message_suffix += " Solver reinitialized."
                         else:
@@ -2613,7 +2928,8 @@ class GiftOperations(commands.Cog):
 
                 self.logger.info(f"[validate_gift_codes] Validating code: {giftcode} (current DB status: {current_db_status})")
                 test_fid = self.get_test_fid()
-                status = await self.claim_giftcode_rewards_wos(test_fid, giftcode)
+                with request_consumer(CONSUMER_GIFT_VALIDATION):
+                    status = await self.claim_giftcode_rewards_wos(test_fid, giftcode)
 
                 if status in ["TIME_ERROR", "CDK_NOT_FOUND", "USAGE_LIMIT"]:
                     self.logger.info(f"[validate_gift_codes] Code {giftcode} found to be invalid with status: {status}. Updating DB.")
@@ -2664,7 +2980,8 @@ class GiftOperations(commands.Cog):
 
     async def handle_success(self, message, giftcode):
         test_fid = self.get_test_fid()
-        status = await self.claim_giftcode_rewards_wos(test_fid, giftcode)
+        with request_consumer(CONSUMER_GIFT_VALIDATION):
+            status = await self.claim_giftcode_rewards_wos(test_fid, giftcode)
         
         if status in ["SUCCESS", "RECEIVED", "SAME TYPE EXCHANGE"]:
             self.cursor.execute("SELECT 1 FROM gift_codes WHERE giftcode = ?", (giftcode,))
@@ -2691,7 +3008,8 @@ class GiftOperations(commands.Cog):
 
     async def handle_already_received(self, message, giftcode):
         test_fid = self.get_test_fid()
-        status = await self.claim_giftcode_rewards_wos(test_fid, giftcode)
+        with request_consumer(CONSUMER_GIFT_VALIDATION):
+            status = await self.claim_giftcode_rewards_wos(test_fid, giftcode)
         
         if status in ["SUCCESS", "RECEIVED", "SAME TYPE EXCHANGE"]:
             self.cursor.execute("SELECT 1 FROM gift_codes WHERE giftcode = ?", (giftcode,))
@@ -4512,7 +4830,8 @@ class GiftOperations(commands.Cog):
                             "OCR_DISABLED": "🚫 **{count}** members failed since OCR is disabled. Try turning it on first!",
                             "SIGN_ERROR": "🔐 **{count}** members failed due to a signature error. Something went wrong.",
                             "ERROR": "❌ **{count}** members failed due to a general error. Might want to check the logs.",
-                            "UNKNOWN_API_RESPONSE": "❓ **{count}** members failed with an unknown API response. Say what?"
+                            "UNKNOWN_API_RESPONSE": "❓ **{count}** members failed with an unknown API response. Say what?",
+                            "CIRCUIT_OPEN": "🔌 **{count}** members were skipped because the gift code API kept failing."
                         }
                         
                         base_description += "\n**Error Breakdown:**\n"
@@ -4569,7 +4888,8 @@ class GiftOperations(commands.Cog):
                 response_status = "ERROR"
                 try:
                     await asyncio.sleep(random.uniform(MEMBER_PROCESS_DELAY * 0.7, MEMBER_PROCESS_DELAY * 1.3))
-                    response_status = await self.claim_giftcode_rewards_wos(fid, giftcode)
+                    with request_consumer(CONSUMER_GIFT_REDEMPTION):
+                        response_status = await self.claim_giftcode_rewards_wos(fid, giftcode)
                 except Exception as claim_err:
                     self.logger.exception(f"GiftOps: Unexpected error during claim for {fid}: {claim_err}")
                     response_status = "ERROR"
@@ -4701,6 +5021,14 @@ class GiftOperations(commands.Cog):
                     self.logger.info(f"GiftOps: ID {fid} hit CAPTCHA_TOO_FREQUENT. Queuing for retry in {retry_delay:.1f}s.")
                     if current_cycle_count + 1 >= MAX_RETRY_CYCLES:
                         error_summary["CAPTCHA_TOO_FREQUENT"] = error_summary.get("CAPTCHA_TOO_FREQUENT", 0) + 1
+                elif response_status == "CIRCUIT_OPEN":
+                    # The gift API is failing; wait out the breaker's cool-off instead of burning attempts
+                    queue_for_retry = True
+                    retry_delay = max(API_RATE_LIMIT_COOLDOWN, self._gift_api_retry_after())
+                    fail_reason = "Gift API unavailable (circuit open)"
+                    self.logger.info(f"GiftOps: ID {fid} hit an open circuit. Queuing for retry in {retry_delay:.1f}s.")
+                    if current_cycle_count + 1 >= MAX_RETRY_CYCLES:
+                        error_summary["CIRCUIT_OPEN"] = error_summary.get("CIRCUIT_OPEN", 0) + 1
                 elif response_status in ["CAPTCHA_INVALID", "MAX_CAPTCHA_ATTEMPTS_REACHED", "OCR_FAILED_ATTEMPT"]:
                     if current_cycle_count + 1 < MAX_RETRY_CYCLES:
                         queue_for_retry = True
@@ -5778,6 +6106,10 @@ class OCRSettingsView(discord.ui.View):
         if not self.onnx_available:
             await interaction.response.send_message("❌ Required library (onnxruntime) is not installed or failed to load.", ephemeral=True)
             return
+        if self.cog.captcha_solver and self.cog.captcha_solver.load_state in ("pending", "loading"):
+            self.cog.captcha_solver.start_background_load()
+            await interaction.response.send_message("⏳ CAPTCHA model is still loading in the background. Please try again in a few seconds.", ephemeral=True)
+            return
         if not self.cog.captcha_solver or not self.cog.captcha_solver.is_initialized:
             await interaction.response.send_message("❌ CAPTCHA solver is not initialized. Ensure OCR is enabled.", ephemeral=True)
             return
@@ -5791,6 +6123,7 @@ class OCRSettingsView(discord.ui.View):
         await interaction.response.defer(ephemeral=True)
         logger.info(f"[Test Button] User {user_id} triggered test.")
         self.cog.test_captcha_cooldowns[user_id] = current_time
+        self.cog._save_captcha_cooldowns()
 
         captcha_image_base64 = None
         image_bytes = None
@@ -5885,40 +6218,17 @@ class OCRSettingsView(discord.ui.View):
 
                 if should_save_img and image_bytes:
                     logger.info(f"[Test Button] Attempting to save image based on mode {current_save_mode}. Status success={success}, tag='{save_tag}'")
-                    captcha_dir = self.cog.captcha_solver.captcha_dir
-                    safe_tag = re.sub(r'[\\/*?:"<>|]', '_', save_tag)
-                    timestamp = int(time.time())
-
-                    if success:
-                         base_filename = f"{safe_tag}.png"
-                    else:
-                         base_filename = f"FAIL_{safe_tag}_{timestamp}.png"
-
-                    test_path = os.path.join(captcha_dir, base_filename)
-
-                    counter = 1
-                    orig_path = test_path
-                    while os.path.exists(test_path) and counter <= 100:
-                        name, ext = os.path.splitext(orig_path)
-                        test_path = f"{name}_{counter}{ext}"
-                        counter += 1
-
-                    if counter > 100:
-                        save_error_str = f"Could not find unique filename for {base_filename} after 100 tries."
-                        logger.warning(f"[Test Button] {save_error_str}")
-                    else:
-                        os.makedirs(captcha_dir, exist_ok=True)
-                        with open(test_path, "wb") as f:
-                            f.write(image_bytes)
-                        save_path_str = os.path.basename(test_path)
-                        logger.info(f"[Test Button] Saved test captcha image to {test_path}")
+                    outcome = OUTCOME_UNVERIFIED if success else OUTCOME_FAILED
+                    record_id = self.cog.captcha_store.append(image_bytes, captcha_code if success else None, outcome, method="test")
+                    save_path_str = f"record {record_id} ({outcome})"
+                    logger.info(f"[Test Button] Stored test captcha image as {save_path_str}")
 
             except Exception as img_save_err:
                 logger.exception(f"[Test Button] Error saving test image: {img_save_err}")
                 save_error_str = f"Error during saving: {img_save_err}"
 
             if save_path_str:
-                embed.add_field(name="📸 Captcha Image Saved", value=f"`{save_path_str}` in `{os.path.relpath(self.cog.captcha_solver.captcha_dir)}`", inline=False)
+                embed.add_field(name="📸 Captcha Image Saved", value=f"`{save_path_str}` in `{os.path.relpath(self.cog.captcha_store.root)}`", inline=False)
             elif save_error_str:
                 embed.add_field(name="⚠️ Image Save Error", value=save_error_str, inline=False)
 
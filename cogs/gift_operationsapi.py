@@ -10,6 +10,8 @@ import hashlib
 from datetime import datetime
 import discord
 import logging
+from .circuit_breaker import get_circuit_breaker
+from .request_governor import CONSUMER_GIFT_CODE_SYNC, POOL_GIFT_CODE_API, get_request_pool
 from wos_config import (
     get_admin_channel_id,
     get_gift_api_key,
@@ -33,9 +35,11 @@ class GiftCodeAPI:
         self.max_check_interval = 600
         self.check_interval = random.randint(self.min_check_interval, self.max_check_interval)
         
-        # Rate limiting controls
-        self.last_api_call = 0
+        # Rate limiting controls: one request per interval, through the process-wide request governor
         self.min_api_call_interval = 3
+        self.request_pool = get_request_pool(
+            POOL_GIFT_CODE_API, limit=1, window=self.min_api_call_interval
+        )
         self.error_backoff_time = 30
         self.cloudflare_backoff_time = 15
         self.max_backoff_time = 300
@@ -147,15 +151,9 @@ class GiftCodeAPI:
     
     async def _wait_for_rate_limit(self):
         """Enforce rate limiting between API calls."""
-        now = datetime.now().timestamp()
-        time_since_last_call = now - self.last_api_call
-        
-        if time_since_last_call < self.min_api_call_interval:
-            sleep_time = self.min_api_call_interval - time_since_last_call
-            sleep_time += random.uniform(0, 0.5)
-            await asyncio.sleep(sleep_time)
-            
-        self.last_api_call = datetime.now().timestamp()
+        waited = await self.request_pool.acquire(CONSUMER_GIFT_CODE_SYNC)
+        if waited > 0:
+            await asyncio.sleep(random.uniform(0, 0.5))
     
     async def _handle_api_error(self, response, response_text):
         """Handle API errors with appropriate backoff strategies."""
@@ -164,6 +162,7 @@ class GiftCodeAPI:
             backoff = max(self.cloudflare_backoff_time, self.current_backoff)
             backoff *= random.uniform(1.0, 1.5)
             self.current_backoff = min(self.current_backoff * 2, self.max_backoff_time)
+            self.request_pool.report_throttled(backoff)  # Other calls to the API wait out the same backoff
             return backoff
         elif response.status in [502, 503, 504]: # Server errors - back off with increasing delay
             self.logger.warning(f"Server error: {response.status}")
@@ -182,15 +181,28 @@ class GiftCodeAPI:
             self.cursor.execute("SELECT giftcode, date, validation_status FROM gift_codes")
             db_codes = {row[0]: (row[1], row[2]) for row in self.cursor.fetchall()}
             
+            breaker = get_circuit_breaker("gift_code_api", log=self.logger.warning)
+            if not breaker.allow_request():
+                self.last_sync_error = f"Circuit open, retry in {breaker.retry_after():.0f}s"
+                self.logger.info(f"Skipping API synchronization: {self.last_sync_error}")
+                return False
+
             connector = aiohttp.TCPConnector(ssl=self.ssl_context)
             async with aiohttp.ClientSession(connector=connector) as session:
                 headers = self._build_headers()
                 
                 await self._wait_for_rate_limit()
                 
+                outcome_recorded = False
+                started = time.monotonic()
                 try:
                     async with session.get(self.api_url, headers=headers) as response:
                         response_text = await response.text()
+                        if response.status >= 500:
+                            breaker.record_failure(time.monotonic() - started, f"HTTP {response.status}")
+                        else:
+                            breaker.record_success(time.monotonic() - started)
+                        outcome_recorded = True
                         
                         if response.status != 200:
                             self.last_sync_error = f"HTTP {response.status}"
@@ -542,8 +554,10 @@ class GiftCodeAPI:
                             self.logger.exception(f"JSON decode error: {e}, Response: {response_text[:200]}")
                             return False
                             
-                except aiohttp.ClientError as e:
-                    self.last_sync_error = f"HTTP error: {e}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if not outcome_recorded:
+                        breaker.record_failure(time.monotonic() - started, str(e) or type(e).__name__)
+                    self.last_sync_error = f"HTTP error: {str(e) or type(e).__name__}"
                     self.logger.exception(f"HTTP request error: {e}")
                     return False
             
@@ -4,17 +4,13 @@ import sqlite3
 from datetime import datetime, timedelta
 import os
 import asyncio
-import time
-import hashlib
-import aiohttp
 from discord.ext import tasks
-from wos_config import get_ssl_context, get_wos_secret
-
-SECRET = get_wos_secret()
+from .login_handler import LoginHandler
 
 class IDChannel(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.login_handler = LoginHandler()
         self.setup_database()
         self.log_directory = 'log'
         if not os.path.exists(self.log_directory):
@@ -198,108 +194,100 @@ class IDChannel(commands.Cog):
 
             for attempt in range(max_retries):
                 try:
-                    current_time = int(time.time() * 1000)
-                    form = f"fid={fid}&time={current_time}"
-                    sign = hashlib.md5((form + SECRET).encode('utf-8')).hexdigest()
-                    form = f"sign={sign}&{form}"
-                    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-
-                    ssl_context = get_ssl_context()
-
-                    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=ssl_context)) as session:
-                        async with session.post('https://wos-giftcode-api.centurygame.com/api/player', headers=headers, data=form) as response:
-                            if response.status == 429:
-                                if attempt < max_retries - 1:
-                                    warning_embed = discord.Embed(
-                                        title="⚠️ API Rate Limit Reached",
-                                        description=(
-                                            f"Operation is on hold due to API rate limit.\n"
-                                            f"**Remaining Attempts:** `{max_retries - attempt - 1}`\n"
-                                            f"**Wait Time:** `60 seconds`\n\n"
-                                            f"Operation will continue automatically, please wait..."
-                                        ),
-                                        color=discord.Color.orange()
-                                    )
-                                    await message.reply(embed=warning_embed)
-                                    await asyncio.sleep(retry_delay)
-                                    continue
-                                else:
-                                    await message.add_reaction('❌')
-                                    await message.reply("Operation failed due to API rate limit. Please try again later.", delete_after=10)
-                                    return
-
-                            if response.status == 200:
-                                data = await response.json()
-
-                                if data.get('data'):
-                                    nickname = data['data'].get('nickname')
-                                    furnace_lv = data['data'].get('stove_lv', 0)
-                                    stove_lv_content = data['data'].get('stove_lv_content', None)
-                                    kid = data['data'].get('kid', None)
-                                    avatar_image = data['data'].get('avatar_image', None)
-
-                                    try:
-                                        with sqlite3.connect('db/users.sqlite') as users_db:
-                                            cursor = users_db.cursor()
-                                            cursor.execute("SELECT alliance FROM users WHERE fid = ?", (fid,))
-                                            if cursor.fetchone():
-                                                await message.add_reaction('⚠️')
-                                                await message.reply(f"This ID ({fid}) was added by another process!", delete_after=10)
-                                                return
-                                                
-                                            cursor.execute("""
-                                                INSERT INTO users (fid, nickname, furnace_lv, kid, stove_lv_content, alliance)
-                                                VALUES (?, ?, ?, ?, ?, ?)
-                                            """, (fid, nickname, furnace_lv, kid, stove_lv_content, alliance_id))
-                                            users_db.commit()
-                                    except sqlite3.IntegrityError:
+                    result = await self.login_handler.fetch_player_data(fid, max_age=300)
+                    if result['status'] == 'rate_limited':
+                        if attempt < max_retries - 1:
+                            wait_time = max(5.0, result.get('wait_time', retry_delay))
+                            warning_embed = discord.Embed(
+                                title="⚠️ API Rate Limit Reached",
+                                description=(
+                                    f"Operation is on hold due to API rate limit.\n"
+                                    f"**Remaining Attempts:** `{max_retries - attempt - 1}`\n"
+                                    f"**Wait Time:** `{wait_time:.0f} seconds`\n\n"
+                                    f"Operation will continue automatically, please wait..."
+                                ),
+                                color=discord.Color.orange()
+                            )
+                            await message.reply(embed=warning_embed)
+                            await asyncio.sleep(wait_time)
+                            continue
+                        else:
+                            await message.add_reaction('❌')
+                            await message.reply("Operation failed due to API rate limit. Please try again later.", delete_after=10)
+                            return
+
+                    if result['status'] in ('success', 'not_found'):
+                        data = {'data': result['data']}
+
+                        if data.get('data'):
+                            nickname = data['data'].get('nickname')
+                            furnace_lv = data['data'].get('stove_lv', 0)
+                            stove_lv_content = data['data'].get('stove_lv_content', None)
+                            kid = data['data'].get('kid', None)
+                            avatar_image = data['data'].get('avatar_image', None)
+
+                            try:
+                                with sqlite3.connect('db/users.sqlite') as users_db:
+                                    cursor = users_db.cursor()
+                                    cursor.execute("SELECT alliance FROM users WHERE fid = ?", (fid,))
+                                    if cursor.fetchone():
                                         await message.add_reaction('⚠️')
                                         await message.reply(f"This ID ({fid}) was added by another process!", delete_after=10)
                                         return
+                                        
+                                    cursor.execute("""
+                                        INSERT INTO users (fid, nickname, furnace_lv, kid, stove_lv_content, alliance)
+                                        VALUES (?, ?, ?, ?, ?, ?)
+                                    """, (fid, nickname, furnace_lv, kid, stove_lv_content, alliance_id))
+                                    users_db.commit()
+                            except sqlite3.IntegrityError:
+                                await message.add_reaction('⚠️')
+                                await message.reply(f"This ID ({fid}) was added by another process!", delete_after=10)
+                                return
+
+                            await message.add_reaction('✅')
+
+                            if furnace_lv > 30:
+                                furnace_level_name = self.level_mapping.get(furnace_lv, f"Level {furnace_lv}")
+                            else:
+                                furnace_level_name = f"Level {furnace_lv}"
+
+                            success_embed = discord.Embed(
+                                title=f"✅ Member Successfully Added",
+                                description=(
+                                    "━━━━━━━━━━━━━━━━━━━━━━\n"
+                                    f"**👤 Name:** `{nickname}`\n"
+                                    f"**🆔 ID:** `{fid}`\n"
+                                    f"**🔥 Furnace Level:** `{furnace_level_name}`\n"
+                                    f"**🌍 State:** `{kid}`\n"
+                                    "━━━━━━━━━━━━━━━━━━━━━━"
+                                ),
+                                color=discord.Color.green()
+                            )
 
-                                    await message.add_reaction('✅')
-
-                                    if furnace_lv > 30:
-                                        furnace_level_name = self.level_mapping.get(furnace_lv, f"Level {furnace_lv}")
-                                    else:
-                                        furnace_level_name = f"Level {furnace_lv}"
-
-                                    success_embed = discord.Embed(
-                                        title=f"✅ Member Successfully Added",
-                                        description=(
-                                            "━━━━━━━━━━━━━━━━━━━━━━\n"
-                                            f"**👤 Name:** `{nickname}`\n"
-                                            f"**🆔 ID:** `{fid}`\n"
-                                            f"**🔥 Furnace Level:** `{furnace_level_name}`\n"
-                                            f"**🌍 State:** `{kid}`\n"
-                                            "━━━━━━━━━━━━━━━━━━━━━━"
-                                        ),
-                                        color=discord.Color.green()
-                                    )
-
-                                    if avatar_image:
-                                        success_embed.set_image(url=avatar_image)
-                                    if isinstance(stove_lv_content, str) and stove_lv_content.startswith("http"):
-                                        success_embed.set_thumbnail(url=stove_lv_content)
-
-                                    await message.reply(embed=success_embed)
-
-                                    await self.log_action(
-                                        "ADD_MEMBER",
-                                        message.author.id,
-                                        message.guild.id,
-                                        {
-                                            "fid": fid,
-                                            "nickname": nickname,
-                                            "alliance_id": alliance_id,
-                                            "furnace_level": furnace_level_name
-                                        }
-                                    )
-                                    return
-                                else:
-                                    await message.add_reaction('❌')
-                                    await message.reply("No player found for this ID!", delete_after=10)
-                                    return
+                            if avatar_image:
+                                success_embed.set_image(url=avatar_image)
+                            if isinstance(stove_lv_content, str) and stove_lv_content.startswith("http"):
+                                success_embed.set_thumbnail(url=stove_lv_content)
+
+                            await message.reply(embed=success_embed)
+
+                            await self.log_action(
+                                "ADD_MEMBER",
+                                message.author.id,
+                                message.guild.id,
+                                {
+                                    "fid": fid,
+                                    "nickname": nickname,
+                                    "alliance_id": alliance_id,
+                                    "furnace_level": furnace_level_name
+                                }
+                            )
+                            return
+                        else:
+                            await message.add_reaction('❌')
+                            await message.reply("No player found for this ID!", delete_after=10)
+                            return
 
                 except Exception as e:
                     if attempt < max_retries - 1:
@@ -1,16 +1,163 @@
 import aiohttp
 import asyncio
+import atexit
+import contextvars
 import hashlib
+import heapq
+import itertools
+import logging
+import logging.handlers
+import queue
+import threading
 import time
 import os
-from datetime import datetime
-from typing import Optional, List, Dict, Callable
-from wos_config import get_ssl_context, get_wos_secret
+from typing import Optional, List, Dict, Callable, Tuple
+from urllib.parse import urlparse
+from wos_config import get_login_api_urls, get_login_log_level, get_max_concurrent_operations, get_ssl_context, get_wos_secret
+from .player_cache import PlayerProfileCache
+from .runtime_state import load_state, save_state
+from .circuit_breaker import get_circuit_breaker
+from .request_governor import (
+    CONSUMER_INTERACTIVE,
+    CONSUMER_ROSTER_CHECK,
+    POOL_LOGIN_API,
+    SlidingWindowLimiter,
+    get_request_pool,
+    parse_retry_after,
+    request_consumer,
+)
+
+
+# Operation priority classes for the LoginHandler queue (lower runs first)
+PRIORITY_INTERACTIVE = 0  # A user is waiting on the result (e.g. adding members)
+PRIORITY_MANUAL = 1       # Admin-triggered sweeps
+PRIORITY_SCHEDULED = 2    # Periodic background checks
+
+DEFAULT_OPERATION_PRIORITIES = {
+    'member_addition': PRIORITY_INTERACTIVE,
+}
+
+# Request budget consumer that queued operations of each type draw from
+OPERATION_CONSUMERS = {
+    'alliance_control': CONSUMER_ROSTER_CHECK,
+    'member_addition': CONSUMER_INTERACTIVE,
+}
+
+# The queued operation the current task is running (queue operations run as separate tasks)
+_current_operation = contextvars.ContextVar('current_operation', default=None)
+
+
+class _BatchRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotating file handler that defers flushing while a batch is being written"""
+    
+    batching = False
+    
+    def flush(self):
+        if not self.batching:
+            super().flush()
+
+
+class BufferedLogWriter:
+    """
+    Non-blocking log sink. Logging only enqueues the record; a daemon thread writes queued
+    records to a rotating file in batches and flushes once per batch.
+    """
+    
+    def __init__(self, name: str, path: str, level: int = logging.INFO, max_bytes: int = 3 * 1024 * 1024,
+                 backup_count: int = 3, flush_interval: float = 1.0, batch_size: int = 500):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+        self.stats = {'records': 0, 'batches': 0}
+        
+        self.handler = _BatchRotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s %(message)s', '%Y-%m-%d %H:%M:%S'))
+        
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(level)
+        self.logger.propagate = False
+        if self.logger.hasHandlers():
+            self.logger.handlers.clear()
+        self.logger.addHandler(logging.handlers.QueueHandler(self.queue))
+        
+        self._stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"{name}-log-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+    
+    def _run(self):
+        while not (self._stopped.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+    
+    def _write_batch(self, batch: List[logging.LogRecord]):
+        self.handler.batching = True
+        try:
+            for record in batch:
+                self.handler.handle(record)
+        finally:
+            self.handler.batching = False
+            self.handler.flush()
+        self.stats['records'] += len(batch)
+        self.stats['batches'] += 1
+    
+    def log(self, level: int, message: str):
+        self.logger.log(level, message)
+    
+    def close(self):
+        """Write out everything still queued and stop the writer thread"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self.thread.join(timeout=5)
+        self.handler.close()
+
+
+class SingleFlight:
+    """
+    Concurrent calls for the same key share one in-flight call and its result.
+    The shared call is shielded, so a cancelled caller does not cancel it for the others.
+    """
+    
+    def __init__(self):
+        self.calls: Dict[object, asyncio.Future] = {}
+        self.stats = {'calls': 0, 'coalesced': 0}
+    
+    async def run(self, key, coroutine_factory: Callable):
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coroutine_factory())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.stats['calls'] += 1
+        else:
+            self.stats['coalesced'] += 1
+        return await asyncio.shield(task)
+    
+    def _forget(self, key, task: asyncio.Future):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved in case every caller was cancelled
+    
+    def get_stats(self) -> Dict[str, int]:
+        stats = dict(self.stats)
+        stats['in_flight'] = len(self.calls)
+        return stats
+
 
 class LoginHandler:
     """
     Centralized handler for player login/check operations.
-    Manages dual-API support and rate limiting for player data fetching.
+    Manages multi-API support and rate limiting for player data fetching.
     Note: This does NOT handle gift code operations which have separate rate limits.
     """
     
@@ -27,17 +174,34 @@ class LoginHandler:
         if self._initialized:
             return
             
-        # API Configuration for login/player check
-        self.api1_url = 'https://wos-giftcode-api.centurygame.com/api/player'
-        self.api2_url = 'https://gof-report-api-formal.centurygame.com/api/player'
+        # API Configuration for login/player check (API numbers are 1-based positions in this list)
+        self.api_urls = get_login_api_urls()
         self.secret = get_wos_secret()
         
-        # Rate limiting for login operations
-        self.api1_requests = []  # Timestamps of API1 requests
-        self.api2_requests = []  # Timestamps of API2 requests
+        # Rate limiting for login operations, one limiter per API
         self.rate_limit_per_api = 30
         self.rate_limit_window = 60  # seconds
+        self.api_limiters = {
+            api_num: SlidingWindowLimiter(self.rate_limit_per_api, self.rate_limit_window)
+            for api_num in range(1, len(self.api_urls) + 1)
+        }
         self.last_api_used = 1
+        # Share of the process-wide login API budget: member checks, minister lookups and
+        # interactive lookups draw from it by consumer (see request_governor)
+        self.request_pool = get_request_pool(
+            POOL_LOGIN_API, limit=self.rate_limit_per_api * len(self.api_urls), window=self.rate_limit_window
+        )
+        
+        # Per-API circuit breakers: fail fast while an API is erroring or timing out
+        self.request_timeout = aiohttp.ClientTimeout(total=15)
+        self.api_breakers = {
+            api_num: get_circuit_breaker(f"login_api{api_num}", log=lambda message: self.log_message(message, logging.WARNING))
+            for api_num in self.api_limiters
+        }
+        
+        # Batch fetching: concurrent requests per available API, and retries after a rate-limit wait
+        self.batch_concurrency_per_api = 2
+        self.batch_rate_limit_retries = 3
         
         # API availability
         self.dual_api_mode = False
@@ -47,11 +211,18 @@ class LoginHandler:
         # Alliance operation locks to prevent conflicts
         self.alliance_locks = {}
         
-        # Centralized operation queue
-        self.operation_queue = asyncio.Queue()
+        # Centralized operation queue: a heap ordered by priority class, aged by waiting time
+        self.pending_operations = []
+        self.operation_sequence = itertools.count()
+        self.queue_event = asyncio.Event()
         self.operation_lock = asyncio.Lock()
-        self.current_operation = None
+        self.running_operations = {}  # alliance ID (None for operations without one) -> operation
+        self.operation_tasks = set()
+        self.max_concurrent_operations = get_max_concurrent_operations()
         self.queue_processor_task = None
+        self.queue_aging_seconds = 300  # Waiting this long promotes an operation by one priority class
+        self.operation_durations = {}  # type -> moving average run time in seconds
+        self.queue_stats = {'completed': 0, 'preemptions': 0}
 
         # Discord backoff to handle Cloudflare rate limits
         backoff_minutes = int(os.getenv("WOS_DISCORD_BACKOFF_MINUTES", "20"))
@@ -61,11 +232,31 @@ class LoginHandler:
         # SSL context (reusable)
         self.ssl_context = self._create_ssl_context()
         
+        # Persistent HTTP sessions, one per (API host, proxy), with keep-alive and DNS caching
+        self.http_sessions: Dict[Tuple[str, Optional[str]], aiohttp.ClientSession] = {}
+        self.session_stats = {
+            'sessions_created': 0,
+            'requests': 0,
+            'connections_created': 0,
+            'connections_reused': 0
+        }
+        
+        # Shared player profile cache; callers pass max_age to accept a cached profile
+        self.player_cache = PlayerProfileCache()
+        # Concurrent fetches of one player share a single upstream request
+        self.player_fetches = SingleFlight()
+        
         # Logging
         self.log_directory = 'log'
         if not os.path.exists(self.log_directory):
             os.makedirs(self.log_directory)
         self.log_file = os.path.join(self.log_directory, 'login_handler.txt')
+        self.log_writer = BufferedLogWriter('login_handler', self.log_file, level=get_login_log_level())
+        
+        # Limiter windows and the Discord backoff survive restarts so startup does not burst
+        self.state_snapshot_interval = 30  # seconds
+        self.state_snapshot_task = None
+        self.restore_rate_limit_state()
         
         # Mark as initialized
         self._initialized = True
@@ -74,13 +265,71 @@ class LoginHandler:
         """Create reusable SSL context"""
         return get_ssl_context()
     
-    def log_message(self, message: str):
-        """Log a message with timestamp"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_entry = f"[{timestamp}] {message}\n"
+    def _create_trace_config(self) -> aiohttp.TraceConfig:
+        """Count new vs. reused connections for get_session_stats()"""
+        async def on_request_start(session, context, params):
+            self.session_stats['requests'] += 1
+        
+        async def on_connection_create_end(session, context, params):
+            self.session_stats['connections_created'] += 1
+        
+        async def on_connection_reuseconn(session, context, params):
+            self.session_stats['connections_reused'] += 1
+        
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+    
+    def _get_session(self, api_url: str, proxy: Optional[str] = None) -> aiohttp.ClientSession:
+        """Get the shared session for an API endpoint and proxy, creating it on first use"""
+        key = (urlparse(api_url).netloc, proxy)
+        session = self.http_sessions.get(key)
+        if session is not None and not session.closed:
+            return session
+        
+        connector_options = {
+            'ssl': self.ssl_context,
+            'limit': 20,
+            'ttl_dns_cache': 300,
+            'keepalive_timeout': 60
+        }
+        if proxy:
+            from aiohttp_socks import ProxyConnector
+            connector = ProxyConnector.from_url(proxy, **connector_options)
+        else:
+            connector = aiohttp.TCPConnector(**connector_options)
         
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
+        session = aiohttp.ClientSession(connector=connector, timeout=self.request_timeout, trace_configs=[self._create_trace_config()])
+        self.http_sessions[key] = session
+        self.session_stats['sessions_created'] += 1
+        self.log_message(f"Created HTTP session for {key[0]}" + (f" via proxy {proxy}" if proxy else ""), logging.DEBUG)
+        return session
+    
+    async def close(self):
+        """Close all shared HTTP sessions (they are recreated on next use) and persist cached state"""
+        self.player_cache.flush()
+        self.snapshot_rate_limit_state()
+        sessions = list(self.http_sessions.values())
+        self.http_sessions.clear()
+        for session in sessions:
+            if not session.closed:
+                await session.close()
+        if sessions:
+            self.log_message(f"Closed {len(sessions)} HTTP session(s). {self.get_session_stats()}")
+    
+    def get_session_stats(self) -> Dict[str, float]:
+        """Get HTTP session reuse metrics"""
+        stats = dict(self.session_stats)
+        connections = stats['connections_created'] + stats['connections_reused']
+        stats['open_sessions'] = sum(1 for session in self.http_sessions.values() if not session.closed)
+        stats['connection_reuse_rate'] = stats['connections_reused'] / connections if connections else 0.0
+        return stats
+    
+    def log_message(self, message: str, level: int = logging.INFO):
+        """Log a message with timestamp (queued; written in batches by a background thread)"""
+        self.log_writer.log(level, message)
 
     def _is_discord_cloudflare_block(self, error_text: str) -> bool:
         text = (error_text or "").lower()
@@ -92,8 +341,10 @@ class LoginHandler:
         now = time.time()
         self.discord_block_until = max(self.discord_block_until, now + self.discord_backoff_seconds)
         self.log_message(
-            f"Discord backoff activated for {self.discord_backoff_seconds:.0f}s due to: {reason}"
+            f"Discord backoff activated for {self.discord_backoff_seconds:.0f}s due to: {reason}",
+            logging.WARNING
         )
+        self.snapshot_rate_limit_state()
     
     def get_alliance_lock(self, alliance_id: str) -> asyncio.Lock:
         """Get or create alliance-specific lock"""
@@ -104,19 +355,13 @@ class LoginHandler:
     async def check_apis_availability(self, test_fid: str = "46765089") -> Dict[str, bool]:
         """
         Check which login APIs are available
-        Returns: dict with api1_available, api2_available
+        Returns: dict with api{n}_available and api{n}_url for every configured API
         """
-        api_status = {
-            "api1_available": False,
-            "api2_available": False,
-            "api1_url": self.api1_url,
-            "api2_url": self.api2_url
-        }
-        
-        connector = aiohttp.TCPConnector(ssl=self.ssl_context)
+        api_status = {}
+        available_apis = []
         
-        async with aiohttp.ClientSession(connector=connector) as session:
-            # Test API 1
+        for api_num, api_url in enumerate(self.api_urls, start=1):
+            api_status[f"api{api_num}_url"] = api_url
             try:
                 current_time = int(time.time() * 1000)
                 form = f"fid={test_fid}&time={current_time}"
@@ -124,114 +369,79 @@ class LoginHandler:
                 form = f"sign={sign}&{form}"
                 headers = {'Content-Type': 'application/x-www-form-urlencoded'}
                 
-                async with session.post(self.api1_url, headers=headers, data=form, timeout=5) as response:
+                async with self._get_session(api_url).post(api_url, headers=headers, data=form, timeout=5) as response:
                     # API is available if we get 200 (success) or 429 (rate limit)
-                    api_status["api1_available"] = response.status in [200, 429]
-                    self.log_message(f"API1 availability check: Status {response.status}")
+                    api_status[f"api{api_num}_available"] = response.status in [200, 429]
+                    self.log_message(f"API{api_num} availability check: Status {response.status}")
             except Exception as e:
-                self.log_message(f"API1 availability check failed: {str(e)}")
-                api_status["api1_available"] = False
+                self.log_message(f"API{api_num} availability check failed: {str(e)}", logging.WARNING)
+                api_status[f"api{api_num}_available"] = False
             
-            # Test API 2
-            try:
-                current_time = int(time.time() * 1000)
-                form = f"fid={test_fid}&time={current_time}"
-                sign = hashlib.md5((form + self.secret).encode('utf-8')).hexdigest()
-                form = f"sign={sign}&{form}"
-                headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-                
-                async with session.post(self.api2_url, headers=headers, data=form, timeout=5) as response:
-                    api_status["api2_available"] = response.status in [200, 429]
-                    self.log_message(f"API2 availability check: Status {response.status}")
-            except Exception as e:
-                self.log_message(f"API2 availability check failed: {str(e)}")
-                api_status["api2_available"] = False
-        
-        # Update configuration based on availability
-        if api_status["api1_available"] and api_status["api2_available"]:
-            self.dual_api_mode = True
-            self.available_apis = [1, 2]
-            self.request_delay = 1.0  # 1 second delay for dual mode
-        elif api_status["api1_available"]:
-            self.dual_api_mode = False
-            self.available_apis = [1]
-            self.request_delay = 2.0  # 2 seconds for single API
-        elif api_status["api2_available"]:
-            self.dual_api_mode = False
-            self.available_apis = [2]
-            self.request_delay = 2.0
-        else:
-            self.available_apis = []
+            if api_status[f"api{api_num}_available"]:
+                available_apis.append(api_num)
+        
+        # Update configuration based on availability: each API adds one request per 2 seconds
+        self.available_apis = available_apis
+        self.dual_api_mode = len(available_apis) > 1
+        self.request_pool.set_limit(self.rate_limit_per_api * max(1, len(available_apis)))
+        if available_apis:
+            self.request_delay = 2.0 / len(available_apis)
         
         return api_status
     
-    def _get_available_api(self) -> Optional[int]:
+    def _get_available_api(self):
         """
         Determine which API to use based on rate limits
-        Returns: API number (1 or 2) or None if both at limit
+        Returns: API number with the most remaining capacity, or (None, wait_time) if all are at limit
         """
         now = time.time()
+        candidates = [api_num for api_num in (self.available_apis or [1]) if self.api_breakers[api_num].is_available()]
         
-        # Clean old requests outside the rate limit window
-        self.api1_requests = [t for t in self.api1_requests if now - t < self.rate_limit_window]
-        self.api2_requests = [t for t in self.api2_requests if now - t < self.rate_limit_window]
+        best_api = None
+        best_remaining = 0
+        for api_num in candidates:
+            remaining = self.api_limiters[api_num].remaining(now)
+            # Prefer more capacity; on a tie, rotate away from the last API used
+            if remaining > best_remaining or (remaining == best_remaining and remaining > 0 and best_api == self.last_api_used):
+                best_api = api_num
+                best_remaining = remaining
         
-        if not self.dual_api_mode:
-            # Single API mode
-            api_num = self.available_apis[0] if self.available_apis else 1
-            requests = self.api1_requests if api_num == 1 else self.api2_requests
-            
-            if len(requests) < self.rate_limit_per_api:
-                return api_num
-            else:
-                # Calculate wait time until oldest request expires
-                wait_time = self.rate_limit_window - (now - requests[0]) if requests else 0
-                return None, max(0, wait_time)
-        else:
-            # Dual API mode - intelligent switching
-            api1_available = 1 in self.available_apis and len(self.api1_requests) < self.rate_limit_per_api
-            api2_available = 2 in self.available_apis and len(self.api2_requests) < self.rate_limit_per_api
-            
-            if api1_available and api2_available:
-                # Both available - alternate or use the one with more capacity
-                if self.last_api_used == 1:
-                    return 2
-                else:
-                    return 1
-            elif api1_available:
-                return 1
-            elif api2_available:
-                return 2
-            else:
-                # Both at limit - calculate minimum wait time
-                wait_time1 = self.rate_limit_window - (now - self.api1_requests[0]) if self.api1_requests else 0
-                wait_time2 = self.rate_limit_window - (now - self.api2_requests[0]) if self.api2_requests else 0
-                min_wait = min(wait_time1, wait_time2)
-                return None, max(0, min_wait)
+        if best_api is not None:
+            return best_api
+        return None, self._get_wait_time(now)
     
     def _record_api_request(self, api_num: int):
         """Record timestamp of API request"""
-        now = time.time()
-        if api_num == 1:
-            self.api1_requests.append(now)
-        else:
-            self.api2_requests.append(now)
+        self.api_limiters[api_num].record()
         self.last_api_used = api_num
     
-    def _get_wait_time(self) -> float:
-        """Calculate wait time when both APIs are at limit"""
-        now = time.time()
-        wait_time1 = self.rate_limit_window - (now - self.api1_requests[0]) if self.api1_requests else 0
-        wait_time2 = self.rate_limit_window - (now - self.api2_requests[0]) if self.api2_requests else 0
-        return max(0, min(wait_time1, wait_time2))
+    def _get_wait_time(self, now: Optional[float] = None) -> float:
+        """Calculate wait time until any available API has a free slot"""
+        now = now or time.time()
+        candidates = self.available_apis or [1]
+        return min(self.api_limiters[api_num].wait_time(now) for api_num in candidates)
+    
+    def get_wait_time(self, consumer: Optional[str] = None) -> float:
+        """Seconds until the consumer's next login request could go out (API limits and its budget share)"""
+        return max(self._get_wait_time(), self.request_pool.wait_time(consumer))
     
-    async def fetch_player_data(self, fid: str, use_proxy: Optional[str] = None) -> Dict:
+    def reset_rate_limits(self):
+        """Forget recorded requests for all APIs"""
+        for limiter in self.api_limiters.values():
+            limiter.reset()
+    
+    async def fetch_player_data(self, fid: str, use_proxy: Optional[str] = None,
+                                max_age: Optional[float] = None, fields: Optional[List[str]] = None,
+                                consumer: Optional[str] = None) -> Dict:
         """
         Fetch player login data (nickname, furnace level, kid, etc.)
         
         Args:
             fid: Player ID
             use_proxy: Optional proxy URL for fallback
+            max_age: Accept a cached profile up to this many seconds old (None always fetches)
+            fields: Profile fields the caller needs; their TTLs also bound the cached profile's age
+            consumer: Request budget consumer (default: the one set with request_consumer, else interactive)
             
         Returns:
             {
@@ -243,10 +453,45 @@ class LoginHandler:
                     'kid': str,
                     # ... other player data
                 } | None,
-                'api_used': 1 | 2,
-                'error_message': str | None
+                'api_used': int,  # 0 when served from the cache
+                'error_message': str | None,
+                'cached': bool,
+                'wait_time': float,  # rate_limited only
+                'circuit_open': bool,  # rate_limited because every API's circuit breaker is open
+                'budget_consumer': str  # rate_limited because this consumer's share of the request budget is used up
             }
         """
+        if max_age is not None or fields is not None:
+            cached = self.player_cache.get(fid, max_age, fields)
+            if cached is not None:
+                return {
+                    'status': 'success',
+                    'data': cached,
+                    'api_used': 0,
+                    'error_message': None,
+                    'cached': True
+                }
+        
+        # Concurrent fetches of the same player share one call, whichever consumer started it
+        consumer = self.request_pool.resolve_consumer(consumer)
+        result = await self.player_fetches.run(
+            (str(fid), use_proxy),
+            lambda: self._fetch_player_data_upstream(fid, use_proxy, consumer)
+        )
+        if result.get('budget_consumer') not in (None, consumer):
+            # The shared call was denied because another consumer's share is used up; retry once under our own
+            result = await self.player_fetches.run(
+                (str(fid), use_proxy, consumer),
+                lambda: self._fetch_player_data_upstream(fid, use_proxy, consumer)
+            )
+        return dict(result)
+    
+    async def _fetch_player_data_upstream(self, fid: str, use_proxy: Optional[str] = None,
+                                          consumer: Optional[str] = None) -> Dict:
+        """Fetch a player profile from the next available API (see fetch_player_data)"""
+        if not any(self.api_breakers[api_num].is_available() for api_num in (self.available_apis or [1])):
+            return self._circuit_open_result()
+        
         # Check rate limits and get available API
         api_result = self._get_available_api()
         
@@ -260,9 +505,30 @@ class LoginHandler:
                 'error_message': f'Rate limit reached. Wait {wait_time:.1f} seconds.'
             }
         
-        # Get the API to use
-        api_num = api_result if isinstance(api_result, int) else api_result
-        api_url = self.api1_url if api_num == 1 else self.api2_url
+        # Get the API to use; a request its circuit would reject must not use up budget
+        api_num = api_result
+        api_url = self.api_urls[api_num - 1]
+        breaker = self.api_breakers[api_num]
+        if not breaker.is_available():
+            return self._circuit_open_result()
+        
+        # Take a slot from the shared budget; a consumer over its share waits for the others
+        wait_time = self.request_pool.try_acquire(consumer)
+        if wait_time > 0:
+            return {
+                'status': 'rate_limited',
+                'data': None,
+                'wait_time': wait_time,
+                'budget_consumer': self.request_pool.resolve_consumer(consumer),
+                'error_message': f'Request budget in use by other tasks. Wait {wait_time:.1f} seconds.'
+            }
+        
+        # Claim the half-open trial only once the request is sure to be sent (nothing awaited since is_available)
+        if not breaker.allow_request():
+            return self._circuit_open_result()
+        
+        # Reserve the slot before sending so concurrent callers cannot overcommit the API
+        self._record_api_request(api_num)
         
         # Prepare request
         current_time = int(time.time() * 1000)
@@ -271,70 +537,76 @@ class LoginHandler:
         form = f"sign={sign}&{form}"
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
         
+        started = time.monotonic()
+        outcome_recorded = False
         try:
             # Use proxy if provided and main request fails
-            if use_proxy:
-                from aiohttp_socks import ProxyConnector
-                connector = ProxyConnector.from_url(use_proxy, ssl=self.ssl_context)
-            else:
-                connector = aiohttp.TCPConnector(ssl=self.ssl_context)
-            
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.post(api_url, headers=headers, data=form) as response:
-                    # Record the API request
-                    self._record_api_request(api_num)
+            session = self._get_session(api_url, use_proxy)
+            async with session.post(api_url, headers=headers, data=form) as response:
+                # Server errors and timeouts count against the API's circuit; client errors do not
+                if response.status >= 500:
+                    breaker.record_failure(time.monotonic() - started, f"HTTP {response.status}")
+                else:
+                    breaker.record_success(time.monotonic() - started)
+                outcome_recorded = True
+                
+                if response.status == 200:
+                    data = await response.json()
+                    
+                    # Check if we have valid data
+                    if data.get('data'):
+                        self.player_cache.put(fid, data['data'])
+                        return {
+                            'status': 'success',
+                            'data': data['data'],
+                            'api_used': api_num,
+                            'error_message': None
+                        }
                     
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        # Check if we have valid data
-                        if data.get('data'):
-                            return {
-                                'status': 'success',
-                                'data': data['data'],
-                                'api_used': api_num,
-                                'error_message': None
-                            }
-                        
-                        # Check if this is a "player not found" error (40004 or 40001 with "role not exist")
-                        elif data.get('err_code') == 40004 or (data.get('err_code') == 40001 and 'role not exist' in str(data.get('msg', '')).lower()):
-                            return {
-                                'status': 'not_found',
-                                'data': None,
-                                'api_used': api_num,
-                                'error_message': 'Player does not exist (role not exist)',
-                                'err_code': data.get('err_code')
-                            }
-                        
-                        # Other cases where data is empty but not error 40004
-                        else:
-                            err_code = data.get('err_code', 'unknown')
-                            err_msg = data.get('msg', 'Unknown error')
-                            return {
-                                'status': 'error',
-                                'data': None,
-                                'api_used': api_num,
-                                'error_message': f'API Error {err_code}: {err_msg}',
-                                'err_code': err_code
-                            }
-                    elif response.status == 429:
-                        # This shouldn't happen with our rate limiting, but handle it
+                    # Check if this is a "player not found" error (40004 or 40001 with "role not exist")
+                    elif data.get('err_code') == 40004 or (data.get('err_code') == 40001 and 'role not exist' in str(data.get('msg', '')).lower()):
                         return {
-                            'status': 'rate_limited',
+                            'status': 'not_found',
                             'data': None,
                             'api_used': api_num,
-                            'error_message': 'Unexpected rate limit'
+                            'error_message': 'Player does not exist (role not exist)',
+                            'err_code': data.get('err_code')
                         }
+                    
+                    # Other cases where data is empty but not error 40004
                     else:
+                        err_code = data.get('err_code', 'unknown')
+                        err_msg = data.get('msg', 'Unknown error')
                         return {
                             'status': 'error',
                             'data': None,
                             'api_used': api_num,
-                            'error_message': f'HTTP {response.status}'
+                            'error_message': f'API Error {err_code}: {err_msg}',
+                            'err_code': err_code
                         }
-                        
+                elif response.status == 429:
+                    # This shouldn't happen with our rate limiting; pause every login consumer together
+                    wait_time = parse_retry_after(response.headers, self.rate_limit_window / 2)
+                    self.request_pool.report_throttled(wait_time)
+                    return {
+                        'status': 'rate_limited',
+                        'data': None,
+                        'api_used': api_num,
+                        'wait_time': wait_time,
+                        'error_message': 'Unexpected rate limit'
+                    }
+                else:
+                    return {
+                        'status': 'error',
+                        'data': None,
+                        'api_used': api_num,
+                        'error_message': f'HTTP {response.status}'
+                    }
+                    
         except Exception as e:
-            self.log_message(f"Error fetching player data for ID {fid}: {str(e)}")
+            if not outcome_recorded:
+                breaker.record_failure(time.monotonic() - started, str(e) or type(e).__name__)
+            self.log_message(f"Error fetching player data for ID {fid}: {str(e) or type(e).__name__}", logging.WARNING)
             return {
                 'status': 'error',
                 'data': None,
@@ -342,8 +614,21 @@ class LoginHandler:
                 'error_message': str(e)
             }
     
+    def _circuit_open_result(self) -> Dict:
+        """Fail-fast result while every login API's circuit is open; callers wait like for a rate limit"""
+        retry_after = min(self.api_breakers[api_num].retry_after() for api_num in (self.available_apis or [1]))
+        wait_time = max(1.0, retry_after)
+        return {
+            'status': 'rate_limited',
+            'circuit_open': True,
+            'data': None,
+            'wait_time': wait_time,
+            'error_message': f'Login API unavailable (circuit open). Retrying in {wait_time:.0f} seconds.'
+        }
+    
     async def fetch_player_batch(self, fids: List[str], progress_callback: Optional[Callable] = None, 
-                               alliance_id: Optional[str] = None) -> List[Dict]:
+                               alliance_id: Optional[str] = None, max_concurrency: Optional[int] = None,
+                               max_age: Optional[float] = None) -> List[Dict]:
         """
         Fetch multiple players efficiently with progress updates
         
@@ -351,91 +636,136 @@ class LoginHandler:
             fids: List of player IDs
             progress_callback: async function(current, total, status_msg)
             alliance_id: Alliance ID for locking (optional)
+            max_concurrency: Requests in flight at once (default: batch_concurrency_per_api per available API)
+            max_age: Accept cached profiles up to this many seconds old (see fetch_player_data)
             
         Returns:
-            List of results in same format as fetch_player_data
+            List of results in same format as fetch_player_data, in the order of fids
         """
-        results = []
         total = len(fids)
         
         # Use alliance lock if provided
         if alliance_id:
             async with self.get_alliance_lock(alliance_id):
-                return await self._fetch_batch_internal(fids, progress_callback, total)
+                return await self._fetch_batch_internal(fids, progress_callback, total, max_concurrency, max_age)
         else:
-            return await self._fetch_batch_internal(fids, progress_callback, total)
+            return await self._fetch_batch_internal(fids, progress_callback, total, max_concurrency, max_age)
     
     async def _fetch_batch_internal(self, fids: List[str], progress_callback: Optional[Callable], 
-                                  total: int) -> List[Dict]:
-        """Internal method to fetch batch of players"""
-        results = []
+                                  total: int, max_concurrency: Optional[int] = None,
+                                  max_age: Optional[float] = None) -> List[Dict]:
+        """
+        Internal method to fetch batch of players.
+        Workers pull the next FID as soon as they finish one, so every API's remaining
+        rate budget is used; the limiters decide when a request may go out.
+        """
+        results: List[Optional[Dict]] = [None] * total
+        if total == 0:
+            return results
+        
+        concurrency = max_concurrency or self.batch_concurrency_per_api * max(1, len(self.available_apis))
+        pending_indexes = iter(range(total))
+        progress_lock = asyncio.Lock()
+        completed = 0
         
-        for i, fid in enumerate(fids):
-            # Update progress
+        async def report(status_msg: str):
             if progress_callback:
-                await progress_callback(i + 1, total, f"Fetching player {i + 1}/{total}")
-            
-            # Fetch player data
-            result = await self.fetch_player_data(fid)
-            results.append(result)
-            
-            # Handle rate limiting
-            if result['status'] == 'rate_limited':
-                wait_time = result.get('wait_time', 60)
-                if progress_callback:
-                    await progress_callback(i + 1, total, f"Rate limited. Waiting {wait_time:.1f}s...")
-                await asyncio.sleep(wait_time)
+                async with progress_lock:
+                    await progress_callback(completed, total, status_msg)
+        
+        async def worker():
+            nonlocal completed
+            for i in pending_indexes:
+                result = await self.fetch_player_data(fids[i], max_age=max_age)
                 
-                # Retry after wait
-                result = await self.fetch_player_data(fid)
-                results[-1] = result
-            
-            # Add delay between requests
-            if i < total - 1:  # Don't delay after last request
-                await asyncio.sleep(self.request_delay)
+                # Handle rate limiting: wait for the next free slot and retry
+                for _ in range(self.batch_rate_limit_retries):
+                    if result['status'] != 'rate_limited':
+                        break
+                    wait_time = result.get('wait_time', 60)
+                    await report(f"Rate limited. Waiting {wait_time:.1f}s...")
+                    await asyncio.sleep(wait_time)
+                    result = await self.fetch_player_data(fids[i], max_age=max_age)
+                
+                results[i] = result
+                completed += 1
+                await report(f"Fetched player {completed}/{total}")
         
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
         return results
     
     def get_mode_text(self) -> str:
         """Get human-readable description of current API mode"""
-        if self.dual_api_mode:
+        unavailable = [str(api_num) for api_num in self.api_limiters if api_num not in self.available_apis]
+        if len(self.available_apis) == 2 and not unavailable:
             return "✅ Dual-API mode active (1 member/second)"
+        elif self.dual_api_mode:
+            text = f"✅ Multi-API mode active ({len(self.available_apis)} APIs, {self._members_per_second_text()})"
+            return text + (f" - API {', '.join(unavailable)} unavailable" if unavailable else "")
         elif self.available_apis:
-            api_num = self.available_apis[0]
-            return f"⚠️ Single-API mode (1 member/2 seconds) - API {3-api_num} unavailable"
+            return f"⚠️ Single-API mode (1 member/2 seconds) - API {', '.join(unavailable)} unavailable"
         else:
             return "❌ No APIs available"
     
+    def _members_per_second_text(self) -> str:
+        rate = len(self.available_apis) / 2
+        return "1 member/second" if rate == 1 else f"{rate:g} members/second"
+    
     def get_processing_rate(self) -> str:
         """Get user-friendly processing rate"""
         if self.dual_api_mode:
-            return "⚡ Rate: 1 member/second"
+            return f"⚡ Rate: {self._members_per_second_text()}"
         elif self.available_apis:
             return "⚡ Rate: 1 member/2 seconds"
         else:
             return "❌ Service unavailable"
     
     def get_rate_limit_info(self) -> Dict[str, int]:
-        """Get current rate limit information"""
+        """Get current rate limit information (api{n}_used / api{n}_remaining per API)"""
         now = time.time()
-        self.api1_requests = [t for t in self.api1_requests if now - t < self.rate_limit_window]
-        self.api2_requests = [t for t in self.api2_requests if now - t < self.rate_limit_window]
-        
-        return {
-            'api1_used': len(self.api1_requests),
-            'api1_remaining': self.rate_limit_per_api - len(self.api1_requests),
-            'api2_used': len(self.api2_requests),
-            'api2_remaining': self.rate_limit_per_api - len(self.api2_requests),
-            'total_available': (self.rate_limit_per_api - len(self.api1_requests)) + 
-                             (self.rate_limit_per_api - len(self.api2_requests)) if self.dual_api_mode else
-                             (self.rate_limit_per_api - len(self.api1_requests if 1 in self.available_apis else self.api2_requests))
-        }
+        info = {}
+        for api_num, limiter in self.api_limiters.items():
+            remaining = limiter.remaining(now)
+            info[f'api{api_num}_used'] = limiter.limit - remaining
+            info[f'api{api_num}_remaining'] = remaining
+        info['total_available'] = sum(info[f'api{api_num}_remaining'] for api_num in (self.available_apis or [1]))
+        return info
     
     async def start_queue_processor(self):
-        """Start the queue processor if not already running"""
+        """Start the queue processor (and periodic rate-limit snapshots) if not already running"""
         if not self.queue_processor_task or self.queue_processor_task.done():
             self.queue_processor_task = asyncio.create_task(self._process_operation_queue())
             self.log_message("Queue processor started")
+        if not self.state_snapshot_task or self.state_snapshot_task.done():
+            self.state_snapshot_task = asyncio.create_task(self._snapshot_state_loop())
+    
+    def snapshot_rate_limit_state(self) -> bool:
+        """Save the limiter windows (keyed by API URL) and the Discord backoff deadline"""
+        return save_state('login_handler', {
+            'limiters': {self.api_urls[api_num - 1]: list(limiter.requests) for api_num, limiter in self.api_limiters.items()},
+            'discord_block_until': self.discord_block_until,
+        })
+    
+    def restore_rate_limit_state(self):
+        """Load the state saved by snapshot_rate_limit_state, dropping anything already expired"""
+        state = load_state('login_handler')
+        if not state:
+            return
+        now = time.time()
+        saved_limiters = state.get('limiters', {})
+        for api_num, limiter in self.api_limiters.items():
+            limiter.restore(saved_limiters.get(self.api_urls[api_num - 1], []), now)
+        if state.get('discord_block_until', 0) > now:
+            self.discord_block_until = state['discord_block_until']
+        
+        restored = sum(len(limiter.requests) for limiter in self.api_limiters.values())
+        backoff = max(0.0, self.discord_block_until - now)
+        self.log_message(f"Restored rate limit state: {restored} recent request(s), Discord backoff {backoff:.0f}s")
+    
+    async def _snapshot_state_loop(self):
+        while True:
+            await asyncio.sleep(self.state_snapshot_interval)
+            self.snapshot_rate_limit_state()
     
     async def queue_operation(self, operation_info: Dict) -> int:
         """
@@ -444,24 +774,159 @@ class LoginHandler:
         - type: 'member_addition' | 'alliance_control' | 'gift_code' etc
         - callback: async function to execute
         - description: string description
+        - priority: optional PRIORITY_* class (defaults by type, else PRIORITY_MANUAL)
+        - consumer: optional request budget consumer for its API calls (defaults by type)
         - alliance_id: optional alliance ID for locking
         - interaction: discord interaction for status updates
         """
-        # Mark if this operation will be queued (not the first)
-        current_size = self.operation_queue.qsize()
-        operation_info['was_queued'] = current_size > 0
+        priority = operation_info.get('priority', DEFAULT_OPERATION_PRIORITIES.get(operation_info.get('type'), PRIORITY_MANUAL))
+        operation_info['priority'] = priority
+        operation_info['queued_at'] = time.time()
+        sort_key = self._operation_sort_key(priority, operation_info['queued_at'])
+        
+        position = self.get_queue_position(priority, operation_info.get('alliance_id'))
+        operation_info['was_queued'] = position > 1
         
-        await self.operation_queue.put(operation_info)
-        queue_size = self.operation_queue.qsize()
-        self.log_message(f"Operation queued: {operation_info['description']} (Position: {queue_size})")
+        heapq.heappush(self.pending_operations, (sort_key, next(self.operation_sequence), operation_info))
+        self.queue_event.set()
+        self.log_message(f"Operation queued: {operation_info['description']} (Priority: {priority}, Position: {position})", logging.DEBUG)
         
         # Start processor if not running
         await self.start_queue_processor()
         
-        return queue_size
+        return position
+    
+    def _operation_sort_key(self, priority: int, queued_at: float) -> float:
+        """
+        Aged priority as a fixed key: an operation that has waited queue_aging_seconds
+        ranks level with a fresh one of the next better class, so nothing starves.
+        """
+        return priority * self.queue_aging_seconds + queued_at
+    
+    @staticmethod
+    def _operation_key(operation: Dict) -> Optional[str]:
+        """Operations sharing a key never run at the same time (one per alliance)"""
+        alliance_id = operation.get('alliance_id')
+        return str(alliance_id) if alliance_id else None
+    
+    @property
+    def current_operation(self) -> Optional[Dict]:
+        """The operation this task is running, else the oldest running one"""
+        operation = _current_operation.get()
+        if operation is None and self.running_operations:
+            operation = min(self.running_operations.values(), key=lambda op: op.get('started_at', 0))
+        return operation
+    
+    def get_queue_position(self, priority: int = PRIORITY_MANUAL, alliance_id=None) -> int:
+        """Position a new operation of this priority would get (1 = starts now)"""
+        sort_key = self._operation_sort_key(priority, time.time())
+        ahead = sum(1 for key, _, _ in self.pending_operations if key <= sort_key)
+        blocked = (
+            len(self.running_operations) >= self.max_concurrent_operations
+            or self._operation_key({'alliance_id': alliance_id}) in self.running_operations
+        )
+        return ahead + (1 if blocked else 0) + 1
+    
+    def estimate_wait_time(self, position: int) -> Optional[float]:
+        """Rough seconds until the operation at this position starts, from average run times"""
+        if position <= 1:
+            return 0.0
+        if not self.operation_durations:
+            return None
+        average = sum(self.operation_durations.values()) / len(self.operation_durations)
+        wait = 0.0
+        for operation in self.running_operations.values():
+            elapsed = time.time() - operation.get('started_at', time.time())
+            wait += max(0.0, self.operation_durations.get(operation.get('type'), average) - elapsed)
+        for _, _, operation in heapq.nsmallest(max(0, position - 2), self.pending_operations):
+            wait += self.operation_durations.get(operation.get('type'), average)
+        # Operations on different alliances share the work concurrently
+        return wait / self.max_concurrent_operations
+    
+    async def _run_operation(self, operation: Dict):
+        """Run one operation under its alliance lock, reporting failures"""
+        key = self._operation_key(operation)
+        self.running_operations[key] = operation
+        context_token = _current_operation.set(operation)
+        operation['started_at'] = time.time()
+        waited = operation['started_at'] - operation.get('queued_at', operation['started_at'])
+        self.log_message(f"Processing operation: {operation['description']} (waited {waited:.0f}s)")
+        
+        try:
+            with request_consumer(operation.get('consumer', OPERATION_CONSUMERS.get(operation.get('type')))):
+                # Use alliance lock if specified
+                if operation.get('alliance_id'):
+                    async with self.get_alliance_lock(str(operation['alliance_id'])):
+                        await operation['callback']()
+                else:
+                    await operation['callback']()
+            
+            self.log_message(f"Operation completed: {operation['description']}")
+            
+        except Exception as e:
+            self.log_message(f"Operation failed: {operation['description']} - Error: {str(e)}", logging.ERROR)
+            if self._is_discord_cloudflare_block(str(e)):
+                self._set_discord_backoff(str(e))
+            # Send error message if interaction is available
+            if operation.get('interaction'):
+                try:
+                    await operation['interaction'].followup.send(
+                        f"❌ Operation failed: {str(e)}", ephemeral=True
+                    )
+                except:
+                    pass
+        
+        finally:
+            duration = time.time() - operation['started_at']
+            previous = self.operation_durations.get(operation.get('type'))
+            self.operation_durations[operation.get('type')] = duration if previous is None else 0.7 * previous + 0.3 * duration
+            self.queue_stats['completed'] += 1
+            _current_operation.reset(context_token)
+            if self.running_operations.get(key) is operation:
+                del self.running_operations[key]
+            self.queue_event.set()  # A slot or alliance freed up
+    
+    async def yield_to_queue(self):
+        """
+        Let waiting operations of a better priority class run before the current one continues.
+        Long sweeps call this between chunks; operations on an alliance whose lock is held keep waiting.
+        """
+        current = _current_operation.get()
+        if current is None:
+            return
+        
+        while True:
+            eligible = [
+                entry for entry in sorted(self.pending_operations)
+                if entry[2]['priority'] < current['priority']
+                and self._operation_key(entry[2]) not in self.running_operations
+                and not (entry[2].get('alliance_id') and self.get_alliance_lock(str(entry[2]['alliance_id'])).locked())
+            ]
+            if not eligible:
+                return
+            entry = eligible[0]
+            self.pending_operations.remove(entry)
+            heapq.heapify(self.pending_operations)
+            self.queue_stats['preemptions'] += 1
+            self.log_message(f"Pausing {current['description']} for {entry[2]['description']}")
+            await self._run_operation(entry[2])
+    
+    def _next_runnable_operation(self) -> Optional[Dict]:
+        """Pop the best-ranked operation whose alliance is not busy, if a slot is free"""
+        if len(self.running_operations) >= self.max_concurrent_operations:
+            return None
+        for entry in sorted(self.pending_operations):
+            if self._operation_key(entry[2]) not in self.running_operations:
+                self.pending_operations.remove(entry)
+                heapq.heapify(self.pending_operations)
+                return entry[2]
+        return None
     
     async def _process_operation_queue(self):
-        """Process queued operations one at a time"""
+        """
+        Start queued operations, best aged priority first. Operations on different alliances
+        run concurrently (up to max_concurrent_operations) and share the API rate limiters.
+        """
         self.log_message("Queue processor starting...")
         
         while True:
@@ -472,50 +937,33 @@ class LoginHandler:
                     self.log_message(f"Discord backoff active, waiting {wait_time:.0f}s before next operation.")
                     await asyncio.sleep(wait_time)
 
-                # Wait for an operation
-                operation = await self.operation_queue.get()
-                self.current_operation = operation
-                
-                self.log_message(f"Processing operation: {operation['description']}")
-                
-                try:
-                    # Use alliance lock if specified
-                    if operation.get('alliance_id'):
-                        async with self.get_alliance_lock(str(operation['alliance_id'])):
-                            await operation['callback']()
-                    else:
-                        await operation['callback']()
-                    
-                    self.log_message(f"Operation completed: {operation['description']}")
-                    
-                except Exception as e:
-                    self.log_message(f"Operation failed: {operation['description']} - Error: {str(e)}")
-                    if self._is_discord_cloudflare_block(str(e)):
-                        self._set_discord_backoff(str(e))
-                    # Send error message if interaction is available
-                    if operation.get('interaction'):
-                        try:
-                            await operation['interaction'].followup.send(
-                                f"❌ Operation failed: {str(e)}", ephemeral=True
-                            )
-                        except:
-                            pass
+                # Wait for an operation that can start
+                operation = self._next_runnable_operation()
+                if operation is None:
+                    self.queue_event.clear()
+                    await self.queue_event.wait()
+                    continue
                 
-                finally:
-                    self.current_operation = None
-                    self.operation_queue.task_done()
+                # Claim the alliance slot now so the next pick already sees it as busy
+                self.running_operations[self._operation_key(operation)] = operation
+                task = asyncio.create_task(self._run_operation(operation))
+                self.operation_tasks.add(task)
+                task.add_done_callback(self.operation_tasks.discard)
                 
             except asyncio.CancelledError:
                 self.log_message("Queue processor cancelled")
                 break
             except Exception as e:
-                self.log_message(f"Queue processor error: {str(e)}")
+                self.log_message(f"Queue processor error: {str(e)}", logging.ERROR)
                 await asyncio.sleep(1)  # Prevent tight loop on error
     
     def get_queue_info(self) -> Dict:
         """Get current queue status"""
         return {
-            'queue_size': self.operation_queue.qsize(),
+            'queue_size': len(self.pending_operations),
             'current_operation': self.current_operation,
-            'is_processing': self.current_operation is not None
+            'is_processing': bool(self.running_operations),
+            'running_operations': len(self.running_operations),
+            'completed': self.queue_stats['completed'],
+            'preemptions': self.queue_stats['preemptions']
         }
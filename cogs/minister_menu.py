@@ -2,13 +2,8 @@ import discord
 from discord.ext import commands
 import sqlite3
 import asyncio
-import time
-import hashlib
-import aiohttp
-from aiohttp_socks import ProxyConnector
-from wos_config import get_ssl_context, get_wos_secret
-
-SECRET = get_wos_secret()
+from .login_handler import LoginHandler
+from .request_governor import CONSUMER_MINISTER
 
 class UserFilterModal(discord.ui.Modal, title="Filter Users"):
     def __init__(self, parent_view):
@@ -743,25 +738,15 @@ class MinisterMenu(commands.Cog):
         self.svs_cursor = self.svs_conn.cursor()
         self.original_interaction = None
 
-    async def fetch_user_data(self, fid, proxy=None):
-        url = 'https://wos-giftcode-api.centurygame.com/api/player'
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        current_time = int(time.time() * 1000)
-        form = f"fid={fid}&time={current_time}"
-        sign = hashlib.md5((form + SECRET).encode('utf-8')).hexdigest()
-        form = f"sign={sign}&{form}"
-
-        try:
-            connector = ProxyConnector.from_url(proxy) if proxy else None
-            ssl_context = get_ssl_context()
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.post(url, headers=headers, data=form, ssl=ssl_context) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        return response.status
-        except Exception as e:
-            return None
+    async def fetch_user_data(self, fid, proxy=None, max_age=3600, fields=None):
+        """Fetch a player profile through the shared login handler, accepting a cached one up to max_age seconds old"""
+        result = await LoginHandler().fetch_player_data(fid, use_proxy=proxy, max_age=max_age, fields=fields,
+                                                        consumer=CONSUMER_MINISTER)
+        if result['status'] == 'success':
+            return {'data': result['data']}
+        elif result['status'] == 'rate_limited':
+            return 429
+        return None
 
     async def is_admin(self, user_id: int) -> bool:
         settings_conn = sqlite3.connect('db/settings.sqlite')
@@ -1084,8 +1069,8 @@ class MinisterMenu(commands.Cog):
         
         for fid in fids:
             try:
-                # Fetch user data from API
-                data = await self.fetch_user_data(fid)
+                # Fetch user data from API (accept a profile fetched in the last few minutes)
+                data = await self.fetch_user_data(fid, max_age=300, fields=["nickname"])
                 if data and isinstance(data, dict) and "data" in data:
                     new_nickname = data["data"].get("nickname", "")
                     if new_nickname:
@@ -1288,7 +1273,7 @@ class MinisterMenu(commands.Cog):
 
             # Get avatar
             try:
-                data = await self.fetch_user_data(fid)
+                data = await self.fetch_user_data(fid, fields=["avatar_image"])
                 if isinstance(data, int) and data == 429:
                     avatar_image = "https://gof-formal-avatar.akamaized.net/avatar-dev/2023/07/17/1001.png"
                 elif data and "data" in data and "avatar_image" in data["data"]:
@@ -1425,7 +1410,7 @@ class MinisterMenu(commands.Cog):
             
             # Get avatar for log
             try:
-                data = await self.fetch_user_data(fid)
+                data = await self.fetch_user_data(fid, fields=["avatar_image"])
                 if isinstance(data, int) and data == 429:
                     avatar_image = "https://gof-formal-avatar.akamaized.net/avatar-dev/2023/07/17/1001.png"
                 elif data and "data" in data and "avatar_image" in data["data"]:
@@ -3,14 +3,11 @@ from discord import app_commands
 from discord.ext import commands
 import asyncio
 import sqlite3
-import aiohttp
-import hashlib
-from aiohttp_socks import ProxyConnector
-import time
 import re
 from datetime import datetime
 import json
-from wos_config import get_ssl_context, get_wos_secret
+from .login_handler import LoginHandler
+from .request_governor import CONSUMER_MINISTER
 
 try:
     import arabic_reshaper
@@ -19,8 +16,6 @@ try:
 except ImportError:
     ARABIC_SUPPORT = False
 
-SECRET = get_wos_secret()
-
 class ChannelSelectView(discord.ui.View):
     def __init__(self, bot, context: str):
         super().__init__(timeout=None)
@@ -196,25 +191,15 @@ class MinisterSchedule(commands.Cog):
 
         self.svs_conn.commit()
 
-    async def fetch_user_data(self, fid, proxy=None):
-        url = 'https://wos-giftcode-api.centurygame.com/api/player'
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        current_time = int(time.time() * 1000)
-        form = f"fid={fid}&time={current_time}"
-        sign = hashlib.md5((form + SECRET).encode('utf-8')).hexdigest()
-        form = f"sign={sign}&{form}"
-
-        try:
-            connector = ProxyConnector.from_url(proxy) if proxy else None
-            ssl_context = get_ssl_context()
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.post(url, headers=headers, data=form, ssl=ssl_context) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        return response.status
-        except Exception as e:
-            return None
+    async def fetch_user_data(self, fid, proxy=None, max_age=3600, fields=None):
+        """Fetch a player profile through the shared login handler, accepting a cached one up to max_age seconds old"""
+        result = await LoginHandler().fetch_player_data(fid, use_proxy=proxy, max_age=max_age, fields=fields,
+                                                        consumer=CONSUMER_MINISTER)
+        if result['status'] == 'success':
+            return {'data': result['data']}
+        elif result['status'] == 'rate_limited':
+            return 429
+        return None
 
     async def send_embed_to_channel(self, embed):
         """Sends the embed message to a specific channel."""
@@ -521,7 +506,7 @@ class MinisterSchedule(commands.Cog):
                         if progress_callback:
                             await progress_callback(len(fetched_data), len(fids_to_fetch), waiting=False)
 
-                        data = await self.fetch_user_data(booked_fid)
+                        data = await self.fetch_user_data(booked_fid, fields=["nickname"])
                         if isinstance(data, dict) and "data" in data:
                             fetched_data[booked_fid] = data["data"].get("nickname", "Unknown")
                             if progress_callback: # Immediate progress update after successful fetch
@@ -530,7 +515,7 @@ class MinisterSchedule(commands.Cog):
                         elif data == 429:
                             if progress_callback:
                                 await progress_callback(len(fetched_data), len(fids_to_fetch), waiting=True)
-                            await asyncio.sleep(60) # Rate limit, wait and retry
+                            await asyncio.sleep(max(5.0, LoginHandler().get_wait_time(CONSUMER_MINISTER))) # Rate limit, wait for our share and retry
                         else:
                             fetched_data[booked_fid] = "Unknown"
                             if progress_callback: # Immediate progress update even for failed fetch
@@ -886,7 +871,7 @@ class MinisterSchedule(commands.Cog):
 
             # Try to get the avatar image
             try:
-                data = await self.fetch_user_data(fid)
+                data = await self.fetch_user_data(fid, fields=["avatar_image"])
 
                 if isinstance(data, int) and data == 429:
                     # Rate limit hit
@@ -1034,7 +1019,7 @@ class MinisterSchedule(commands.Cog):
 
             # Try to get the avatar image
             try:
-                data = await self.fetch_user_data(fid)
+                data = await self.fetch_user_data(fid, fields=["avatar_image"])
 
                 if isinstance(data, int) and data == 429:
                     # Rate limit hit
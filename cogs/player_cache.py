@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from wos_config import get_player_cache_persist, get_player_cache_size
+
+
+class PlayerProfileCache:
+    """
+    Process-wide LRU cache of player profiles returned by the login API.
+
+    Each field has its own freshness limit (FIELD_TTLS); a lookup is served from the
+    cache only if the entry is younger than the caller's max_age and the TTL of every
+    field the caller needs. Entries can optionally be persisted to sqlite so a restart
+    does not refetch every profile.
+    """
+
+    # Seconds a cached value is trusted; furnace and name change often, state rarely
+    FIELD_TTLS = {
+        'nickname': 3600,
+        'stove_lv': 3600,
+        'stove_lv_content': 3600,
+        'avatar_image': 3600,
+        'kid': 86400,
+    }
+    DEFAULT_TTL = 3600
+    PERSIST_BATCH_SIZE = 100
+
+    def __init__(self, max_entries: Optional[int] = None, persist: Optional[bool] = None,
+                 db_path: str = 'db/player_cache.sqlite'):
+        self.max_entries = max_entries if max_entries is not None else get_player_cache_size()
+        self.persist = get_player_cache_persist() if persist is None else persist
+        self.db_path = db_path
+        self.entries: OrderedDict = OrderedDict()  # fid -> (fetched_at, data)
+        self._dirty = set()
+        self._conn = None
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'stores': 0, 'evictions': 0}
+
+        if self.persist:
+            self._load()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS player_cache (
+                    fid TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def _load(self):
+        """Load the most recently fetched profiles, oldest first so LRU order matches age."""
+        try:
+            rows = self._connect().execute(
+                "SELECT fid, data, fetched_at FROM player_cache ORDER BY fetched_at DESC LIMIT ?",
+                (self.max_entries,)
+            ).fetchall()
+        except sqlite3.Error:
+            return
+        for fid, data, fetched_at in reversed(rows):
+            try:
+                self.entries[fid] = (fetched_at, json.loads(data))
+            except ValueError:
+                continue
+
+    def freshness_limit(self, max_age: Optional[float] = None, fields: Optional[Iterable[str]] = None) -> float:
+        """Oldest acceptable entry age for a lookup needing `fields` (all profile fields if None)."""
+        field_names = list(fields) if fields is not None else list(self.FIELD_TTLS)
+        limit = min((self.FIELD_TTLS.get(field, self.DEFAULT_TTL) for field in field_names), default=self.DEFAULT_TTL)
+        return min(limit, max_age) if max_age is not None else limit
+
+    def get(self, fid: str, max_age: Optional[float] = None, fields: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """Get a cached profile fresh enough for the caller, or None."""
+        fid = str(fid)
+        entry = self.entries.get(fid)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+
+        fetched_at, data = entry
+        if time.time() - fetched_at > self.freshness_limit(max_age, fields):
+            self.stats['stale'] += 1
+            return None
+
+        self.entries.move_to_end(fid)
+        self.stats['hits'] += 1
+        return data
+
+    def get_age(self, fid: str) -> Optional[float]:
+        entry = self.entries.get(str(fid))
+        return time.time() - entry[0] if entry else None
+
+    def put(self, fid: str, data: Dict):
+        fid = str(fid)
+        self.entries[fid] = (time.time(), data)
+        self.entries.move_to_end(fid)
+        self.stats['stores'] += 1
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            self._dirty.discard(evicted)
+            self.stats['evictions'] += 1
+
+        if self.persist:
+            self._dirty.add(fid)
+            if len(self._dirty) >= self.PERSIST_BATCH_SIZE:
+                self.flush()
+
+    def invalidate(self, fid: str):
+        self.entries.pop(str(fid), None)
+
+    def flush(self):
+        """Write changed entries to sqlite in one transaction."""
+        if not self.persist or not self._dirty:
+            return
+        rows = [(fid, json.dumps(self.entries[fid][1]), self.entries[fid][0]) for fid in self._dirty if fid in self.entries]
+        self._dirty.clear()
+        try:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO player_cache (fid, data, fetched_at) VALUES (?, ?, ?)", rows)
+            conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses'] + stats['stale']
+        stats['entries'] = len(self.entries)
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,280 @@
+"""
+Process-wide request budgets for the upstream APIs.
+
+Every caller takes a slot from the upstream's pool before sending, so gift redemption,
+member checks and interactive lookups share one rate limit deliberately instead of each
+pacing itself. Each consumer of a pool has a share (the part of the limit it is guaranteed
+while it has demand) and a priority (who gets spare capacity first). When an upstream answers
+429 the whole pool pauses once, rather than every caller backing off on its own schedule.
+"""
+import asyncio
+import contextlib
+import contextvars
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+POOL_LOGIN_API = "login_api"
+POOL_GIFT_API = "gift_api"
+POOL_GIFT_CODE_API = "gift_code_api"
+
+CONSUMER_INTERACTIVE = "interactive"          # A user is waiting on the answer (ID channel, /w, adding members)
+CONSUMER_MINISTER = "minister"                # Minister schedule nickname/avatar lookups
+CONSUMER_ROSTER_CHECK = "roster_check"        # Alliance member checks
+CONSUMER_GIFT_VALIDATION = "gift_validation"  # Gift code validation with the test ID
+CONSUMER_GIFT_REDEMPTION = "gift_redemption"  # Redeeming gift codes for alliance members
+CONSUMER_GIFT_CODE_SYNC = "gift_code_sync"    # Gift code distribution API sync
+
+# Per pool: consumer -> (priority, share). Lower priorities get spare capacity first;
+# shares are relative weights of the guaranteed part of the limit. The first consumer
+# listed is used for requests that do not name one.
+DEFAULT_CONSUMERS = {
+    POOL_LOGIN_API: {
+        CONSUMER_INTERACTIVE: (0, 2),
+        CONSUMER_MINISTER: (1, 1),
+        CONSUMER_ROSTER_CHECK: (2, 3),
+    },
+    POOL_GIFT_API: {
+        CONSUMER_GIFT_REDEMPTION: (1, 3),
+        CONSUMER_GIFT_VALIDATION: (0, 1),
+    },
+    POOL_GIFT_CODE_API: {
+        CONSUMER_GIFT_CODE_SYNC: (0, 1),
+    },
+}
+
+_current_consumer = contextvars.ContextVar('request_consumer', default=None)
+_pools: Dict[str, "RequestPool"] = {}
+
+
+class SlidingWindowLimiter:
+    """
+    At most `limit` requests per `window` seconds.
+    Timestamps are kept in a deque and expired from the left, so each check is amortized O(1).
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.requests = deque()
+
+    def _expire(self, now: float):
+        while self.requests and now - self.requests[0] >= self.window:
+            self.requests.popleft()
+
+    def remaining(self, now: Optional[float] = None) -> int:
+        self._expire(now or time.time())
+        return self.limit - len(self.requests)
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        """Seconds until a request slot frees up (0 if one is free now)"""
+        now = now or time.time()
+        self._expire(now)
+        if len(self.requests) < self.limit:
+            return 0.0
+        return max(0.0, self.window - (now - self.requests[len(self.requests) - self.limit]))
+
+    def record(self, now: Optional[float] = None):
+        self.requests.append(now or time.time())
+
+    def reset(self):
+        self.requests.clear()
+
+    def restore(self, timestamps: List[float], now: Optional[float] = None):
+        """Replace the recorded requests with the saved ones still inside the window"""
+        now = now or time.time()
+        recent = sorted(t for t in timestamps if 0 <= now - t < self.window)
+        self.requests = deque(recent[-self.limit:])
+
+    def __len__(self):
+        self._expire(time.time())
+        return len(self.requests)
+
+
+@contextlib.contextmanager
+def request_consumer(consumer: Optional[str]):
+    """Attribute upstream requests made inside the block (including awaited calls) to `consumer`"""
+    token = _current_consumer.set(consumer)
+    try:
+        yield
+    finally:
+        _current_consumer.reset(token)
+
+
+def current_consumer() -> Optional[str]:
+    return _current_consumer.get()
+
+
+def parse_retry_after(headers, default: float) -> float:
+    """Seconds from a Retry-After header, or default if it is missing or not a number"""
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return default
+
+
+class RequestPool:
+    """One upstream's request budget, split between its consumers"""
+
+    SHARE_RETRY_SECONDS = 1.0  # Wait handed out when only the consumer's share (not the pool) is used up
+    RESERVATION_GRACE = 1.0    # A denied consumer still counts as waiting this long after its wait ends
+
+    def __init__(self, name: str, limit: int, window: float, consumers: Optional[Dict] = None, min_interval: float = 0.0):
+        """
+        Args:
+            name: Pool name shown in status.
+            limit: Requests allowed per window across all consumers.
+            window: Window length in seconds.
+            consumers: consumer -> (priority, share); defaults to DEFAULT_CONSUMERS[name].
+            min_interval: Minimum spacing between any two requests, so a freed window is not spent in one burst.
+        """
+        self.name = name
+        self.limiter = SlidingWindowLimiter(max(1, limit), window)
+        self.consumers = dict(consumers or DEFAULT_CONSUMERS.get(name) or {name: (0, 1)})
+        self.default_consumer = next(iter(self.consumers))
+        self.min_interval = min_interval
+        self.usage = {consumer: deque() for consumer in self.consumers}
+        self.last_request = {}   # consumer -> last time it asked for a slot
+        self.waiting_until = {}  # consumer -> when a denied consumer is expected to have asked again
+        self.last_grant = 0.0
+        self.blocked_until = 0.0
+        self.stats = {consumer: {'granted': 0, 'denied': 0} for consumer in self.consumers}
+        self.throttles = 0
+
+    @property
+    def limit(self) -> int:
+        return self.limiter.limit
+
+    def set_limit(self, limit: int):
+        self.limiter.limit = max(1, limit)
+
+    def resolve_consumer(self, consumer: Optional[str] = None) -> str:
+        """The consumer a request is charged to: the one given, else the context's, else the pool default"""
+        consumer = consumer or current_consumer()
+        return consumer if consumer in self.consumers else self.default_consumer
+
+    def _used(self, consumer: str, now: float) -> int:
+        requests = self.usage[consumer]
+        while requests and now - requests[0] >= self.limiter.window:
+            requests.popleft()
+        return len(requests)
+
+    def _is_waiting(self, consumer: str, now: float) -> bool:
+        return now < self.waiting_until.get(consumer, 0.0)
+
+    def _is_active(self, consumer: str, now: float) -> bool:
+        """Consumers with recent demand; idle consumers' shares are lent to the others"""
+        last_request = self.last_request.get(consumer)
+        return self._is_waiting(consumer, now) or (last_request is not None and now - last_request < self.limiter.window)
+
+    def guaranteed(self, consumer: str, now: Optional[float] = None) -> int:
+        """Requests per window the consumer can count on while it competes with the other active consumers"""
+        now = now or time.time()
+        active = [c for c in self.consumers if c == consumer or self._is_active(c, now)]
+        total_share = sum(self.consumers[c][1] for c in active)
+        return int(self.limit * self.consumers[consumer][1] / total_share)
+
+    def _wait_time(self, consumer: str, now: float) -> float:
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        pool_wait = max(self.limiter.wait_time(now), self.last_grant + self.min_interval - now)
+        if pool_wait > 0:
+            return pool_wait
+        # One slot stays free for each idle consumer with a better priority, so it is served at
+        # once when it turns up. Beyond its guaranteed share a consumer may borrow spare capacity,
+        # unless a consumer with a better priority is waiting or the capacity is what other active
+        # consumers are still guaranteed.
+        priority = self.consumers[consumer][0]
+        over_share = self._used(consumer, now) >= self.guaranteed(consumer, now)
+        reserved = 0
+        for other, (other_priority, _) in self.consumers.items():
+            if other == consumer:
+                continue
+            if not self._is_active(other, now):
+                reserved += 1 if other_priority < priority else 0
+            elif over_share:
+                if other_priority < priority and self._is_waiting(other, now):
+                    return self.SHARE_RETRY_SECONDS
+                reserved += max(0, self.guaranteed(other, now) - self._used(other, now))
+        if self.limiter.remaining(now) > reserved:
+            return 0.0
+        return self.SHARE_RETRY_SECONDS
+
+    def wait_time(self, consumer: Optional[str] = None) -> float:
+        """Seconds before the consumer would get a slot, without taking one"""
+        return self._wait_time(self.resolve_consumer(consumer), time.time())
+
+    def try_acquire(self, consumer: Optional[str] = None) -> float:
+        """
+        Take a slot for the consumer (default: the one set with request_consumer).
+        Returns 0 when granted, otherwise the seconds to wait before asking again.
+        """
+        now = time.time()
+        consumer = self.resolve_consumer(consumer)
+        self.last_request[consumer] = now
+        wait = self._wait_time(consumer, now)
+        if wait > 0:
+            self.stats[consumer]['denied'] += 1
+            self.waiting_until[consumer] = max(self.waiting_until.get(consumer, 0.0), now + wait + self.RESERVATION_GRACE)
+            return wait
+
+        self.waiting_until.pop(consumer, None)
+        self.limiter.record(now)
+        self.usage[consumer].append(now)
+        self.last_grant = now
+        self.stats[consumer]['granted'] += 1
+        return 0.0
+
+    async def acquire(self, consumer: Optional[str] = None) -> float:
+        """Wait until the consumer gets a slot; returns the seconds waited"""
+        consumer = self.resolve_consumer(consumer)
+        started = time.time()
+        while True:
+            wait = self.try_acquire(consumer)
+            if wait <= 0:
+                return time.time() - started
+            await asyncio.sleep(wait)
+
+    def report_throttled(self, retry_after: float):
+        """The upstream answered 429: pause the whole pool once instead of each caller backing off separately"""
+        until = time.time() + retry_after
+        if until > self.blocked_until:
+            self.blocked_until = until
+            self.throttles += 1
+
+    def get_status(self) -> Dict:
+        now = time.time()
+        return {
+            'name': self.name,
+            'limit': self.limit,
+            'window': self.limiter.window,
+            'used': self.limit - self.limiter.remaining(now),
+            'blocked_for': max(0.0, self.blocked_until - now),
+            'throttles': self.throttles,
+            'consumers': {
+                consumer: {
+                    'priority': priority,
+                    'share': share,
+                    'used': self._used(consumer, now),
+                    'guaranteed': self.guaranteed(consumer, now),
+                    'granted': self.stats[consumer]['granted'],
+                    'denied': self.stats[consumer]['denied'],
+                }
+                for consumer, (priority, share) in self.consumers.items()
+            },
+        }
+
+
+def get_request_pool(name: str, limit: Optional[int] = None, window: Optional[float] = None, **options) -> RequestPool:
+    """Get the process-wide pool for an upstream; the first caller must give its limit and window"""
+    pool = _pools.get(name)
+    if pool is None:
+        if limit is None or window is None:
+            raise ValueError(f"Request pool {name} is not configured")
+        pool = RequestPool(name, limit, window, **options)
+        _pools[name] = pool
+    return pool
+
+
+def get_all_request_pools() -> List[RequestPool]:
+    return list(_pools.values())
@@ -0,0 +1,48 @@
+"""
+Small key/value store for runtime state that should survive a restart, such as
+rate-limiter windows and backoff deadlines. Values are JSON documents kept in
+db/runtime_state.sqlite.
+"""
+import json
+import os
+import sqlite3
+import time
+
+STATE_DB_PATH = 'db/runtime_state.sqlite'
+
+
+def _connect():
+    os.makedirs(os.path.dirname(STATE_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(STATE_DB_PATH)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS runtime_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    return conn
+
+
+def load_state(key):
+    """Get the saved state for key, or None if there is none (or it cannot be read)."""
+    try:
+        conn = _connect()
+        row = conn.execute("SELECT value FROM runtime_state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+    except (sqlite3.Error, ValueError):
+        return None
+
+
+def save_state(key, value):
+    """Save a JSON-serializable state document under key. Returns True on success."""
+    try:
+        conn = _connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO runtime_state (key, value, updated_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time())
+        )
+        conn.commit()
+        return True
+    except (sqlite3.Error, TypeError, ValueError):
+        return False
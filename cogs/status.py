@@ -4,6 +4,8 @@ from discord.ext import commands
 import sqlite3
 from datetime import datetime
 from .login_handler import LoginHandler
+from .circuit_breaker import STATE_CLOSED, get_all_circuit_breakers
+from .request_governor import get_all_request_pools
 
 
 class Status(commands.Cog):
@@ -56,12 +58,12 @@ class Status(commands.Cog):
         last_sync = getattr(gift_api, "last_sync_success", None)
         last_error = getattr(gift_api, "last_sync_error", None)
 
+        api_count = len(self.login_handler.api_urls)
         try:
             api_status = await self.login_handler.check_apis_availability()
-            api1 = "✅" if api_status.get("api1_available") else "❌"
-            api2 = "✅" if api_status.get("api2_available") else "❌"
+            api_marks = ["✅" if api_status.get(f"api{api_num}_available") else "❌" for api_num in range(1, api_count + 1)]
         except Exception:
-            api1 = api2 = "❓"
+            api_marks = ["❓"] * api_count
 
         embed = discord.Embed(
             title="🧭 Bot Status",
@@ -74,7 +76,53 @@ class Status(commands.Cog):
         embed.add_field(name="OCR Solver", value="✅ Ready" if ocr_ready else "❌ Not Ready", inline=True)
         embed.add_field(name="Validation Queue", value=f"`{validation_queue_len}`", inline=True)
         embed.add_field(name="Users / Alliances", value=f"`{users_count}` / `{alliance_count}`", inline=True)
-        embed.add_field(name="Login API", value=f"API1 {api1} | API2 {api2}", inline=True)
+        embed.add_field(name="Login API", value=" | ".join(f"API{api_num} {mark}" for api_num, mark in enumerate(api_marks, start=1)), inline=True)
+
+        session_stats = self.login_handler.get_session_stats()
+        embed.add_field(
+            name="Login HTTP Pool",
+            value=f"`{session_stats['open_sessions']}` session(s), `{session_stats['connection_reuse_rate'] * 100:.0f}%` connections reused",
+            inline=True,
+        )
+
+        cache_stats = self.login_handler.player_cache.get_stats()
+        flight_stats = self.login_handler.player_fetches.get_stats()
+        embed.add_field(
+            name="Player Cache",
+            value=(
+                f"`{cache_stats['entries']}` profile(s), `{cache_stats['hit_rate'] * 100:.0f}%` hit rate, "
+                f"`{flight_stats['coalesced']}` shared fetch(es)"
+            ),
+            inline=True,
+        )
+
+        pools = get_all_request_pools()
+        if pools:
+            pool_lines = []
+            for pool in pools:
+                pool_status = pool.get_status()
+                line = f"`{pool_status['name']}` {pool_status['used']}/{pool_status['limit']} per {pool_status['window']:.0f}s"
+                if pool_status['blocked_for'] > 0:
+                    line += f" ⏸️ paused {pool_status['blocked_for']:.0f}s"
+                consumers = ", ".join(
+                    f"{name} {consumer['used']}" for name, consumer in pool_status['consumers'].items() if consumer['used']
+                )
+                pool_lines.append(f"{line} ({consumers})" if consumers else line)
+            embed.add_field(name="Request Budget", value="\n".join(pool_lines), inline=False)
+
+        breakers = get_all_circuit_breakers()
+        if breakers:
+            breaker_lines = []
+            for breaker in breakers:
+                breaker_status = breaker.get_status()
+                if breaker_status['state'] == STATE_CLOSED:
+                    mark = "✅"
+                elif breaker_status['retry_after'] > 0:
+                    mark = f"❌ retry in {breaker_status['retry_after']:.0f}s"
+                else:
+                    mark = "⚠️ probing"
+                breaker_lines.append(f"`{breaker_status['name']}` {mark} ({breaker_status['failure_rate'] * 100:.0f}% failed)")
+            embed.add_field(name="Circuit Breakers", value="\n".join(breaker_lines), inline=False)
 
         if last_sync:
             embed.add_field(name="Gift API Last Sync", value=f"`{last_sync}`", inline=False)
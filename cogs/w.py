@@ -1,18 +1,15 @@
 import discord
 from discord.ext import commands
-import aiohttp
-import hashlib
-import time
 import asyncio
 import sqlite3
-from wos_config import get_ssl_context, get_wos_secret
+from .login_handler import LoginHandler
 
 class WCommand(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.conn = sqlite3.connect('db/changes.sqlite')
         self.c = self.conn.cursor()
-        self.SECRET = get_wos_secret()
+        self.login_handler = LoginHandler()
         
         self.level_mapping = {
             31: "30-1", 32: "30-2", 33: "30-3", 34: "30-4",
@@ -65,79 +62,71 @@ class WCommand(commands.Cog):
         try:
             await interaction.response.defer(thinking=True)
             
-            current_time = int(time.time() * 1000)
-            form = f"fid={fid}&time={current_time}"
-            sign = hashlib.md5((form + self.SECRET).encode('utf-8')).hexdigest()
-            form = f"sign={sign}&{form}"
-
-            url = 'https://wos-giftcode-api.centurygame.com/api/player'
-            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-            ssl_context = get_ssl_context()
-
             max_retries = 3
             retry_delay = 60
 
             for attempt in range(max_retries):
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, headers=headers, data=form, ssl=ssl_context) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            nickname = data['data']['nickname']
-                            fid_value = data['data']['fid']
-                            stove_level = data['data']['stove_lv']
-                            kid = data['data']['kid']
-                            avatar_image = data['data']['avatar_image']
-                            stove_lv_content = data['data'].get('stove_lv_content')
-
-                            if stove_level > 30:
-                                stove_level_name = self.level_mapping.get(stove_level, f"Level {stove_level}")
-                            else:
-                                stove_level_name = f"Level {stove_level}"
-
-                            user_info = None
-                            alliance_info = None
-                            
-                            with sqlite3.connect('db/users.sqlite') as users_db:
-                                cursor = users_db.cursor()
-                                cursor.execute("SELECT *, alliance FROM users WHERE fid=?", (fid_value,))
-                                user_info = cursor.fetchone()
-                                
-                                if user_info and user_info[-1]:
-                                    with sqlite3.connect('db/alliance.sqlite') as alliance_db:
-                                        cursor = alliance_db.cursor()
-                                        cursor.execute("SELECT name FROM alliance_list WHERE alliance_id=?", (user_info[-1],))
-                                        alliance_info = cursor.fetchone()
-
-                            embed = discord.Embed(
-                                title=f"👤 {nickname}",
-                                description=(
-                                    "━━━━━━━━━━━━━━━━━━━━━━\n"
-                                    f"**🆔 ID:** `{fid_value}`\n"
-                                    f"**🔥 Furnace Level:** `{stove_level_name}`\n"
-                                    f"**🌍 State:** `{kid}`\n"
-                                    "━━━━━━━━━━━━━━━━━━━━━━\n"
-                                ),
-                                color=discord.Color.blue()
-                            )
-
-                            if alliance_info:
-                                embed.description += f"**🏰 Alliance:** `{alliance_info[0]}`\n━━━━━━━━━━━━━━━━━━━━━━\n"
-
-                            registration_status = "Registered on the List ✅" if user_info else "Not on the List ❌"
-                            embed.set_footer(text=registration_status)
-
-                            if avatar_image:
-                                embed.set_image(url=avatar_image)
-                            if isinstance(stove_lv_content, str) and stove_lv_content.startswith("http"):
-                                embed.set_thumbnail(url=stove_lv_content)
-
-                            await interaction.followup.send(embed=embed)
-                            return 
-
-                        elif response.status == 429:
-                            if attempt < max_retries - 1:
-                                await interaction.followup.send("API limit reached, your result will be displayed automatically shortly...")
-                                await asyncio.sleep(retry_delay)
+                result = await self.login_handler.fetch_player_data(fid, max_age=60)
+                if result['status'] == 'success':
+                    data = {'data': result['data']}
+                    nickname = data['data']['nickname']
+                    fid_value = data['data']['fid']
+                    stove_level = data['data']['stove_lv']
+                    kid = data['data']['kid']
+                    avatar_image = data['data']['avatar_image']
+                    stove_lv_content = data['data'].get('stove_lv_content')
+
+                    if stove_level > 30:
+                        stove_level_name = self.level_mapping.get(stove_level, f"Level {stove_level}")
+                    else:
+                        stove_level_name = f"Level {stove_level}"
+
+                    user_info = None
+                    alliance_info = None
+                    
+                    with sqlite3.connect('db/users.sqlite') as users_db:
+                        cursor = users_db.cursor()
+                        cursor.execute("SELECT *, alliance FROM users WHERE fid=?", (fid_value,))
+                        user_info = cursor.fetchone()
+                        
+                        if user_info and user_info[-1]:
+                            with sqlite3.connect('db/alliance.sqlite') as alliance_db:
+                                cursor = alliance_db.cursor()
+                                cursor.execute("SELECT name FROM alliance_list WHERE alliance_id=?", (user_info[-1],))
+                                alliance_info = cursor.fetchone()
+
+                    embed = discord.Embed(
+                        title=f"👤 {nickname}",
+                        description=(
+                            "━━━━━━━━━━━━━━━━━━━━━━\n"
+                            f"**🆔 ID:** `{fid_value}`\n"
+                            f"**🔥 Furnace Level:** `{stove_level_name}`\n"
+                            f"**🌍 State:** `{kid}`\n"
+                            "━━━━━━━━━━━━━━━━━━━━━━\n"
+                        ),
+                        color=discord.Color.blue()
+                    )
+
+                    if alliance_info:
+                        embed.description += f"**🏰 Alliance:** `{alliance_info[0]}`\n━━━━━━━━━━━━━━━━━━━━━━\n"
+
+                    registration_status = "Registered on the List ✅" if user_info else "Not on the List ❌"
+                    embed.set_footer(text=registration_status)
+
+                    if avatar_image:
+                        embed.set_image(url=avatar_image)
+                    if isinstance(stove_lv_content, str) and stove_lv_content.startswith("http"):
+                        embed.set_thumbnail(url=stove_lv_content)
+
+                    await interaction.followup.send(embed=embed)
+                    return 
+
+                elif result['status'] == 'rate_limited':
+                    if attempt < max_retries - 1:
+                        await interaction.followup.send("API limit reached, your result will be displayed automatically shortly...")
+                        await asyncio.sleep(max(5.0, result.get('wait_time', retry_delay)))
+                else:
+                    break
             await interaction.followup.send(f"User with ID {fid} not found or an error occurred after multiple attempts.")
             
         except Exception as e:
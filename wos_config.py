@@ -1,3 +1,4 @@
+import logging
 import os
 import ssl
 
@@ -30,6 +31,17 @@ def _get_bool_env(name: str, default: bool = False) -> bool:
     return value.strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
+def _get_int_env(name: str, default: int, minimum: int | None = None) -> int:
+    value = _get_env(name)
+    try:
+        result = int(value) if value not in (None, "") else default
+    except ValueError:
+        result = default
+    if minimum is not None:
+        result = max(minimum, result)
+    return result
+
+
 def get_discord_token() -> str | None:
     return _get_env("DISCORD_BOT_TOKEN")
 
@@ -81,3 +93,128 @@ def get_ssl_context() -> ssl.SSLContext:
 
 def get_requests_verify() -> bool:
     return not is_insecure_ssl_enabled()
+
+
+def get_validation_pool_size() -> int:
+    return _get_int_env("WOS_VALIDATION_POOL_SIZE", 3, minimum=1)
+
+
+def get_validation_quorum() -> int:
+    return _get_int_env("WOS_VALIDATION_QUORUM", 2, minimum=1)
+
+
+def get_captcha_batch_size() -> int:
+    return _get_int_env("WOS_CAPTCHA_BATCH_SIZE", 8, minimum=1)
+
+
+def get_captcha_batch_delay_ms() -> int:
+    return _get_int_env("WOS_CAPTCHA_BATCH_DELAY_MS", 5, minimum=0)
+
+
+def get_captcha_inference_workers() -> int:
+    return _get_int_env("WOS_CAPTCHA_INFERENCE_WORKERS", 1, minimum=1)
+
+
+def _get_optional_int_env(name: str) -> int | None:
+    value = _get_env(name)
+    if value in (None, ""):
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        return None
+
+
+def get_onnx_profile() -> str:
+    return (_get_env("WOS_ONNX_PROFILE", "balanced") or "balanced").strip().lower()
+
+
+def get_onnx_session_overrides() -> dict:
+    """ONNX Runtime session settings set explicitly in the environment (override the profile)."""
+    overrides = {}
+    intra = _get_optional_int_env("WOS_ONNX_INTRA_OP_THREADS")
+    if intra is not None:
+        overrides["intra_op_threads"] = intra
+    inter = _get_optional_int_env("WOS_ONNX_INTER_OP_THREADS")
+    if inter is not None:
+        overrides["inter_op_threads"] = inter
+    graph_opt = _get_env("WOS_ONNX_GRAPH_OPT")
+    if graph_opt:
+        overrides["graph_optimization"] = graph_opt.strip().lower()
+    if _get_env("WOS_ONNX_MEM_ARENA") not in (None, ""):
+        overrides["mem_arena"] = _get_bool_env("WOS_ONNX_MEM_ARENA", True)
+    optimized_dir = _get_env("WOS_ONNX_OPTIMIZED_MODEL_DIR")
+    if optimized_dir:
+        overrides["optimized_model_dir"] = optimized_dir.strip()
+    return overrides
+
+
+def get_captcha_model_variant() -> str:
+    return (_get_env("WOS_CAPTCHA_MODEL_VARIANT", "auto") or "auto").strip().lower()
+
+
+def get_captcha_int8_tolerance() -> float:
+    value = _get_env("WOS_CAPTCHA_INT8_TOLERANCE")
+    try:
+        return max(0.0, float(value)) if value not in (None, "") else 0.5
+    except ValueError:
+        return 0.5
+
+
+def get_captcha_top_k() -> int:
+    return _get_int_env("WOS_CAPTCHA_TOP_K", 3, minimum=1)
+
+
+def get_captcha_min_confidence() -> float:
+    value = _get_env("WOS_CAPTCHA_MIN_CONFIDENCE")
+    try:
+        return min(1.0, max(0.0, float(value))) if value not in (None, "") else 0.0
+    except ValueError:
+        return 0.0
+
+
+def get_captcha_shard_mb() -> int:
+    return _get_int_env("WOS_CAPTCHA_SHARD_MB", 64, minimum=1)
+
+
+def get_captcha_cache_size() -> int:
+    return _get_int_env("WOS_CAPTCHA_CACHE_SIZE", 1024, minimum=0)
+
+
+def get_captcha_service_address() -> str | None:
+    value = (_get_env("WOS_CAPTCHA_SERVICE") or "").strip()
+    return value or None
+
+
+DEFAULT_LOGIN_API_URLS = [
+    "https://wos-giftcode-api.centurygame.com/api/player",
+    "https://gof-report-api-formal.centurygame.com/api/player",
+]
+
+
+def get_login_api_urls() -> list[str]:
+    value = _get_env("WOS_LOGIN_API_URLS")
+    urls = [url.strip() for url in (value or "").split(",") if url.strip()]
+    return urls or list(DEFAULT_LOGIN_API_URLS)
+
+
+def get_player_cache_size() -> int:
+    return _get_int_env("WOS_PLAYER_CACHE_SIZE", 5000, minimum=1)
+
+
+def get_player_cache_persist() -> bool:
+    return _get_bool_env("WOS_PLAYER_CACHE_PERSIST", False)
+
+
+def get_max_concurrent_operations() -> int:
+    return _get_int_env("WOS_MAX_CONCURRENT_OPERATIONS", 3, minimum=1)
+
+
+def get_gift_api_requests_per_minute() -> int:
+    return _get_int_env("WOS_GIFT_API_REQUESTS_PER_MINUTE", 120, minimum=1)
+
+
+def get_login_log_level() -> int:
+    value = (_get_env("WOS_LOGIN_LOG_LEVEL", "INFO") or "INFO").strip().upper()
+    level = logging.getLevelName(value)
+    return level if isinstance(level, int) else logging.INFO